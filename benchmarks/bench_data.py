@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Data-layer benchmark: time and peak allocation of the helpers whose cost
+can grow with the dataset (review queue, pending withdrawals, referral
+signup, the admin users/stats screens, approving a submission) on
+synthetic datasets of several sizes. Each backend/size pair runs in its
+own process, so memory figures do not leak between runs.
+
+Per operation it reports microseconds per call, the peak Python
+allocation of one call (tracemalloc) and, across sizes, a growth
+exponent: ~0 means the cost does not depend on the dataset, ~1 means it
+is linear in it. --save writes the results as a JSON baseline; --compare
+reads one and exits non-zero when an operation got slower than
+--tolerance times its baseline (and by more than --floor-us), so a
+scaling regression fails the run.
+
+Usage:
+    python3 benchmarks/bench_data.py [--sizes 10000,100000,1000000] [--backends memory]
+                                     [--save baseline.json] [--compare baseline.json]
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+# The child prints its result on a line starting with this
+RESULT_MARKER = 'BENCH_RESULT '
+
+# Share of users with a pending submission / with any withdrawal, and of
+# withdrawals still pending
+PENDING_SUBMISSION_SHARE = 0.02
+REVIEWED_SUBMISSION_SHARE = 0.2
+WITHDRAWAL_SHARE = 0.05
+PENDING_WITHDRAWAL_SHARE = 0.1
+
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        return float('nan')
+
+
+# ======================
+# Synthetic data
+# ======================
+
+def generate_users(bot, size, rng):
+    # Yields (user_id, user) so a store can take them one at a time
+    for user_id in range(1, size + 1):
+        yield str(user_id), {
+            "id": user_id,
+            "first_name": f"User{user_id}",
+            "balance": rng.randint(0, 500),
+            "referrals": min(int(rng.expovariate(0.3)), 200),
+            "referral_code": bot.generate_referral_code(user_id),
+            "joined": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 12:00:00",
+            "blocked": rng.random() < 0.01,
+            "completed_tasks": []
+        }
+
+
+def generate_submissions(task_ids, size, rng):
+    submissions = {}
+    for user_id in rng.sample(range(1, size + 1), int(size * (PENDING_SUBMISSION_SHARE + REVIEWED_SUBMISSION_SHARE))):
+        reviewed = rng.random() < REVIEWED_SUBMISSION_SHARE / (PENDING_SUBMISSION_SHARE + REVIEWED_SUBMISSION_SHARE)
+        submissions[str(user_id)] = [{
+            'task_id': rng.choice(task_ids),
+            'file_id': f"file-{user_id}",
+            'status': rng.choice(('approved', 'approved', 'rejected')) if reviewed else 'pending',
+            'submitted_at': f"2025-06-{rng.randint(1, 28):02d} 12:00:00"
+        }]
+    return submissions
+
+
+def generate_withdrawals(size, rng):
+    withdrawals = []
+    for user_id in rng.sample(range(1, size + 1), int(size * WITHDRAWAL_SHARE)):
+        pending = rng.random() < PENDING_WITHDRAWAL_SHARE
+        withdrawals.append({
+            'user_id': str(user_id),
+            'amount': rng.randint(50, 500),
+            'upi_id': f"user{user_id}@upi",
+            'status': 'pending' if pending else rng.choice(('approved', 'rejected')),
+            'requested_at': f"2025-06-{rng.randint(1, 28):02d} 12:{rng.randint(0, 59):02d}:00"
+        })
+    return withdrawals
+
+
+def load_dataset(bot, backend, size, workdir):
+    rng = random.Random(size)
+    tasks = [dict(task) for task in bot.TASKS_DB]
+    users = generate_users(bot, size, rng)
+    submissions = generate_submissions([task['id'] for task in tasks], size, rng)
+    withdrawals = generate_withdrawals(size, rng)
+
+    if backend == 'memory':
+        memory = bot.MemoryStorage(tasks=tasks, submissions=submissions, withdrawals=withdrawals)
+        for user_id, data in users:
+            memory.put_user(user_id, data)
+        return memory
+    if backend == 'journal':
+        journal = bot.JournalStorage(os.path.join(workdir, 'journal'), snapshot_interval=3600, users=dict(users),
+                                     tasks=tasks, submissions=submissions, withdrawals=withdrawals)
+        journal.snapshot()
+        return journal
+
+    sqlite = bot.SQLiteStorage(os.path.join(workdir, 'bench.db'), seed_tasks=tasks)
+    conn = sqlite._transaction()  # one transaction for the whole load
+    for user_id, data in users:
+        sqlite.put_user(user_id, data)
+    for user_id, subs in submissions.items():
+        for sub in subs:
+            sqlite.add_submission(user_id, sub)
+    for wd in withdrawals:
+        sqlite.add_withdrawal(wd)
+    conn.execute("COMMIT")
+    return sqlite
+
+
+# ======================
+# Operations
+# ======================
+
+def operations(bot, size):
+    # name -> (fn(i), calls); `calls` caps operations that consume data
+    pending = [(sub['user_id'], sub['task_id']) for sub in bot.get_pending_submissions()]
+    rng = random.Random(1)
+    codes = [bot.get_user_data(rng.randint(1, size))['referral_code'] for _ in range(5000)]
+    return {
+        'review_queue_page': (lambda i: bot.get_pending_submissions(limit=5), None),
+        'review_queue_all': (lambda i: bot.get_pending_submissions(), None),
+        'pending_withdrawals': (lambda i: bot.get_pending_withdrawals(), None),
+        'referral_signup': (lambda i: bot.register_user(size + 1 + i, f"New{i}", codes[i]), len(codes)),
+        'admin_users': (lambda i: bot.admin_users_text(), None),
+        'admin_stats': (lambda i: bot.admin_stats_text(), None),
+        'approve_submission': (lambda i: bot.update_submission_status(*pending[i], 'approved'), len(pending)),
+    }
+
+
+def measure(fn, calls, min_time, max_calls):
+    # Peak allocation of one call, then time as many calls as fit in min_time
+    tracemalloc.start()
+    fn(0)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    limit = max_calls if calls is None else min(max_calls, calls - 1)
+    count = 0
+    start = time.perf_counter()
+    deadline = start + min_time
+    while count < limit:
+        fn(count + 1)
+        count += 1
+        if time.perf_counter() >= deadline:
+            break
+    elapsed = time.perf_counter() - start
+    return {'us_per_op': elapsed / max(count, 1) * 1e6, 'peak_kb': peak / 1024, 'calls': count}
+
+
+def read_result(output):
+    for line in reversed(output.splitlines()):
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    raise ValueError(f"no result line in child output:\n{output[-2000:]}")
+
+
+def run_child(backend, size, min_time, max_calls):
+    workdir = tempfile.mkdtemp(prefix='bench_data_')
+    os.environ.setdefault('ACTIVITY_LOG_DIR', '')
+    os.environ['ACTIVITY_LOG_CONSOLE'] = '0'
+    try:
+        import bot
+
+        bot.log_activity = lambda *a, **k: None
+        bot.outbound.send_message = lambda *a, **k: None  # milestone notifications
+
+        rss_before = rss_mb()
+        start = time.perf_counter()
+        bot.storage = load_dataset(bot, backend, size, workdir)
+        load_seconds = time.perf_counter() - start
+        bot.task_registry.invalidate()
+        bot.ledger = bot.BalanceLedger()
+
+        result = {
+            'backend': backend,
+            'size': size,
+            'load_seconds': load_seconds,
+            'dataset_mb': rss_mb() - rss_before,
+            'ops': {}
+        }
+        for name, (fn, calls) in operations(bot, size).items():
+            result['ops'][name] = measure(fn, calls, min_time, max_calls)
+        if backend == 'journal':
+            bot.storage.close()
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# ======================
+# Reporting
+# ======================
+
+def growth(points):
+    # Slope of log(time) against log(size) between the smallest and largest run
+    (small_size, small_us), (large_size, large_us) = points[0], points[-1]
+    if large_size == small_size or small_us <= 0:
+        return None
+    return math.log(large_us / small_us) / math.log(large_size / small_size)
+
+
+def add_growth(results):
+    for backend, by_size in results.items():
+        sizes = sorted(by_size, key=int)
+        by_size['growth'] = {
+            name: growth([(int(size), by_size[size]['ops'][name]['us_per_op']) for size in sizes])
+            for name in by_size[sizes[0]]['ops']
+        }
+
+
+def print_report(results, baseline=None, tolerance=1.5, floor_us=10.0):
+    regressions = []
+    for backend, by_size in results.items():
+        sizes = sorted((s for s in by_size if s != 'growth'), key=int)
+        print(f"\n[{backend}]")
+        for size in sizes:
+            run = by_size[size]
+            print(f"  {int(size):>9,} users  loaded in {run['load_seconds']:.1f}s, dataset {run['dataset_mb']:.0f} MB")
+        header = ''.join(f"{int(s):>12,}" for s in sizes)
+        print(f"  {'us/op':<22}{header}   growth")
+        for name in by_size[sizes[0]]['ops']:
+            cells = ''
+            for size in sizes:
+                us = by_size[size]['ops'][name]['us_per_op']
+                base = (baseline or {}).get(backend, {}).get(size, {}).get('ops', {}).get(name)
+                flag = ' '
+                if base and us > base['us_per_op'] * tolerance and us - base['us_per_op'] > floor_us:
+                    flag = '!'
+                    regressions.append((backend, size, name, base['us_per_op'], us))
+                cells += f"{us:>11,.1f}{flag}"
+            exponent = by_size['growth'].get(name)
+            print(f"  {name:<22}{cells}   {'-' if exponent is None else f'{exponent:.2f}':>6}")
+        print(f"  {'peak KB/op':<22}")
+        for name in by_size[sizes[0]]['ops']:
+            cells = ''.join(f"{by_size[size]['ops'][name]['peak_kb']:>12,.1f}" for size in sizes)
+            print(f"  {name:<22}{cells}")
+
+    if baseline is not None:
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {tolerance}x baseline:")
+            for backend, size, name, base, us in regressions:
+                print(f"  [{backend}] {name} at {int(size):,}: {base:,.1f} -> {us:,.1f} us/op ({us / base:.1f}x)")
+        else:
+            print(f"\nNo operation slower than {tolerance}x baseline")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--backends', default='memory', help='comma-separated: memory, sqlite, journal')
+    parser.add_argument('--min-time', type=float, default=0.5, help='seconds spent timing each operation')
+    parser.add_argument('--max-calls', type=int, default=2000, help='cap on timed calls per operation')
+    parser.add_argument('--save', help='write results to this JSON baseline')
+    parser.add_argument('--compare', help='JSON baseline to compare against')
+    parser.add_argument('--tolerance', type=float, default=1.5, help='slowdown over baseline that fails the run')
+    parser.add_argument('--floor-us', type=float, default=10.0,
+                        help='ignore slowdowns smaller than this (timer noise on fast operations)')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        backend, size = args.child.split(':')
+        print(RESULT_MARKER + json.dumps(run_child(backend, int(size), args.min_time, args.max_calls)), flush=True)
+        return
+
+    results = {}
+    for backend in args.backends.split(','):
+        results[backend] = {}
+        for size in args.sizes.split(','):
+            print(f"running {backend} at {int(size):,} users...", file=sys.stderr)
+            output = subprocess.run(
+                [sys.executable, __file__, '--child', f"{backend}:{size}",
+                 '--min-time', str(args.min_time), '--max-calls', str(args.max_calls)],
+                capture_output=True, text=True, check=True
+            ).stdout
+            results[backend][str(int(size))] = read_result(output)
+    add_growth(results)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+    regressions = print_report(results, baseline, args.tolerance, args.floor_us)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'python': sys.version.split()[0], 'results': results}, f, indent=2)
+        print(f"\nBaseline written to {args.save}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
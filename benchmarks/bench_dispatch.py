@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Dispatch benchmark: per-update cost of routing reply-keyboard text and
+callback data as the number of buttons grows, comparing one TeleBot
+handler per button (predicates checked in order) with the UpdateRouter
+(hash lookup for text, prefix trie for callbacks). Handlers are no-ops,
+so only dispatch is measured; the matched button is the last registered.
+
+Usage:
+    python3 benchmarks/bench_dispatch.py [--buttons 6,50,200,1000] [--updates 20000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bot  # noqa: E402
+from telebot import types  # noqa: E402
+
+
+def noop(update):
+    pass
+
+
+def message_update(text):
+    return types.Update.de_json({
+        "update_id": 1,
+        "message": {
+            "message_id": 1, "date": 0, "text": text,
+            "chat": {"id": 1, "type": "private"},
+            "from": {"id": 1, "is_bot": False, "first_name": "Bench"}
+        }
+    })
+
+
+def callback_update(data):
+    return types.Update.de_json({
+        "update_id": 1,
+        "callback_query": {
+            "id": "1", "chat_instance": "1", "data": data,
+            "from": {"id": 1, "is_bot": False, "first_name": "Bench"}
+        }
+    })
+
+
+def make_bot():
+    return bot.RewardsBot('1:bench', threaded=False)
+
+
+def linear_bots(count):
+    text_bot, callback_bot = make_bot(), make_bot()
+    for i in range(count):
+        text_bot.register_message_handler(noop, func=lambda message, t=f"button {i}": message.text == t)
+        callback_bot.register_callback_query_handler(noop, func=lambda call, p=f"action{i}_": call.data.startswith(p))
+    return text_bot, callback_bot
+
+
+def routed_bots(count):
+    router = bot.UpdateRouter()
+    for i in range(count):
+        router.button(f"button {i}")(noop)
+        router.callback(f"action{i}_")(noop)
+    text_bot, callback_bot = make_bot(), make_bot()
+    router.install(text_bot)
+    router.install(callback_bot)
+    return text_bot, callback_bot
+
+
+def per_update_us(telebot_instance, update, count):
+    batch = [update] * 100
+    start = time.perf_counter()
+    for _ in range(count // 100):
+        telebot_instance.process_new_updates(batch)
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--buttons', default='6,50,200,1000')
+    parser.add_argument('--updates', type=int, default=20000)
+    args = parser.parse_args()
+
+    bot.TRACE_SAMPLE_RATE = 0
+    print(f"{'buttons':>8} {'text linear':>12} {'text router':>12} {'cb linear':>12} {'cb router':>12}   (us/update)")
+    for count in map(int, args.buttons.split(',')):
+        text = message_update(f"button {count - 1}")
+        callback = callback_update(f"action{count - 1}_123_456")
+        linear_text, linear_callback = linear_bots(count)
+        routed_text, routed_callback = routed_bots(count)
+        print(f"{count:>8} {per_update_us(linear_text, text, args.updates):>12.2f} "
+              f"{per_update_us(routed_text, text, args.updates):>12.2f} "
+              f"{per_update_us(linear_callback, callback, args.updates):>12.2f} "
+              f"{per_update_us(routed_callback, callback, args.updates):>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
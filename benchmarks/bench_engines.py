@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Engine load benchmark: feeds /start updates from distinct users through a
+local fake Bot API and measures updates/sec and update-to-reply latency for
+the sync (threaded TeleBot) and async (AsyncTeleBot on aiohttp) engines.
+Each engine runs in its own process. By default all updates are queued
+at once (saturation); --rate offers them at a steady pace instead, which
+shows latency under a sustainable load.
+
+Usage:
+    python3 benchmarks/bench_engines.py [--updates 5000] [--latency 0.02] [--rate 0]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+# The child prints its result on a line starting with this; anything the
+# bot writes around it (log flushes at exit, warnings) is ignored
+RESULT_MARKER = 'BENCH_RESULT '
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def push_updates(fake, updates, rate):
+    if not rate:
+        fake.push_updates(updates)
+        return
+    start = time.monotonic()
+    for i in range(0, len(updates), 10):
+        fake.push_updates(updates[i:i + 10])
+        time.sleep(max(0, start + (i + 10) / rate - time.monotonic()))
+
+
+def read_result(output):
+    for line in reversed(output.splitlines()):
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    raise ValueError(f"no result line in child output:\n{output[-2000:]}")
+
+
+def run_engine(engine, update_count, latency, rate):
+    # Telegram's rate limits would dominate; lift them for the benchmark
+    os.environ['OUTBOUND_GLOBAL_RATE'] = '1000000'
+    os.environ['OUTBOUND_CHAT_RATE'] = '1000000'
+    os.environ['ACTIVITY_LOG_CONSOLE'] = '0'
+
+    import telebot
+    from fake_telegram import FakeTelegram, message_update
+
+    fake = FakeTelegram(latency=latency).start()
+    telebot.apihelper.API_URL = fake.api_url
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import bot
+
+        if engine == 'async':
+            telebot.asyncio_helper.API_URL = fake.api_url
+            async_bot, loop = bot.create_async_engine()
+            target = bot.run_async_engine
+            args = (async_bot, loop)
+        else:
+            target = bot.bot.infinity_polling
+            args = ()
+        kwargs = {'timeout': 1} if engine == 'async' else {'long_polling_timeout': 1}
+        bot.outbound.start()
+        threading.Thread(target=target, args=args, kwargs=kwargs, daemon=True).start()
+
+        push_updates(fake, [message_update(i, 100000 + i, '/start') for i in range(1, update_count + 1)], rate)
+
+        deadline = time.monotonic() + 120
+        while len(fake.calls_for('sendMessage')) < update_count and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    replies = {}
+    for at, _, params in fake.calls_for('sendMessage'):
+        replies.setdefault(int(params['chat_id']) - 100000, at)
+    latencies = [replies[i] - fake.delivered[i] for i in replies]
+    elapsed = max(replies.values()) - min(fake.delivered.values())
+    return {
+        'engine': engine,
+        'replied': len(replies),
+        'updates_per_sec': len(replies) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--updates', type=int, default=5000)
+    parser.add_argument('--latency', type=float, default=0.02, help='simulated Bot API latency per call (seconds)')
+    parser.add_argument('--rate', type=float, default=0, help='offered updates/sec (0 = all at once)')
+    parser.add_argument('--engines', default='sync,async')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(RESULT_MARKER + json.dumps(run_engine(args.child, args.updates, args.latency, args.rate)), flush=True)
+        return
+
+    offered = f"{args.rate:.0f}/sec" if args.rate else "all at once"
+    print(f"{args.updates} updates ({offered}), {args.latency * 1000:.0f}ms simulated API latency")
+    for engine in args.engines.split(','):
+        output = subprocess.run(
+            [sys.executable, __file__, '--child', engine,
+             '--updates', str(args.updates), '--latency', str(args.latency), '--rate', str(args.rate)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        result = read_result(output)
+        print(f"  [{engine:<5}] {result['replied']:>6} replies  {result['updates_per_sec']:>9,.0f} updates/sec  "
+              f"p50 {result['p50_ms']:>8.1f}ms  p99 {result['p99_ms']:>8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
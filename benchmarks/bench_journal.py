@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Journal backend benchmark: per-mutation latency on the caller's thread and
+restart time (newest snapshot + journal tail replay).
+
+Usage:
+    python3 benchmarks/bench_journal.py [--users 500000] [--tail 50000]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bot  # noqa: E402
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=500000)
+    parser.add_argument('--tail', type=int, default=50000, help='events written after the last snapshot')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='bench_journal_')
+    try:
+        journal = bot.JournalStorage(directory, snapshot_interval=3600, tasks=list(bot.TASKS_DB))
+
+        start = time.perf_counter()
+        for user_id in range(1, args.users + 1):
+            journal.put_user(user_id, {
+                "id": user_id,
+                "first_name": f"User{user_id}",
+                "balance": 0,
+                "referrals": 0,
+                "referral_code": f"REF-{user_id}-BENCH",
+                "joined": "2025-01-01 00:00:00",
+                "blocked": False,
+                "completed_tasks": []
+            })
+        print(f"registered {args.users} users in {time.perf_counter() - start:.2f}s")
+
+        start = time.perf_counter()
+        journal.snapshot()
+        journal.flush()
+        print(f"snapshot written in {time.perf_counter() - start:.2f}s")
+
+        latencies = []
+        for i in range(args.tail):
+            t0 = time.perf_counter()
+            journal.set_user_field((i % args.users) + 1, 'balance', i)
+            latencies.append(time.perf_counter() - t0)
+        journal.close()
+        print(f"tail mutations: {args.tail}, mean {sum(latencies) / len(latencies) * 1e6:.1f}us, "
+              f"p99 {percentile(latencies, 99) * 1e6:.1f}us, fsync batches {journal.commits}")
+
+        start = time.perf_counter()
+        recovered = bot.JournalStorage(directory, snapshot_interval=3600)
+        elapsed = time.perf_counter() - start
+        recovered.close()
+        print(f"restart: {recovered.count_users()} users, seq {recovered._seq}, recovered in {elapsed:.2f}s")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Record memory benchmark: bytes per user held by the in-memory store, for
+the old layout (a dict per user keyed by the id string, formatted
+timestamps, completed_tasks as a list of dicts copying each task's title
+and reward) and for the MemoryStorage records (slotted UserRecord keyed
+by the int id, epoch timestamps, completions packed in an array), plus
+the same for submissions. Measured with tracemalloc, so only Python
+allocations count.
+
+Usage:
+    python3 benchmarks/bench_records.py [--users 200000] [--completions 3]
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bot  # noqa: E402
+
+
+def legacy_users(count, completions, tasks, rng):
+    users = {}
+    for user_id in range(1, count + 1):
+        done = []
+        for _ in range(rng.randint(0, 2 * completions)):
+            task = rng.choice(tasks)
+            done.append({
+                'task_id': task['id'],
+                'title': task['title'],
+                'reward': task['reward'],
+                'completed_at': f"2025-06-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:00:00"
+            })
+        users[str(user_id)] = {
+            "id": user_id,
+            "first_name": f"User{user_id}",
+            "balance": rng.randint(0, 500),
+            "referrals": rng.randint(0, 20),
+            "referral_code": f"REF-{user_id}-{rng.getrandbits(30):06X}",
+            "joined": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 12:00:00",
+            "blocked": False,
+            "completed_tasks": done
+        }
+    return users
+
+
+def legacy_submissions(count, tasks, rng):
+    return {
+        str(user_id): [{
+            'id': user_id,
+            'task_id': rng.choice(tasks)['id'],
+            'file_id': f"AgACAgUAAxkBAAI{user_id:012d}",
+            'status': 'approved',
+            'submitted_at': f"2025-06-{rng.randint(1, 28):02d} 12:00:00",
+            'processed_at': f"2025-06-{rng.randint(1, 28):02d} 13:00:00"
+        }]
+        for user_id in range(1, count + 1)
+    }
+
+
+def traced_bytes(build):
+    # Allocation still held by whatever build() returns
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200000)
+    parser.add_argument('--completions', type=int, default=3, help='average completed tasks per user')
+    args = parser.parse_args()
+
+    tasks = bot.TASKS_DB
+    users = legacy_users(args.users, args.completions, tasks, random.Random(42))
+    submissions = legacy_submissions(args.users, tasks, random.Random(43))
+
+    # Both layouts are built from fresh copies so shared strings don't hide costs
+    old_users, _ = traced_bytes(lambda: legacy_users(args.users, args.completions, tasks, random.Random(42)))
+    new_users, store = traced_bytes(lambda: bot.MemoryStorage(users=legacy_users(
+        args.users, args.completions, tasks, random.Random(42))).users)
+    old_subs, _ = traced_bytes(lambda: legacy_submissions(args.users, tasks, random.Random(43)))
+    new_subs, _ = traced_bytes(lambda: bot.MemoryStorage(submissions=legacy_submissions(
+        args.users, tasks, random.Random(43))).submissions)
+
+    sample = str(args.users // 2)
+    assert store[int(sample)]['completed_tasks'] == [
+        {'task_id': t['task_id'], 'completed_at': t['completed_at']} for t in users[sample]['completed_tasks']
+    ]
+    assert store[int(sample)]['joined'] == users[sample]['joined']
+    del users, submissions, store
+
+    print(f"{args.users:,} users, ~{args.completions} completions each")
+    print(f"  {'':<14}{'old':>12}{'new':>12}{'saved':>9}")
+    for name, old, new in (('per user', old_users, new_users), ('per submission', old_subs, new_subs)):
+        print(f"  {name:<14}{old / args.users:>10,.0f} B{new / args.users:>10,.0f} B{1 - new / old:>9.0%}")
+    print(f"  {'total':<14}{(old_users + old_subs) / 2 ** 20:>9,.1f} MB{(new_users + new_subs) / 2 ** 20:>9,.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Referral signup benchmark: /start REF-... registrations per second with a
+large existing user base, compared with the old scan over every user.
+
+Usage:
+    python3 benchmarks/bench_referrals.py [--users 1000000] [--signups 50000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bot  # noqa: E402
+
+
+def legacy_scan(code):
+    for uid, data in bot.storage.users.items():
+        if data.get('referral_code') == code:
+            return uid, data
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--signups', type=int, default=50000)
+    parser.add_argument('--scans', type=int, default=20, help='lookups timed with the old linear scan')
+    args = parser.parse_args()
+
+    random.seed(42)
+    bot.storage = bot.MemoryStorage(tasks=list(bot.TASKS_DB))
+    bot.ledger = bot.BalanceLedger()
+    bot.log_activity = lambda *a, **k: None
+    bot.bot.send_message = lambda *a, **k: None  # milestone notifications
+
+    start = time.perf_counter()
+    for user_id in range(1, args.users + 1):
+        bot.update_user_data(user_id, {
+            "id": user_id,
+            "first_name": f"User{user_id}",
+            "balance": 0,
+            "referrals": 0,
+            "referral_code": bot.generate_referral_code(user_id),
+            "joined": "2025-01-01 00:00:00",
+            "blocked": False,
+            "completed_tasks": []
+        })
+    print(f"populated {args.users} users in {time.perf_counter() - start:.2f}s")
+
+    codes = [bot.get_user_data(random.randint(1, args.users))['referral_code'] for _ in range(args.signups)]
+
+    start = time.perf_counter()
+    for i, code in enumerate(codes):
+        bot.register_user(args.users + 1 + i, f"New{i}", code)
+    elapsed = time.perf_counter() - start
+    print(f"signups with referral: {args.signups / elapsed:,.0f}/sec ({elapsed / args.signups * 1e6:.1f}us each)")
+
+    start = time.perf_counter()
+    for code in codes[:args.scans]:
+        legacy_scan(code)
+    elapsed = time.perf_counter() - start
+    print(f"old referral scan:     {args.scans / elapsed:,.1f}/sec ({elapsed / args.scans * 1e3:.1f}ms each)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Storage backend benchmark: ops/sec of the data-access functions for the
+in-memory and SQLite backends.
+
+Usage:
+    python3 benchmarks/bench_storage.py [--users 100000] [--ops 20000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bot  # noqa: E402
+
+
+def make_user(user_id):
+    return {
+        "id": user_id,
+        "first_name": f"User{user_id}",
+        "balance": random.randint(0, 500),
+        "referrals": random.randint(0, 20),
+        "referral_code": f"REF-{user_id}-BENCH",
+        "joined": "2025-01-01 00:00:00",
+        "blocked": False,
+        "completed_tasks": []
+    }
+
+
+def populate(user_count):
+    start = time.perf_counter()
+    for user_id in range(1, user_count + 1):
+        bot.update_user_data(user_id, make_user(user_id))
+    return time.perf_counter() - start
+
+
+def measure(name, ops, fn):
+    start = time.perf_counter()
+    for i in range(ops):
+        fn(i)
+    elapsed = time.perf_counter() - start
+    return name, ops / elapsed if elapsed else float('inf')
+
+
+def run_backend(backend, user_count, ops):
+    if backend == 'memory':
+        bot.storage = bot.MemoryStorage(tasks=list(bot.TASKS_DB))
+    else:
+        path = os.path.join(tempfile.mkdtemp(prefix='bench_storage_'), 'bench.db')
+        bot.storage = bot.SQLiteStorage(path, seed_tasks=bot.TASKS_DB)
+
+    load_time = populate(user_count)
+    user_ids = [random.randint(1, user_count) for _ in range(ops)]
+    task_ids = [t['id'] for t in bot.get_tasks()]
+
+    for i in range(ops // 10):
+        bot.record_withdrawal({
+            'user_id': str(user_ids[i]),
+            'amount': 10,
+            'upi_id': 'bench@upi',
+            'status': 'pending',
+            'requested_at': f"2025-01-01 00:00:{i}"
+        })
+
+    results = [
+        measure('get_user_data', ops, lambda i: bot.get_user_data(user_ids[i])),
+        measure('update_user_data(field)', ops,
+                lambda i: bot.update_user_data(user_ids[i], field='balance', value=i)),
+        measure('record_submission', ops,
+                lambda i: bot.record_submission(user_ids[i], task_ids[i % len(task_ids)], f"file{i}")),
+        measure('update_submission_status', ops,
+                lambda i: bot.update_submission_status(user_ids[i], task_ids[i % len(task_ids)], 'approved')),
+        measure('add_task', max(ops // 100, 1),
+                lambda i: bot.add_task({'id': f"bench_task_{i}", 'title': 'Bench', 'reward': 1, 'active': True})),
+        measure('get_pending_withdrawals', max(ops // 1000, 1), lambda i: bot.get_pending_withdrawals()),
+    ]
+    return load_time, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--ops', type=int, default=20000)
+    parser.add_argument('--backends', default='memory,sqlite')
+    args = parser.parse_args()
+
+    random.seed(42)
+    for backend in args.backends.split(','):
+        load_time, results = run_backend(backend, args.users, args.ops)
+        print(f"\n[{backend}] loaded {args.users} users in {load_time:.2f}s")
+        for name, rate in results:
+            print(f"  {name:<28} {rate:>14,.0f} ops/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Minimal in-process stand-in for the Telegram Bot API, used by the
+benchmarks. It serves queued updates through getUpdates, answers every
+other method (sendMessage, editMessageText, sendPhoto, setWebhook, ...)
+with a plausible result after an optional simulated network latency, and
+records each call with its arrival time. With error_rate set, that share
+of calls is refused with a 429 and retry_after, like Telegram's flood
+control; refused calls are counted in `throttled`, not recorded.
+
+Point the bot at it with:
+    telebot.apihelper.API_URL = fake.api_url
+    telebot.asyncio_helper.API_URL = fake.api_url
+
+or run it standalone and start the bot with TELEGRAM_API_URL:
+    python3 benchmarks/fake_telegram.py --port 8081 [--error-rate 0.01]
+    TELEGRAM_API_URL='http://127.0.0.1:8081/bot{0}/{1}' python3 bot.py
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+BOT_USER = {"id": 1000, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}
+
+
+def message_update(update_id, user_id, text):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private", "first_name": f"User{user_id}"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"},
+            "text": text,
+            **({"entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]}
+               if text.startswith('/') else {})
+        }
+    }
+
+
+def callback_update(update_id, user_id, data, message_id=1):
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "chat_instance": str(user_id),
+            "data": data,
+            "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"},
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": BOT_USER,
+                "text": "..."
+            }
+        }
+    }
+
+
+def photo_update(update_id, user_id, file_id):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private", "first_name": f"User{user_id}"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"},
+            "photo": [{"file_id": file_id, "file_unique_id": file_id, "width": 1080, "height": 1920}]
+        }
+    }
+
+
+def parse_params(handler):
+    url = urlsplit(handler.path)
+    params = dict(parse_qsl(url.query))
+    length = int(handler.headers.get('Content-Length') or 0)
+    body = handler.rfile.read(length) if length else b''
+    content_type = handler.headers.get('Content-Type', '')
+    if body and content_type.startswith('application/json'):
+        params.update(json.loads(body))
+    elif body and content_type.startswith('application/x-www-form-urlencoded'):
+        params.update(parse_qsl(body.decode()))
+    elif body and content_type.startswith('multipart/form-data'):
+        message = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+        for part in message.iter_parts():
+            if part.get_filename() is None:
+                params[part.get_param('name', header='content-disposition')] = part.get_content()
+    return url.path.rsplit('/', 1)[-1], params
+
+
+class FakeTelegram:
+    def __init__(self, latency=0.0, host='127.0.0.1', port=0, error_rate=0.0, retry_after=1):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.throttled = 0
+        self.calls = []
+        self.delivered = {}
+        self._updates = []
+        self._message_ids = iter(range(1, 1 << 62))
+        self._cond = threading.Condition()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self):
+        return self.url + "/bot{0}/{1}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def push_updates(self, updates):
+        with self._cond:
+            self._updates.extend(updates)
+            self._cond.notify_all()
+
+    def calls_for(self, method):
+        return [call for call in self.calls if call[1] == method]
+
+    # API methods
+
+    def get_updates(self, params):
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        deadline = time.monotonic() + min(float(params.get('timeout') or 0), 1.0)
+        with self._cond:
+            while True:
+                self._updates = [u for u in self._updates if u['update_id'] >= offset]
+                if self._updates or time.monotonic() >= deadline:
+                    break
+                self._cond.wait(deadline - time.monotonic())
+            batch = self._updates[:limit]
+        now = time.perf_counter()
+        for update in batch:
+            self.delivered.setdefault(update['update_id'], now)
+        return batch
+
+    def reply(self, method, params):
+        if self.latency:
+            time.sleep(self.latency)
+        if method == 'getMe':
+            return BOT_USER
+        if method in ('answerCallbackQuery', 'deleteWebhook', 'setWebhook'):
+            return True
+        chat_id = int(params.get('chat_id') or 0)
+        return {
+            "message_id": int(params.get('message_id') or next(self._message_ids)),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": params.get('text', '')
+        }
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+            def _dispatch(self):
+                method, params = parse_params(self)
+                status = 200
+                if method == 'getUpdates':
+                    response = {"ok": True, "result": fake.get_updates(params)}
+                elif fake.error_rate and random.random() < fake.error_rate:
+                    fake.throttled += 1
+                    status = 429
+                    response = {
+                        "ok": False,
+                        "error_code": 429,
+                        "description": f"Too Many Requests: retry after {fake.retry_after}",
+                        "parameters": {"retry_after": fake.retry_after}
+                    }
+                else:
+                    fake.calls.append((time.perf_counter(), method, params))
+                    response = {"ok": True, "result": fake.reply(method, params)}
+                body = json.dumps(response).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = _dispatch
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of calls refused with a 429')
+    args = parser.parse_args()
+
+    fake = FakeTelegram(latency=args.latency, port=args.port, error_rate=args.error_rate).start()
+    print(f"Fake Bot API listening on {fake.api_url}")
+    seen = 0
+    try:
+        while True:
+            time.sleep(1)
+            for _, method, params in fake.calls[seen:]:
+                print(f"{method} {params.get('chat_id', '')} {str(params.get('text', ''))[:60]!r}")
+            seen = len(fake.calls)
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
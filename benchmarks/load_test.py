@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Load test: runs the bot (sync engine, polling) against the local fake Bot
+API and replays a campaign in phases, each a burst from every simulated
+user: /start signups through referral links, task browsing, task and
+"done" button taps, photo proofs, admin approvals (/approve, review,
+approve, one admin), then withdrawal requests with a UPI id from everyone
+whose referral bonuses cover the minimum.
+
+Per phase it reports updates/sec, end-to-end latency (update delivered
+to the first API call answering it) percentiles and outbound API calls
+per update; overall, process memory (RSS) growth and injected 429s.
+--json writes the report for later runs to --compare against.
+
+Usage:
+    python3 benchmarks/load_test.py [--users 2000] [--approvals 200] [--latency 0.02]
+                                    [--error-rate 0.001] [--json report.json] [--compare base.json]
+"""
+
+import argparse
+import atexit
+import contextlib
+import io
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fake_telegram import FakeTelegram, callback_update, message_update, photo_update  # noqa: E402
+
+FIRST_USER = 100000
+PHASE_TIMEOUT = 300
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        # Peak, not current, where /proc is missing (ru_maxrss is KiB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 1024
+
+
+def inline_buttons(params):
+    markup = params.get('reply_markup')
+    if isinstance(markup, str):
+        markup = json.loads(markup)
+    return [button for row in (markup or {}).get('inline_keyboard', []) for button in row]
+
+
+class Campaign:
+    # Feeds updates to the fake API and matches each to the first API call
+    # that answers it: a call to its chat, or the answer to its callback query.
+    # A phase ends once every update is answered and settle() returns (the
+    # bot has nothing queued), so its replies are complete for the next one.
+
+    def __init__(self, fake, settle):
+        self.fake = fake
+        self.settle = settle
+        self.next_update_id = 1
+        self.phases = []
+
+    def new_id(self):
+        update_id = self.next_update_id
+        self.next_update_id += 1
+        return update_id
+
+    def run(self, name, updates):
+        # updates: [(update dict, chat_id)]; returns {chat_id: [calls answering it]}
+        if not updates:
+            return {}
+        mark = len(self.fake.calls)
+        start_memory = rss_mb()
+        pending = {update['update_id']: chat_id for update, chat_id in updates}
+        self.fake.push_updates([update for update, _ in updates])
+
+        by_chat = {}
+        for update_id, chat_id in pending.items():
+            by_chat.setdefault(chat_id, []).append(update_id)
+
+        def answer(update_id, at):
+            delivered = self.fake.delivered.get(update_id)
+            if update_id in answered or delivered is None or at < delivered:
+                return False
+            answered[update_id] = at
+            return True
+
+        answered, replies, seen = {}, {}, mark
+        deadline = time.monotonic() + PHASE_TIMEOUT
+        while len(answered) < len(pending) and time.monotonic() < deadline:
+            time.sleep(0.01)
+            calls = self.fake.calls[seen:]
+            seen += len(calls)
+            for at, method, params in calls:
+                if params.get('callback_query_id', '').isdigit():
+                    update_id = int(params['callback_query_id'])
+                    if update_id in pending:
+                        answer(update_id, at)
+                if params.get('chat_id') is not None:
+                    chat_id = int(params['chat_id'])
+                    replies.setdefault(chat_id, []).append((method, params))
+                    any(answer(update_id, at) for update_id in by_chat.get(chat_id, ()))
+        # Replies still queued behind the answering call (or an early ack)
+        self.settle()
+        for at, method, params in self.fake.calls[seen:]:
+            if params.get('chat_id') is not None:
+                replies.setdefault(int(params['chat_id']), []).append((method, params))
+
+        latencies = [answered[u] - self.fake.delivered[u] for u in answered]
+        first_delivery = min(self.fake.delivered[u] for u in pending if u in self.fake.delivered)
+        elapsed = max(answered.values()) - first_delivery if answered else 0
+        phase = {
+            'phase': name,
+            'updates': len(pending),
+            'answered': len(answered),
+            'seconds': elapsed,
+            'updates_per_sec': len(answered) / elapsed if elapsed else 0,
+            'p50_ms': percentile(latencies, 50) * 1000 if latencies else None,
+            'p95_ms': percentile(latencies, 95) * 1000 if latencies else None,
+            'p99_ms': percentile(latencies, 99) * 1000 if latencies else None,
+            'calls_per_update': (len(self.fake.calls) - mark) / len(pending),
+            'rss_growth_mb': rss_mb() - start_memory
+        }
+        self.phases.append(phase)
+        return replies
+
+
+def run_campaign(args):
+    os.environ.setdefault('TRACE_SAMPLE_RATE', '0')
+    if not args.real_limits:
+        # Measure the bot, not Telegram's send limits
+        os.environ['OUTBOUND_GLOBAL_RATE'] = '1000000'
+        os.environ['OUTBOUND_CHAT_RATE'] = '1000000'
+
+    import telebot
+
+    fake = FakeTelegram(latency=args.latency, error_rate=args.error_rate, retry_after=args.retry_after).start()
+    telebot.apihelper.API_URL = fake.api_url
+
+    memory_before_import = rss_mb()
+    with contextlib.redirect_stdout(io.StringIO()):
+        import bot
+
+        bot.outbound.start()
+        threading.Thread(target=bot.bot.infinity_polling, kwargs={'long_polling_timeout': 1},
+                         daemon=True).start()
+        memory_start = rss_mb()
+        def settle():
+            while bot.bot.executor.queue_depth() or bot.bot.executor.in_flight():
+                time.sleep(0.005)
+            bot.outbound.drain(timeout=PHASE_TIMEOUT)
+
+        campaign = Campaign(fake, settle)
+        users = range(FIRST_USER, FIRST_USER + args.users)
+        admin = bot.ADMIN_ID
+
+        # Every user after the first few joins through the link of user i // 5,
+        # so referrers reach the 5-referral milestone
+        signups = []
+        for i, user_id in enumerate(users):
+            referrer = FIRST_USER + i // 5
+            text = f"/start {bot.generate_referral_code(referrer)}" if referrer != user_id else "/start"
+            signups.append((message_update(campaign.new_id(), user_id, text), user_id))
+        campaign.run('signup', signups)
+
+        replies = campaign.run('browse', [
+            (message_update(campaign.new_id(), user_id, '🎯 नया कार्य'), user_id) for user_id in users])
+
+        selects = []
+        for user_id in users:
+            buttons = [b for method, params in replies.get(user_id, []) for b in inline_buttons(params)]
+            if buttons:
+                update_id = campaign.new_id()
+                selects.append((callback_update(update_id, user_id, buttons[0]['callback_data']), user_id))
+        replies = campaign.run('select_task', selects)
+
+        completes = []
+        for user_id in users:
+            buttons = [b for method, params in replies.get(user_id, []) for b in inline_buttons(params)
+                       if b['callback_data'].startswith('complete_')]
+            if buttons:
+                completes.append((callback_update(campaign.new_id(), user_id, buttons[0]['callback_data']), user_id))
+        campaign.run('complete_task', completes)
+
+        campaign.run('proof', [
+            (photo_update(campaign.new_id(), user_id, f"proof-{user_id}"), user_id) for user_id in users])
+
+        # One admin works through pending proofs: /approve lists ten, each
+        # is reviewed, then approved
+        approved = 0
+        while approved < args.approvals:
+            replies = campaign.run('admin_list', [(message_update(campaign.new_id(), admin, '/approve'), admin)])
+            reviews = [b for method, params in replies.get(admin, []) for b in inline_buttons(params)
+                       if b['callback_data'].startswith('review_')]
+            if not reviews:
+                break
+            approved_before = approved
+            for review in reviews[:args.approvals - approved]:
+                replies = campaign.run('admin_review', [
+                    (callback_update(campaign.new_id(), admin, review['callback_data']), admin)])
+                approve = [b for method, params in replies.get(admin, []) for b in inline_buttons(params)
+                           if b['callback_data'].startswith('approve_')]
+                if approve:
+                    campaign.run('admin_approve', [
+                        (callback_update(campaign.new_id(), admin, approve[0]['callback_data']), admin)])
+                    approved += 1
+            if approved == approved_before:
+                break
+
+        campaign.run('withdraw', [
+            (message_update(campaign.new_id(), user_id, '💸 निकासी'), user_id) for user_id in users])
+        eligible = [user_id for user_id in users if bot.conversations.get(user_id)]
+        campaign.run('upi', [
+            (message_update(campaign.new_id(), user_id, f"user{user_id}@upi"), user_id) for user_id in eligible])
+
+        bot.outbound.drain(timeout=30)
+        withdrawals = len(bot.get_pending_withdrawals())
+        outbound_stats = dict(bot.outbound.stats)
+
+    total_updates = sum(p['updates'] for p in campaign.phases)
+    # Busy time only: the admin's one-at-a-time phases would otherwise count their pauses
+    busy = sum(p['seconds'] for p in campaign.phases)
+    return {
+        'users': args.users,
+        'latency_ms': args.latency * 1000,
+        'error_rate': args.error_rate,
+        'storage': os.environ.get('STORAGE_BACKEND', 'memory'),
+        'phases': merge_phases(campaign.phases),
+        'total_updates': total_updates,
+        'updates_per_sec': sum(p['answered'] for p in campaign.phases) / busy if busy else 0,
+        'calls_per_update': len(fake.calls) / total_updates,
+        'approved': approved,
+        'withdrawals': withdrawals,
+        'throttled_429': fake.throttled,
+        'outbound': outbound_stats,
+        'rss_import_mb': memory_start - memory_before_import,
+        'rss_growth_mb': rss_mb() - memory_start,
+        'rss_mb': rss_mb()
+    }
+
+
+def merge_phases(phases):
+    # The admin phases run once per submission; fold them into one row each
+    merged = {}
+    for phase in phases:
+        row = merged.get(phase['phase'])
+        if row is None:
+            merged[phase['phase']] = dict(phase, _n=1)
+            continue
+        n = row['_n']
+        for key in ('updates_per_sec', 'p50_ms', 'p95_ms', 'p99_ms', 'calls_per_update'):
+            if phase[key] is not None and row[key] is not None:
+                row[key] = (row[key] * n + phase[key]) / (n + 1)
+        row['p99_ms'] = max(row['p99_ms'] or 0, phase['p99_ms'] or 0)
+        row['updates'] += phase['updates']
+        row['answered'] += phase['answered']
+        row['seconds'] += phase['seconds']
+        row['rss_growth_mb'] += phase['rss_growth_mb']
+        row['_n'] = n + 1
+    for row in merged.values():
+        del row['_n']
+    return list(merged.values())
+
+
+def print_report(report, baseline=None):
+    base_phases = {p['phase']: p for p in (baseline or {}).get('phases', [])}
+
+    def delta(value, base):
+        if base in (None, 0) or value is None:
+            return ''
+        return f" ({(value - base) / base * 100:+.0f}%)"
+
+    print(f"{report['users']} users, {report['latency_ms']:.0f}ms simulated API latency, "
+          f"429 rate {report['error_rate']}, storage {report['storage']}\n")
+    print(f"{'phase':<14} {'updates':>8} {'answered':>8} {'updates/s':>16} {'p50 ms':>8} "
+          f"{'p95 ms':>8} {'p99 ms':>16} {'calls/upd':>9} {'RSS +MB':>8}")
+    for phase in report['phases']:
+        base = base_phases.get(phase['phase'], {})
+        print(f"{phase['phase']:<14} {phase['updates']:>8} {phase['answered']:>8} "
+              f"{phase['updates_per_sec']:>9,.0f}{delta(phase['updates_per_sec'], base.get('updates_per_sec')):>7} "
+              f"{phase['p50_ms'] or 0:>8.1f} {phase['p95_ms'] or 0:>8.1f} "
+              f"{phase['p99_ms'] or 0:>9.1f}{delta(phase['p99_ms'], base.get('p99_ms')):>7} "
+              f"{phase['calls_per_update']:>9.2f} {phase['rss_growth_mb']:>8.1f}")
+    print(f"\ntotal: {report['total_updates']} updates, "
+          f"{report['updates_per_sec']:,.0f} updates/sec{delta(report['updates_per_sec'], (baseline or {}).get('updates_per_sec'))}, "
+          f"{report['calls_per_update']:.2f} API calls/update")
+    print(f"approved {report['approved']} proofs, {report['withdrawals']} withdrawals requested")
+    print(f"429s injected: {report['throttled_429']}, outbound {report['outbound']}")
+    print(f"memory: bot import +{report['rss_import_mb']:.1f}MB, campaign "
+          f"+{report['rss_growth_mb']:.1f}MB{delta(report['rss_growth_mb'], (baseline or {}).get('rss_growth_mb'))}, "
+          f"RSS {report['rss_mb']:.1f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--approvals', type=int, default=200, help='proofs the admin approves')
+    parser.add_argument('--latency', type=float, default=0.02, help='simulated Bot API latency per call (seconds)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of API calls refused with a 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='retry_after sent with injected 429s')
+    parser.add_argument('--real-limits', action='store_true', help="keep Telegram's outbound rate limits")
+    parser.add_argument('--json', help='write the report here')
+    parser.add_argument('--compare', help='earlier --json report to show deltas against')
+    args = parser.parse_args()
+
+    # Fresh, throwaway state for every run; removed after the bot's own
+    # exit handlers (registered later, so run earlier) have flushed into it
+    workdir = tempfile.mkdtemp(prefix='load_test_')
+    atexit.register(shutil.rmtree, workdir, ignore_errors=True)
+    os.environ.setdefault('JOURNAL_DIR', os.path.join(workdir, 'journal'))
+    os.environ.setdefault('SQLITE_PATH', os.path.join(workdir, 'bot_data.db'))
+    os.environ['ACTIVITY_LOG_DIR'] = os.path.join(workdir, 'logs')
+    os.environ['ACTIVITY_LOG_CONSOLE'] = '0'  # keep the report readable
+    report = run_campaign(args)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Webhook replay: POSTs recorded updates (one JSON update per line) or
+synthetic /start updates to a running bot in INGEST_MODE=webhook and
+reports response codes, ingest rate and request latency.
+
+Usage:
+    INGEST_MODE=webhook WEBHOOK_SECRET=test python3 bot.py
+    python3 benchmarks/replay_webhook.py --secret test [--file updates.jsonl | --updates 2000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_telegram import message_update  # noqa: E402
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def load_updates(args):
+    if args.file:
+        with open(args.file, encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip()]
+    return [json.dumps(message_update(i, 100000 + i, '/start')) for i in range(1, args.updates + 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:8080/telegram/webhook')
+    parser.add_argument('--secret', required=True)
+    parser.add_argument('--file', help='recorded updates, one JSON object per line')
+    parser.add_argument('--updates', type=int, default=2000, help='synthetic updates when --file is not given')
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    updates = load_updates(args)
+    statuses = Counter()
+    latencies = []
+    lock = threading.Lock()
+    pending = iter(updates)
+
+    def sender():
+        session = requests.Session()
+        headers = {'X-Telegram-Bot-Api-Secret-Token': args.secret, 'Content-Type': 'application/json'}
+        while True:
+            with lock:
+                body = next(pending, None)
+            if body is None:
+                return
+            t0 = time.perf_counter()
+            status = session.post(args.url, data=body.encode('utf-8'), headers=headers).status_code
+            with lock:
+                statuses[status] += 1
+                latencies.append(time.perf_counter() - t0)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=sender) for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    print(f"posted {len(updates)} updates in {elapsed:.2f}s ({len(updates) / elapsed:,.0f}/sec)")
+    print("responses: " + ", ".join(f"{code}={count}" for code, count in sorted(statuses.items())))
+    print(f"latency p50 {percentile(latencies, 50) * 1000:.1f}ms, p99 {percentile(latencies, 99) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
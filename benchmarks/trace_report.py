@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Trace report: reads the JSON-lines spans the bot writes to TRACE_FILE and
+prints the slowest traces as span trees, plus where the time went by span
+name across all traces. Reads the file only; safe to run next to the bot.
+
+Usage:
+    python3 benchmarks/trace_report.py [traces.jsonl] [--top 10] [--name update.message]
+"""
+
+import argparse
+import json
+from collections import defaultdict
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def load_traces(path):
+    traces = defaultdict(list)
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                span = json.loads(line)
+                traces[span['trace_id']].append(span)
+    return traces
+
+
+def duration_ms(span):
+    return (span['end_time_unix_nano'] - span['start_time_unix_nano']) / 1e6
+
+
+def trace_bounds(spans):
+    # Outbound calls finish after the update span, so use the whole extent
+    return (min(s['start_time_unix_nano'] for s in spans),
+            max(s['end_time_unix_nano'] for s in spans))
+
+
+def print_tree(spans):
+    start, _ = trace_bounds(spans)
+    children = defaultdict(list)
+    ids = {s['span_id'] for s in spans}
+    for span in spans:
+        parent = span['parent_span_id'] if span['parent_span_id'] in ids else None
+        children[parent].append(span)
+
+    def walk(parent, depth):
+        for span in sorted(children[parent], key=lambda s: s['start_time_unix_nano']):
+            offset = (span['start_time_unix_nano'] - start) / 1e6
+            status = '' if span['status']['code'] == 'OK' else f"  !! {span['status'].get('message', '')}"
+            attributes = ' '.join(f"{k}={v}" for k, v in span['attributes'].items())
+            print(f"    {offset:>9.1f}ms {duration_ms(span):>9.1f}ms  {'  ' * depth}{span['name']}  {attributes}{status}")
+            walk(span['span_id'], depth + 1)
+
+    walk(None, 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('file', nargs='?', default='traces.jsonl')
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--name', help='only traces whose root span has this name')
+    args = parser.parse_args()
+
+    traces = load_traces(args.file)
+    if args.name:
+        traces = {tid: spans for tid, spans in traces.items()
+                  if any(s['parent_span_id'] is None and s['name'] == args.name for s in spans)}
+    if not traces:
+        print("No traces found")
+        return
+
+    totals = []
+    for trace_id, spans in traces.items():
+        start, end = trace_bounds(spans)
+        totals.append(((end - start) / 1e6, trace_id))
+    totals.sort(reverse=True)
+
+    print(f"{len(traces)} traces, p50 {percentile([t for t, _ in totals], 50):.1f}ms, "
+          f"p99 {percentile([t for t, _ in totals], 99):.1f}ms\n")
+    print(f"Slowest {min(args.top, len(totals))} traces:")
+    for total, trace_id in totals[:args.top]:
+        print(f"\n  trace {trace_id}  {total:.1f}ms")
+        print_tree(traces[trace_id])
+
+    by_name = defaultdict(list)
+    for spans in traces.values():
+        for span in spans:
+            by_name[span['name']].append(duration_ms(span))
+    print(f"\n{'span':<40} {'count':>7} {'p50 ms':>9} {'p99 ms':>9} {'total ms':>11}")
+    for name, durations in sorted(by_name.items(), key=lambda item: -sum(item[1])):
+        print(f"{name:<40} {len(durations):>7} {percentile(durations, 50):>9.2f} "
+              f"{percentile(durations, 99):>9.2f} {sum(durations):>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
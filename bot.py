@@ -81,6 +81,7 @@ User Commands:
 
 Admin Commands (Admin ID: 5367009004):
 - /admin या 🔧 Admin Panel - Admin panel access
+- /logs <user_id | upi | action> - Search the activity log history
 - Complete admin functionality through inline buttons
 
 HOW TO USE:
@@ -124,8 +125,102 @@ Referral Milestones:
 
 Task Rewards: ₹2-5 per completed task
 Referral Rewards: ₹2 per successful referral
+Task Limits: DAILY_TASK_LIMIT proofs in any 24 hours and MAX_TASKS_PER_USER
+in total (a rejected proof doesn't count towards the total)
 
-DATA STORAGE: All data stored in memory (no external files needed)
+DATA STORAGE:
+=============
+By default all data is stored in memory (no external files needed).
+For durable storage set STORAGE_BACKEND=sqlite; data then lives in a
+WAL-mode SQLite file at SQLITE_PATH (default: bot_data.db).
+STORAGE_BACKEND=journal keeps data in memory but appends every change to
+a journal in JOURNAL_DIR and writes periodic snapshots; a restart loads
+the newest snapshot and replays only the journal written after it.
+Snapshots hold ledger totals and the last LEDGER_RECENT_ENTRIES entries;
+before a snapshot deletes old journal segments, their ledger entries are
+written to a ledger-<seq>.jsonl file there, and those are never deleted.
+
+Multi-step flows (UPI entry, rejection reasons, new tasks, broadcasts)
+keep their state in the same backend, so with sqlite or journal a restart
+picks up where each user left off. States expire after CONVERSATION_TTL
+seconds and at most CONVERSATION_LIMIT are kept.
+
+In memory (and under the journal) each user is a slotted record with an
+epoch `joined` and completed tasks packed into an array; it still reads
+like a dict. Compare bytes per user with the old dict layout with:
+   python3 benchmarks/bench_records.py
+
+Check how the data helpers scale before a deploy with:
+   python3 benchmarks/bench_data.py --save baseline.json   (once)
+   python3 benchmarks/bench_data.py --compare baseline.json
+
+ENGINES:
+========
+BOT_ENGINE=sync (default) polls with the threaded TeleBot.
+BOT_ENGINE=async polls with AsyncTeleBot over a pooled aiohttp session
+(pip install aiohttp); updates are dispatched to the same handlers off
+its event loop and outbound API calls share its connection pool.
+With either engine, and in webhook mode, handlers run on UPDATE_LANES
+threads. All updates from one user share a lane and run in order, one at
+a time; admin updates and button taps go ahead of queued messages. When
+a lane has UPDATE_LANE_DEPTH updates waiting, ingestion slows down and
+then sheds user messages (bot_updates_shed_total).
+Before any of that, each user's messages and button taps pass flood
+control: FLOOD_BURST at once, then FLOOD_RATE per second. Excess updates
+are dropped without a reply (bot_flood_dropped_total). Users who keep
+flooding are muted for FLOOD_BLOCK_SECONDS (doubling each time) and after
+FLOOD_MAX_BLOCKS mutes are blocked; FLOOD_BLOCK_DECAY seconds without a
+dropped update clear the mute count.
+Compare both with: python3 benchmarks/bench_engines.py
+Measure capacity for a whole campaign (signups, tasks, proofs, approvals,
+withdrawals) against a local fake Bot API with:
+   python3 benchmarks/load_test.py --users 2000 --json report.json
+
+WEBHOOK MODE:
+=============
+INGEST_MODE=webhook receives updates on POST /telegram/webhook of the
+built-in web server instead of polling. Set WEBHOOK_URL to the public
+https base URL and the bot registers itself with Telegram; requests
+without the right X-Telegram-Bot-Api-Secret-Token header (WEBHOOK_SECRET)
+are rejected. Updates are queued, parsed by one ingest thread (so each
+user's updates keep their order) and handed to the same per-user lanes
+as polled updates; when
+WEBHOOK_QUEUE_SIZE are waiting, Telegram gets a 503 and retries.
+
+To test offline, leave WEBHOOK_URL unset, optionally point the bot at a
+fake API (TELEGRAM_API_URL, see benchmarks/fake_telegram.py) and POST
+recorded updates to the local endpoint:
+   INGEST_MODE=webhook WEBHOOK_SECRET=test python3 bot.py
+   curl -X POST http://localhost:8080/telegram/webhook \\
+        -H 'X-Telegram-Bot-Api-Secret-Token: test' \\
+        -H 'Content-Type: application/json' -d @update.json
+or replay many at once with benchmarks/replay_webhook.py.
+
+MONITORING:
+===========
+http://localhost:8080/metrics serves Prometheus-format metrics: update
+counts by type, per-handler latency histograms and error counts, Telegram
+API latency and errors by method, outbound queue wait and depth, webhook
+queue depth, callback acknowledgement latency and store sizes.
+
+A sampled share of updates (TRACE_SAMPLE_RATE, default 1%) is traced:
+each gets a span tree covering handler dispatch, store calls and every
+Telegram API call it caused, appended as JSON lines to TRACE_FILE. No
+collector is needed; summarize the slowest with:
+   python3 benchmarks/trace_report.py traces.jsonl
+
+Activity events are structured records (action, user_id, amount, ...).
+The last ACTIVITY_LOG_BUFFER are kept in memory for the admin Logs view;
+all of them are written in the background to size-rotated gzip JSON-lines
+segments in ACTIVITY_LOG_DIR (read with: zcat logs/activity-*.jsonl.gz)
+and echoed to stderr (ACTIVITY_LOG_CONSOLE=0 turns that off).
+
+LANGUAGES:
+==========
+User-facing copy lives in the MESSAGES catalogue, one entry per locale
+(Hindi 'hi' is the default, see DEFAULT_LOCALE). Users whose Telegram
+language has a catalogue entry get that copy; add a language by adding
+a locale with the same keys.
 
 Author: TaskCompleteRewardsBot Team
 Version: 2.0 (Single File Complete)
@@ -133,15 +228,45 @@ License: MIT
 """
 
 import os
-import threading
-import time
+import sys
+import gzip
+import zlib
+import queue
 import random
+import asyncio
+import json
+import hmac
+import base64
+import atexit
+import hashlib
+import functools
+import heapq
+import sqlite3
+import itertools
 import string
+import contextvars
+import threading
+import time
+import uuid
 import requests
-from datetime import datetime
-from flask import Flask
+from array import array
+from bisect import bisect_left
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from itertools import islice
+from flask import Flask, Response, request
 import telebot
 from telebot import types
+from telebot.apihelper import ApiTelegramException
+
+try:
+    from telebot import asyncio_helper
+    from telebot.async_telebot import AsyncTeleBot
+except ImportError:  # aiohttp not installed; only BOT_ENGINE=sync is available
+    asyncio_helper = None
+    AsyncTeleBot = None
 
 # ======================
 # Configuration
@@ -153,6 +278,86 @@ MIN_WITHDRAWAL = 10  # ₹10 minimum withdrawal
 REWARD_PER_REFERRAL = 2  # ₹2 per referral
 MAX_TASKS_PER_USER = 10  # Increased limit
 DAILY_TASK_LIMIT = 20  # Increased limit
+QUOTA_CACHE_SIZE = 100000  # Users whose task quota counters stay in memory
+
+# Storage backend: 'memory' (default, lost on restart), 'sqlite' or 'journal' (durable)
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'memory')
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'bot_data.db')
+JOURNAL_DIR = os.getenv('JOURNAL_DIR', 'journal')
+JOURNAL_COMMIT_INTERVAL = float(os.getenv('JOURNAL_COMMIT_INTERVAL', '0.05'))  # Group-commit window (seconds)
+SNAPSHOT_INTERVAL = int(os.getenv('SNAPSHOT_INTERVAL', '300'))  # Seconds between snapshots
+LEDGER_LOCK_STRIPES = 64  # Per-user balance locks are striped over this many locks
+LEDGER_RECENT_ENTRIES = 1000  # Ledger entries kept in memory; older ones survive as account totals
+REFERRAL_SECRET = os.getenv('REFERRAL_SECRET', BOT_TOKEN)  # Key for referral code checksums
+
+# Update engine: 'sync' (threaded TeleBot polling) or 'async' (AsyncTeleBot on aiohttp)
+BOT_ENGINE = os.getenv('BOT_ENGINE', 'sync')
+ASYNC_CONNECTION_LIMIT = int(os.getenv('ASYNC_CONNECTION_LIMIT', '50'))  # Pooled aiohttp connections
+
+# Update ingestion: 'polling' (getUpdates) or 'webhook' (Telegram POSTs updates to us)
+INGEST_MODE = os.getenv('INGEST_MODE', 'polling')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')  # Public https base URL; empty = don't register with Telegram
+WEBHOOK_PATH = '/telegram/webhook'
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET') or hashlib.sha256(f"webhook:{BOT_TOKEN}".encode()).hexdigest()
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))  # Parallel deliveries Telegram may open
+WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', '1000'))  # Updates beyond this get a 503
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', '')  # e.g. http://localhost:8081/bot{0}/{1} for a fake API
+
+# Tracing: a sampled share of updates is traced and appended to TRACE_FILE as JSON lines
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0.01'))  # 0 disables tracing
+TRACE_FILE = os.getenv('TRACE_FILE', 'traces.jsonl')
+TRACE_FLUSH_INTERVAL = 2  # Seconds between batched writes
+
+# Update executor: handlers run on per-user lanes (every engine and ingest mode)
+UPDATE_LANES = int(os.getenv('UPDATE_LANES', '8'))  # Worker threads; one user's updates stay on one lane
+UPDATE_LANE_DEPTH = int(os.getenv('UPDATE_LANE_DEPTH', '500'))  # Queued updates per lane before backpressure
+UPDATE_BACKPRESSURE_TIMEOUT = 1.0  # Seconds ingestion waits for room before shedding a user message
+
+# Flood control: per-user admission before dispatch (admin exempt)
+FLOOD_RATE = float(os.getenv('FLOOD_RATE', '1'))  # Sustained updates/sec per user
+FLOOD_BURST = int(os.getenv('FLOOD_BURST', '10'))  # Updates a user may send at once
+FLOOD_STRIKES = 30  # Dropped updates within FLOOD_STRIKE_WINDOW that earn a temporary block
+FLOOD_STRIKE_WINDOW = 60  # Seconds
+FLOOD_BLOCK_SECONDS = 300  # First temporary block; each later one doubles
+FLOOD_MAX_BLOCKS = 3  # Temporary blocks before the user is blocked for good (block_user)
+FLOOD_BLOCK_DECAY = 86400  # Seconds without a dropped update after which earlier blocks are forgotten
+FLOOD_STATE_LIMIT = 100000  # Users whose flood state stays in memory
+
+# Outbound Telegram API traffic (Telegram allows ~30 msg/s overall, ~1 msg/s per chat)
+OUTBOUND_WORKERS = int(os.getenv('OUTBOUND_WORKERS', '4'))
+OUTBOUND_GLOBAL_RATE = float(os.getenv('OUTBOUND_GLOBAL_RATE', '30'))
+OUTBOUND_CHAT_RATE = float(os.getenv('OUTBOUND_CHAT_RATE', '1'))
+OUTBOUND_CHAT_BURST = int(os.getenv('OUTBOUND_CHAT_BURST', '3'))
+
+# Inline button payloads are short tokens resolved server-side
+CALLBACK_TOKEN_CAPACITY = 50000
+CALLBACK_TOKEN_TTL = 7 * 24 * 3600  # Seconds a button keeps working
+CALLBACK_TOKENS_FILE = os.getenv('CALLBACK_TOKENS_FILE', '')  # Persist tokens across restarts if set
+CALLBACK_TOKENS_SAVE_INTERVAL = 60  # Seconds between saves of new tokens; pinned ones are saved at once
+
+# Multi-step conversation state, kept in the storage backend
+CONVERSATION_TTL = int(os.getenv('CONVERSATION_TTL', '1800'))  # Seconds an unanswered prompt stays open
+CONVERSATION_LIMIT = 100000  # Oldest states beyond this are dropped
+CONVERSATION_SWEEP_INTERVAL = 60  # Seconds between expiry sweeps
+
+# Activity log: ring buffer for the admin view, gzip JSON-lines segments on disk
+ACTIVITY_LOG_BUFFER = 1000  # Entries kept in memory
+ACTIVITY_LOG_DIR = os.getenv('ACTIVITY_LOG_DIR', 'logs')  # Empty = console only
+ACTIVITY_LOG_CONSOLE = os.getenv('ACTIVITY_LOG_CONSOLE', '1') == '1'  # Also echo entries to stderr
+ACTIVITY_LOG_SEGMENT_BYTES = 8 * 1024 * 1024  # Rotate segments at this size
+ACTIVITY_LOG_RETAIN_SEGMENTS = 100
+ACTIVITY_LOG_FLUSH_INTERVAL = 1.0  # Seconds between batched writes
+ACTIVITY_LOG_PAGE_SIZE = 10  # Entries per /logs search page
+
+# User-facing copy: message catalogue locale used when the user's language has none
+DEFAULT_LOCALE = os.getenv('DEFAULT_LOCALE', 'hi')
+BOT_IDENTITY_REFRESH = 3600  # Seconds between get_me refreshes
+BOT_USERNAME_FALLBACK = 'TaskCompleteRewardsBot'  # Used until get_me succeeds
+
+# Broadcasts
+BROADCAST_PAGE_SIZE = 100  # Users sent per checkpoint
+BROADCAST_PROGRESS_INTERVAL = 5  # Seconds between progress message edits
+BROADCAST_PAGE_TIMEOUT = 300  # Seconds to wait for a page's sends before counting the rest as failed
 
 # Milestone bonuses for referrals
 MILESTONE_BONUSES = {
@@ -173,7 +378,429 @@ TASK_TYPES = {
 }
 
 # ======================
-# In-Memory Data Storage (No External Files)
+# Tracing
+# ======================
+
+# Span of the update being handled on this thread/task (None = not sampled)
+current_span = contextvars.ContextVar('current_span', default=None)
+
+class Span:
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'attributes', 'start_ns', 'end_ns', 'error')
+
+    def __init__(self, name, trace_id, parent_id=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = attributes or {}
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def child(self, name, **attributes):
+        return Span(name, self.trace_id, self.span_id, attributes)
+
+    def finish(self):
+        self.end_ns = time.time_ns()
+        trace_exporter.export(self)
+
+    def to_dict(self):
+        # Field names follow the OTLP JSON span encoding
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_span_id': self.parent_id,
+            'name': self.name,
+            'start_time_unix_nano': self.start_ns,
+            'end_time_unix_nano': self.end_ns,
+            'attributes': self.attributes,
+            'status': {'code': 'ERROR', 'message': self.error} if self.error else {'code': 'OK'}
+        }
+
+
+class TraceExporter:
+    # Buffers finished spans and appends them to a JSON-lines file from a
+    # background thread, one write per batch. Nothing needs to be listening.
+
+    def __init__(self, path, flush_interval=2, max_buffer=10000):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.dropped = 0
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._started = False
+
+    def export(self, span):
+        with self._lock:
+            if len(self._buffer) >= self.max_buffer:
+                self.dropped += 1
+                return
+            self._buffer.append(span)
+            if not self._started:
+                self._started = True
+                threading.Thread(target=self._run, name="trace-exporter", daemon=True).start()
+
+    def flush(self):
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if batch:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(''.join(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + '\n' for span in batch))
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                log_activity(f"Trace export failed: {str(e)}")
+
+trace_exporter = TraceExporter(TRACE_FILE, flush_interval=TRACE_FLUSH_INTERVAL)
+atexit.register(trace_exporter.flush)
+
+def start_trace(name, **attributes):
+    # Root span for one update, or None when the update is not sampled
+    if random.random() >= TRACE_SAMPLE_RATE:
+        return None
+    return Span(name, os.urandom(16).hex(), attributes=attributes)
+
+@contextmanager
+def start_span(name, parent=None, **attributes):
+    # Child of `parent` (or of the current span); a no-op outside a sampled trace
+    parent = parent if parent is not None else current_span.get()
+    if parent is None:
+        yield None
+        return
+    span = parent.child(name, **attributes)
+    token = current_span.set(span)
+    try:
+        yield span
+    except Exception as e:
+        span.error = repr(e)
+        raise
+    finally:
+        current_span.reset(token)
+        span.finish()
+
+def traced(kind):
+    # Decorator: runs the function in a "<kind>.<name>" span when traced
+    def decorator(function):
+        name = f"{kind}.{function.__name__}"
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if current_span.get() is None:
+                return function(*args, **kwargs)
+            with start_span(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+    return decorator
+
+# ======================
+# Metrics
+# ======================
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _label_text(self, key, extra=()):
+        pairs = list(zip(self.labels, key)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{label}="{value}"' for label, value in pairs) + '}'
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name} {value}" for name, value in self.samples())
+        return lines
+
+
+class CounterMetric(Metric):
+    kind = 'counter'
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield self.name + self._label_text(key), value
+
+
+class GaugeMetric(Metric):
+    # Read at scrape time; fn returns a number, or {label values: number}
+    # when the gauge has labels
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, fn, labels=()):
+        super().__init__(name, help_text, labels)
+        self.fn = fn
+
+    def samples(self):
+        value = self.fn()
+        if not self.labels:
+            yield self.name, value
+            return
+        for key, item in sorted(value.items()):
+            yield self.name + self._label_text(key), item
+
+
+class HistogramMetric(Metric):
+    kind = 'histogram'
+    DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = buckets
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            child = self._values.get(label_values)
+            if child is None:
+                # Per-bucket counts (last slot is +Inf) and the running sum
+                child = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            child[0][index] += 1
+            child[1] += value
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{self._label_text(key, [('le', bound)])}", cumulative
+            yield f"{self.name}_sum{self._label_text(key)}", round(total, 6)
+            yield f"{self.name}_count{self._label_text(key)}", cumulative
+
+
+METRICS = []
+
+def register_metric(metric):
+    METRICS.append(metric)
+    return metric
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+updates_received = register_metric(CounterMetric(
+    'bot_updates_received_total', 'Updates received from Telegram', ('type',)))
+handler_seconds = register_metric(HistogramMetric(
+    'bot_handler_seconds', 'Handler run time', ('handler',)))
+handler_errors = register_metric(CounterMetric(
+    'bot_handler_errors_total', 'Handlers that raised', ('handler',)))
+api_seconds = register_metric(HistogramMetric(
+    'bot_telegram_api_seconds', 'Telegram API call latency', ('method',)))
+api_errors = register_metric(CounterMetric(
+    'bot_telegram_api_errors_total', 'Failed Telegram API calls', ('method', 'code')))
+outbound_wait_seconds = register_metric(HistogramMetric(
+    'bot_outbound_queue_wait_seconds', 'Time from enqueue to send, including rate limiting', ('priority',)))
+update_wait_seconds = register_metric(HistogramMetric(
+    'bot_update_queue_wait_seconds', 'Time an update waits on its lane before a handler runs', ('priority',)))
+callback_ack_seconds = register_metric(HistogramMetric(
+    'bot_callback_ack_seconds', 'Time from a callback query arriving to Telegram accepting its answer'))
+updates_shed = register_metric(CounterMetric(
+    'bot_updates_shed_total', 'Updates dropped because their lane stayed full', ('priority',)))
+flood_dropped = register_metric(CounterMetric(
+    'bot_flood_dropped_total', 'Updates dropped by flood control before dispatch', ('reason',)))
+quota_rejections = register_metric(CounterMetric(
+    'bot_quota_rejections_total', 'Task attempts refused by a task quota', ('limit',)))
+
+UPDATE_TYPES = ('message', 'callback_query', 'edited_message', 'my_chat_member')
+
+def timed_handler(function):
+    name = function.__name__
+
+    @functools.wraps(function)
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            if current_span.get() is None:
+                return function(*args, **kwargs)
+            with start_span(f"handler.{name}"):
+                return function(*args, **kwargs)
+        except Exception:
+            handler_errors.inc(name)
+            raise
+        finally:
+            handler_seconds.observe(time.perf_counter() - start, name)
+
+    return timed
+
+
+class RewardsBot(telebot.TeleBot):
+    # TeleBot that counts incoming updates and times every handler under
+    # its function name. Sampled updates are handled one at a time inside
+    # their root span, whose context follows the handler onto TeleBot's
+    # worker threads. Messages from a chat in the middle of a conversation
+    # go to that conversation's step instead of the regular handlers.
+    # Updates refused by flood control are dropped before any of this.
+
+    conversations = None  # Set by ConversationStore.install
+    executor = None  # KeyedExecutor; TeleBot's own pool is used when unset
+    flood_control = None  # FloodControl; every update is admitted when unset
+
+    def process_new_updates(self, updates):
+        batch = []
+        for update in updates:
+            update_type = next((t for t in UPDATE_TYPES if getattr(update, t, None)), 'other')
+            updates_received.inc(update_type)
+            if self.flood_control is not None and not self.flood_control.admit(update, update_type):
+                continue
+            if update.callback_query:
+                callback_acks.received(update.callback_query.id)
+            root = start_trace(f"update.{update_type}", update_id=update.update_id)
+            if root is None:
+                batch.append(update)
+                continue
+            # Keep update order: handle the untraced ones before this one
+            if batch:
+                super().process_new_updates(batch)
+                batch = []
+            token = current_span.set(root)
+            try:
+                super().process_new_updates([update])
+            finally:
+                current_span.reset(token)
+                root.finish()
+        if batch:
+            super().process_new_updates(batch)
+
+    def _exec_task(self, task, *args, **kwargs):
+        if current_span.get() is not None:
+            task = functools.partial(contextvars.copy_context().run, task)
+        if not self.threaded or self.executor is None:
+            return super()._exec_task(task, *args, **kwargs)
+        # args[0] is the message or callback query the task handles
+        update = args[0] if args else None
+        user = getattr(update, 'from_user', None)
+        key = user.id if user is not None else getattr(getattr(update, 'chat', None), 'id', None)
+        urgent = isinstance(update, types.CallbackQuery) or (key is not None and is_admin(key))
+        priority = KeyedExecutor.HIGH if urgent else KeyedExecutor.NORMAL
+        self.executor.submit(key, priority, task, *args, **kwargs)
+
+    def add_message_handler(self, handler_dict):
+        handler_dict['function'] = timed_handler(handler_dict['function'])
+        super().add_message_handler(handler_dict)
+
+    def add_callback_query_handler(self, handler_dict):
+        handler_dict['function'] = timed_handler(handler_dict['function'])
+        super().add_callback_query_handler(handler_dict)
+
+    def _notify_next_handlers(self, new_messages):
+        if self.conversations is None:
+            return super()._notify_next_handlers(new_messages)
+        remaining = []
+        for message in new_messages:
+            step = self.conversations.resume(message)
+            if step is None:
+                remaining.append(message)
+            else:
+                handler, data = step
+                self._exec_task(handler, message, **data)
+        new_messages[:] = remaining
+
+# ======================
+# Update Executor
+# ======================
+
+class ExecutorLane:
+    def __init__(self):
+        self.heap = []
+        self.cond = threading.Condition()
+        self.busy = False
+
+
+class KeyedExecutor:
+    # Replaces TeleBot's worker pool. Updates are hashed by user id onto
+    # lanes that each run one handler at a time, so a user's updates run in
+    # order and never concurrently (two quick taps can't race), while other
+    # users proceed in parallel on the other lanes. Admin updates and
+    # callback queries jump ahead of the messages queued on their lane.
+    # A lane holding `depth` updates makes the submitting (polling or
+    # webhook) thread wait up to block_timeout for room, which slows
+    # ingestion; after that a normal update is shed. HIGH is never shed.
+
+    HIGH = 0
+    NORMAL = 1
+
+    def __init__(self, lanes=8, depth=500, block_timeout=1.0, on_error=None):
+        self.lanes = [ExecutorLane() for _ in range(lanes)]
+        self.depth = depth
+        self.block_timeout = block_timeout
+        self.on_error = on_error
+        self.stats = Counter()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for i, lane in enumerate(self.lanes):
+            threading.Thread(target=self._worker, args=(lane,), name=f"update-lane-{i}", daemon=True).start()
+
+    def submit(self, key, priority, task, *args, **kwargs):
+        if not self._started:
+            self.start()
+        lane = self.lanes[hash(key) % len(self.lanes)]
+        with lane.cond:
+            if priority != self.HIGH and len(lane.heap) >= self.depth:
+                deadline = time.monotonic() + self.block_timeout
+                while len(lane.heap) >= self.depth:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stats['shed'] += 1
+                        updates_shed.inc(priority)
+                        return False
+                    lane.cond.wait(remaining)
+            heapq.heappush(lane.heap, (priority, next(self._seq), time.monotonic(), task, args, kwargs))
+            lane.cond.notify_all()
+        return True
+
+    def queue_depth(self):
+        return sum(len(lane.heap) for lane in self.lanes)
+
+    def in_flight(self):
+        return sum(lane.busy for lane in self.lanes)
+
+    def _worker(self, lane):
+        while True:
+            with lane.cond:
+                while not lane.heap:
+                    lane.cond.wait()
+                priority, _, enqueued_at, task, args, kwargs = heapq.heappop(lane.heap)
+                lane.busy = True
+                lane.cond.notify_all()  # room for a blocked submitter
+            update_wait_seconds.observe(time.monotonic() - enqueued_at, priority)
+            try:
+                task(*args, **kwargs)
+            except Exception as e:
+                if self.on_error is None or not self.on_error(e):
+                    telebot.logger.error("Handler exception: %s", e, exc_info=True)
+            finally:
+                lane.busy = False
+                self.stats['done'] += 1
+
+# ======================
+# In-Memory Data Storage (Default Backend)
 # ======================
 
 # Users database
@@ -244,105 +871,2848 @@ SUBMISSIONS_DB = {}
 # Withdrawals database
 WITHDRAWALS_DB = []
 
-# Activity logs
-ACTIVITY_LOGS = []
+# Most recent balance ledger entries. The full history is kept by the durable
+# backends: SQLite's ledger table, or the journal plus its ledger-*.jsonl
+# archive (JournalStorage.ledger_history). The memory backend keeps only these.
+LEDGER_DB = deque(maxlen=LEDGER_RECENT_ENTRIES)
 
-# Global variables
-blocked_users = set()
-user_current_task = {}
+# Broadcast jobs with their checkpointed cursor
+BROADCASTS_DB = {}
 
-# Initialize bot
-bot = telebot.TeleBot(BOT_TOKEN)
+# Conversation states by "<slot>:<chat_id>", oldest write first
+CONVERSATIONS_DB = {}
+
+# Activity logs (most recent entries)
+ACTIVITY_LOGS = deque(maxlen=ACTIVITY_LOG_BUFFER)
 
 # ======================
-# Database Functions (In-Memory)
+# Compact Records
 # ======================
 
-def log_activity(message):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    ACTIVITY_LOGS.append({
-        'timestamp': timestamp,
-        'message': message
-    })
-    # Keep only last 100 logs to prevent memory overflow
-    if len(ACTIVITY_LOGS) > 100:
-        ACTIVITY_LOGS.pop(0)
-    print(f"[{timestamp}] {message}")
+EPOCH = datetime(1970, 1, 1)
+ONE_SECOND = timedelta(seconds=1)
 
-def generate_referral_code(user_id):
-    return f"REF-{user_id}-{''.join(random.choices(string.ascii_uppercase + string.digits, k=6))}"
+def to_epoch(value):
+    # "YYYY-MM-DD HH:MM:SS" -> int seconds. Naive arithmetic, so the value
+    # formats back to the same string whatever the local DST rules; anything
+    # unparseable is kept as it was.
+    if value is None or isinstance(value, int):
+        return value
+    try:
+        return (datetime.fromisoformat(value) - EPOCH) // ONE_SECOND
+    except (TypeError, ValueError):
+        return value
 
-def is_admin(user_id):
-    return int(user_id) == ADMIN_ID
+def format_epoch(value):
+    if not isinstance(value, int):
+        return value
+    return str(EPOCH + timedelta(seconds=value))
+
+class TaskCodes:
+    # Small integer per task id, so a completion packs into two array items.
+    # Codes live only in this process; persisted data keeps the task ids.
+
+    def __init__(self):
+        self._ids = []
+        self._codes = {}
+        self._lock = threading.Lock()
+
+    def code(self, task_id):
+        code = self._codes.get(task_id)
+        if code is None:
+            with self._lock:
+                code = self._codes.get(task_id)
+                if code is None:
+                    code = self._codes[task_id] = len(self._ids)
+                    self._ids.append(task_id)
+        return code
+
+    def task_id(self, code):
+        return self._ids[code]
+
+task_codes = TaskCodes()
+
+class Record:
+    # A __slots__ object that reads and writes like the dict it replaces:
+    # record['balance'], record.get(...), 'x' in record, dict(record). Keys in
+    # FIELDS live in same-named slots (an unset slot is a missing key);
+    # anything else goes through _lookup/_store, which subclasses extend for
+    # keys kept in another form, and otherwise lands in a per-record `extra`
+    # dict that is only created when needed.
+
+    __slots__ = ('extra',)
+    FIELDS = ()
+
+    @classmethod
+    def from_dict(cls, data):
+        if isinstance(data, cls):
+            return data
+        record = cls()
+        fields = cls.FIELDS
+        for key, value in data.items():
+            if key in fields:
+                setattr(record, key, value)
+            else:
+                record._store(key, value)
+        return record
+
+    def _lookup(self, key):
+        extra = getattr(self, 'extra', None)
+        if extra is None or key not in extra:
+            raise KeyError(key)
+        return extra[key]
+
+    def _store(self, key, value):
+        if getattr(self, 'extra', None) is None:
+            self.extra = {}
+        self.extra[key] = value
+
+    def _other_keys(self):
+        return list(getattr(self, 'extra', None) or ())
+
+    def __getitem__(self, key):
+        if key in self.FIELDS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        return self._lookup(key)
+
+    def __setitem__(self, key, value):
+        if key in self.FIELDS:
+            setattr(self, key, value)
+        else:
+            self._store(key, value)
+
+    def get(self, key, default=None):
+        if key in self.FIELDS:
+            return getattr(self, key, default)
+        try:
+            return self._lookup(key)
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        if key in self.FIELDS:
+            return hasattr(self, key)
+        try:
+            self._lookup(key)
+        except KeyError:
+            return False
+        return True
+
+    def keys(self):
+        return [key for key in self.FIELDS if hasattr(self, key)] + self._other_keys()
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __bool__(self):
+        # `if not user:` is common; stop at the first key instead of len()
+        for key in self.FIELDS:
+            if hasattr(self, key):
+                return True
+        return bool(self._other_keys())
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def __eq__(self, other):
+        return dict(self.items()) == dict(other.items()) if hasattr(other, 'items') else NotImplemented
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self.items())!r})"
+
+class UserRecord(Record):
+    # `joined` is held as epoch seconds and completed_tasks as a packed
+    # array of (task code, epoch) pairs, read back as [{'task_id',
+    # 'completed_at'}]; the task's title and reward are in the catalogue and
+    # no longer copied per completion.
+
+    FIELDS = ('id', 'first_name', 'balance', 'referrals', 'referral_code', 'blocked')
+    __slots__ = FIELDS + ('joined_at', 'completions')
+
+    def _lookup(self, key):
+        if key == 'joined':
+            try:
+                return format_epoch(self.joined_at)
+            except AttributeError:
+                raise KeyError(key) from None
+        if key == 'completed_tasks':
+            return self.completed_tasks()
+        return super()._lookup(key)
+
+    def _store(self, key, value):
+        if key == 'joined':
+            self.joined_at = to_epoch(value)
+        elif key == 'completed_tasks':
+            self.completions = None
+            for task in value or ():
+                self.add_completion(task['task_id'], task.get('completed_at'))
+        else:
+            super()._store(key, value)
+
+    def _other_keys(self):
+        keys = ['joined'] if hasattr(self, 'joined_at') else []
+        return keys + ['completed_tasks'] + super()._other_keys()
+
+    def add_completion(self, task_id, completed_at):
+        completions = getattr(self, 'completions', None)
+        if completions is None:
+            completions = self.completions = array('I')
+        at = to_epoch(completed_at)
+        completions.extend((task_codes.code(task_id), at if isinstance(at, int) else 0))
+
+    def completed_tasks(self):
+        completions = getattr(self, 'completions', None) or ()
+        return [
+            {'task_id': task_codes.task_id(completions[i]), 'completed_at': format_epoch(completions[i + 1] or None)}
+            for i in range(0, len(completions), 2)
+        ]
+
+class SubmissionRecord(Record):
+    # Timestamps stay strings here: the review queue shows them on every
+    # read, and formatting an epoch each time costs more than it saves
+    FIELDS = ('id', 'task_id', 'file_id', 'status', 'submitted_at', 'processed_at', 'reason')
+    __slots__ = FIELDS
+
+# ======================
+# Storage Backends
+# ======================
+
+class MemoryStorage:
+    # Default backend: plain dicts/lists, lost on restart. Users are
+    # UserRecords keyed by the integer id and submissions are
+    # SubmissionRecords; both read like the dicts they are built from.
+
+    name = 'memory'
+
+    # User fields summed into user_counts as users are written
+    COUNTED_FIELDS = ('blocked', 'balance', 'referrals')
+
+    def __init__(self, users=None, tasks=None, submissions=None, withdrawals=None, ledger=None,
+                 broadcasts=None, conversations=None):
+        self.users = users if users is not None else {}
+        self.tasks = tasks if tasks is not None else []
+        self.submissions = submissions if submissions is not None else {}
+        self.withdrawals = withdrawals if withdrawals is not None else []
+        self.ledger = ledger if ledger is not None else deque(maxlen=LEDGER_RECENT_ENTRIES)
+        self.broadcasts = broadcasts if broadcasts is not None else {}
+        self.conversations = conversations if conversations is not None else {}
+        self.ledger_totals = {}  # system account -> net amount posted to it
+        self.user_counts = dict.fromkeys(self.COUNTED_FIELDS, 0)  # sums over all users, for /stats
+        self._user_order = []  # ids in registration order, for O(page) broadcast paging
+        self._submission_lock = threading.Lock()
+        self._conversation_lock = threading.Lock()
+        self._compact_records()
+        self._rebuild_submission_index()
+        self._rebuild_withdrawal_index()
+
+    def _compact_records(self):
+        # Converts dicts handed in (or loaded from a snapshot) in place
+        users = list(self.users.items())
+        self.users.clear()
+        self._user_order.clear()
+        self.user_counts = dict.fromkeys(self.COUNTED_FIELDS, 0)
+        for user_id, data in users:
+            MemoryStorage.put_user(self, user_id, data)  # not journaled: this is the state being loaded
+        for subs in self.submissions.values():
+            subs[:] = [SubmissionRecord.from_dict(sub) for sub in subs]
+
+    # Users
+
+    def get_user(self, user_id):
+        return self.users.get(int(user_id))
+
+    def put_user(self, user_id, data):
+        key = int(user_id)
+        record = UserRecord.from_dict(data)
+        if record.get('id') == key:
+            record.id = key  # share the key's int instead of holding a copy
+        old = self.users.get(key)
+        if old is None:
+            self._user_order.append(key)
+        else:
+            self._count_user(old, -1)
+        self._count_user(record, 1)
+        self.users[key] = record
+
+    def set_user_field(self, user_id, field, value):
+        key = int(user_id)
+        if key not in self.users:
+            self.users[key] = UserRecord()
+            self._user_order.append(key)
+        record = self.users[key]
+        if field in self.user_counts:
+            self.user_counts[field] += int(value or 0) - int(record.get(field) or 0)
+        record[field] = value
+
+    def _count_user(self, record, sign):
+        counts = self.user_counts
+        for field in self.COUNTED_FIELDS:
+            counts[field] += sign * int(getattr(record, field, 0) or 0)
+
+    def add_completion(self, user_id, task_id, completed_at):
+        user = self.users.get(int(user_id))
+        if user is None:
+            return False
+        user.add_completion(task_id, completed_at)
+        return True
+
+    def count_users(self):
+        return len(self.users)
+
+    def user_page(self, cursor, limit):
+        # Users in registration order; the cursor is a position in that
+        # order, so a page costs O(limit) however deep the broadcast is
+        cursor = cursor or 0
+        users = self.users
+        page = [(str(uid), users[uid]) for uid in self._user_order[cursor:cursor + limit]]
+        return page, cursor + len(page)
+
+    def blocked_user_ids(self):
+        return [str(uid) for uid, data in self.users.items() if getattr(data, 'blocked', False)]
+
+    def user_totals(self):
+        return {'users': len(self.users), **self.user_counts}
+
+    def top_users_by_balance(self, limit):
+        top = heapq.nlargest(limit, self.users.items(), key=lambda x: getattr(x[1], 'balance', 0))
+        return [(str(uid), data) for uid, data in top]
+
+    # Tasks
+
+    def get_tasks(self):
+        return self.tasks
+
+    def add_task(self, task):
+        self.tasks.append(task)
+
+    def update_task(self, task_id, field, value):
+        for task in self.tasks:
+            if task['id'] == task_id:
+                task[field] = value
+                return True
+        return False
+
+    def increment_task_completions(self, task_id):
+        for task in self.tasks:
+            if task['id'] == task_id:
+                task['completed_count'] = task.get('completed_count', 0) + 1
+                return True
+        return False
+
+    # Submissions
+    #
+    # Besides the per-user lists, submissions are indexed by id: `pending` is
+    # the review queue in submission order, `pending_by_key` finds the oldest
+    # pending submission for a (user, task) pair and `submission_counts`
+    # holds per-status totals. All of them are kept up to date on every write.
+
+    def _rebuild_submission_index(self):
+        self.pending = OrderedDict()
+        self.pending_by_key = {}
+        self.submission_counts = Counter()
+        self.next_submission_id = 1 + max(
+            (s.get('id', 0) for subs in self.submissions.values() for s in subs), default=0
+        )
+        indexed = []
+        for user_id, subs in self.submissions.items():
+            for sub in subs:
+                if 'id' not in sub:
+                    sub['id'] = self.next_submission_id
+                    self.next_submission_id += 1
+                indexed.append((sub['id'], user_id, sub))
+        for _, user_id, sub in sorted(indexed, key=lambda x: x[0]):
+            self._index_submission(user_id, sub)
+
+    def _index_submission(self, user_id, sub):
+        self.submission_counts[sub['status']] += 1
+        if sub['status'] == 'pending':
+            self.pending[sub['id']] = (user_id, sub)
+            self.pending_by_key.setdefault((user_id, sub['task_id']), deque()).append(sub['id'])
+
+    def add_submission(self, user_id, submission):
+        with self._submission_lock:
+            if 'id' not in submission:
+                submission['id'] = self.next_submission_id
+            self.next_submission_id = max(self.next_submission_id, submission['id'] + 1)
+            if str(user_id) not in self.submissions:
+                self.submissions[str(user_id)] = []
+            record = SubmissionRecord.from_dict(submission)
+            self.submissions[str(user_id)].append(record)
+            self._index_submission(str(user_id), record)
+
+    def pending_submissions(self, limit=None, offset=0):
+        stop = None if limit is None else offset + limit
+        return [
+            {
+                'id': sub.id,
+                'user_id': user_id,
+                'task_id': sub.task_id,
+                'file_id': sub.file_id,
+                'submitted_at': sub.submitted_at
+            }
+            for user_id, sub in islice(self.pending.values(), offset, stop)
+        ]
+
+    def set_submission_status(self, user_id, task_id, status, processed_at, reason=None):
+        key = (str(user_id), task_id)
+        with self._submission_lock:
+            ids = self.pending_by_key.get(key)
+            if not ids:
+                return False
+            sub_id = ids.popleft()
+            if not ids:
+                del self.pending_by_key[key]
+            _, sub = self.pending.pop(sub_id)
+            self.submission_counts['pending'] -= 1
+            self.submission_counts[status] += 1
+
+        sub['status'] = status
+        sub['processed_at'] = processed_at
+        if reason:
+            sub['reason'] = reason
+        return True
+
+    def count_submissions(self, status):
+        return self.submission_counts[status]
+
+    def user_submissions(self, user_id):
+        return [
+            {'task_id': sub.task_id, 'status': sub.status, 'submitted_at': sub.submitted_at}
+            for sub in self.submissions.get(str(user_id), ())
+        ]
+
+    # Withdrawals
+
+    def _rebuild_withdrawal_index(self):
+        # (user_id, requested_at) -> withdrawal, first one wins like a scan would
+        self.withdrawal_index = {}
+        self.withdrawal_counts = Counter()
+        for wd in self.withdrawals:
+            self.withdrawal_index.setdefault((wd['user_id'], wd['requested_at']), wd)
+            self.withdrawal_counts[wd['status']] += 1
+
+    def add_withdrawal(self, withdrawal):
+        self.withdrawals.append(withdrawal)
+        self.withdrawal_index.setdefault((withdrawal['user_id'], withdrawal['requested_at']), withdrawal)
+        self.withdrawal_counts[withdrawal['status']] += 1
+
+    def update_withdrawal(self, user_id, requested_at, fields, from_status=None):
+        wd = self.withdrawal_index.get((str(user_id), requested_at))
+        if wd is None or (from_status and wd['status'] != from_status):
+            return None
+        self.withdrawal_counts[wd['status']] -= 1
+        wd.update(fields)
+        self.withdrawal_counts[wd['status']] += 1
+        return wd
+
+    def withdrawals_by_status(self, status):
+        return [w for w in self.withdrawals if w['status'] == status]
+
+    def count_withdrawals(self, status):
+        return self.withdrawal_counts[status]
+
+    # Ledger
+
+    def post_ledger_entry(self, entry, user_id=None, balance=None):
+        if user_id is not None:
+            self.set_user_field(user_id, 'balance', balance)
+        self.ledger.append(entry)
+        self._total_entry(entry)
+
+    def _total_entry(self, entry):
+        # A user account's total is its balance; system accounts keep theirs here
+        for account, amount in ((entry['debit'], -entry['amount']), (entry['credit'], entry['amount'])):
+            if not account.startswith('user:'):
+                self.ledger_totals[account] = self.ledger_totals.get(account, 0) + amount
+
+    # Broadcasts
+
+    def save_broadcast(self, job):
+        self.broadcasts[job['id']] = job
+
+    def get_broadcasts(self):
+        return list(self.broadcasts.values())
+
+    # Conversations
+
+    def get_conversation(self, key):
+        return self.conversations.get(key)
+
+    def put_conversation(self, key, state):
+        with self._conversation_lock:
+            # Re-insert so the dict stays ordered by write time, oldest first
+            self.conversations.pop(key, None)
+            self.conversations[key] = state
+
+    def delete_conversation(self, key):
+        with self._conversation_lock:
+            return self.conversations.pop(key, None) is not None
+
+    def expire_conversations(self, now, limit):
+        # States share one TTL, so the expired ones are all at the front
+        with self._conversation_lock:
+            expired = []
+            for key, state in self.conversations.items():
+                if state['expires_at'] > now and len(self.conversations) - len(expired) <= limit:
+                    break
+                expired.append(key)
+            for key in expired:
+                del self.conversations[key]
+        return len(expired)
+
+    def count_conversations(self):
+        return len(self.conversations)
+
+
+class SQLiteStorage:
+    # Durable backend: one WAL-mode SQLite file, one connection per worker thread
+
+    name = 'sqlite'
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            first_name TEXT,
+            balance INTEGER,
+            referrals INTEGER,
+            referral_code TEXT,
+            joined TEXT,
+            blocked INTEGER,
+            extra TEXT NOT NULL DEFAULT '{}'
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_users_referral_code ON users(referral_code);
+
+        -- Sums over all users for /stats, maintained by triggers like submission_counts
+        CREATE TABLE IF NOT EXISTS user_totals (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            users INTEGER NOT NULL,
+            blocked INTEGER NOT NULL,
+            balance INTEGER NOT NULL,
+            referrals INTEGER NOT NULL
+        );
+        CREATE TRIGGER IF NOT EXISTS trg_users_insert AFTER INSERT ON users BEGIN
+            UPDATE user_totals SET users = users + 1,
+                blocked = blocked + COALESCE(NEW.blocked, 0),
+                balance = balance + COALESCE(NEW.balance, 0),
+                referrals = referrals + COALESCE(NEW.referrals, 0)
+            WHERE id = 0;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_users_update AFTER UPDATE OF blocked, balance, referrals ON users BEGIN
+            UPDATE user_totals SET
+                blocked = blocked + COALESCE(NEW.blocked, 0) - COALESCE(OLD.blocked, 0),
+                balance = balance + COALESCE(NEW.balance, 0) - COALESCE(OLD.balance, 0),
+                referrals = referrals + COALESCE(NEW.referrals, 0) - COALESCE(OLD.referrals, 0)
+            WHERE id = 0;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_users_delete AFTER DELETE ON users BEGIN
+            UPDATE user_totals SET users = users - 1,
+                blocked = blocked - COALESCE(OLD.blocked, 0),
+                balance = balance - COALESCE(OLD.balance, 0),
+                referrals = referrals - COALESCE(OLD.referrals, 0)
+            WHERE id = 0;
+        END;
+
+        CREATE TABLE IF NOT EXISTS tasks (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            id TEXT NOT NULL UNIQUE,
+            data TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS submissions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            task_id TEXT NOT NULL,
+            file_id TEXT NOT NULL,
+            status TEXT NOT NULL,
+            submitted_at TEXT NOT NULL,
+            processed_at TEXT,
+            reason TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_submissions_status ON submissions(status, id);
+        CREATE INDEX IF NOT EXISTS idx_submissions_user_task ON submissions(user_id, task_id, status);
+
+        -- Per-status totals, maintained by triggers in the same transaction
+        CREATE TABLE IF NOT EXISTS submission_counts (
+            status TEXT PRIMARY KEY,
+            count INTEGER NOT NULL
+        );
+        CREATE TRIGGER IF NOT EXISTS trg_submissions_insert AFTER INSERT ON submissions BEGIN
+            INSERT INTO submission_counts (status, count) VALUES (NEW.status, 1)
+            ON CONFLICT(status) DO UPDATE SET count = count + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_submissions_status AFTER UPDATE OF status ON submissions
+        WHEN OLD.status <> NEW.status BEGIN
+            UPDATE submission_counts SET count = count - 1 WHERE status = OLD.status;
+            INSERT INTO submission_counts (status, count) VALUES (NEW.status, 1)
+            ON CONFLICT(status) DO UPDATE SET count = count + 1;
+        END;
+
+        CREATE TABLE IF NOT EXISTS withdrawals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            upi_id TEXT,
+            status TEXT NOT NULL,
+            requested_at TEXT NOT NULL,
+            extra TEXT NOT NULL DEFAULT '{}'
+        );
+        CREATE INDEX IF NOT EXISTS idx_withdrawals_status ON withdrawals(status, id);
+        CREATE INDEX IF NOT EXISTS idx_withdrawals_user ON withdrawals(user_id, requested_at);
+
+        CREATE TABLE IF NOT EXISTS withdrawal_counts (
+            status TEXT PRIMARY KEY,
+            count INTEGER NOT NULL
+        );
+        CREATE TRIGGER IF NOT EXISTS trg_withdrawals_insert AFTER INSERT ON withdrawals BEGIN
+            INSERT INTO withdrawal_counts (status, count) VALUES (NEW.status, 1)
+            ON CONFLICT(status) DO UPDATE SET count = count + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_withdrawals_status AFTER UPDATE OF status ON withdrawals
+        WHEN OLD.status <> NEW.status BEGIN
+            UPDATE withdrawal_counts SET count = count - 1 WHERE status = OLD.status;
+            INSERT INTO withdrawal_counts (status, count) VALUES (NEW.status, 1)
+            ON CONFLICT(status) DO UPDATE SET count = count + 1;
+        END;
+
+        CREATE TABLE IF NOT EXISTS ledger (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            at TEXT NOT NULL,
+            debit TEXT NOT NULL,
+            credit TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            ref TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_ledger_debit ON ledger(debit);
+        CREATE INDEX IF NOT EXISTS idx_ledger_credit ON ledger(credit);
+
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS conversations (
+            key TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_conversations_expiry ON conversations(expires_at);
+    """
+
+    USER_COLUMNS = ('first_name', 'balance', 'referrals', 'referral_code', 'joined', 'blocked')
+    WITHDRAWAL_COLUMNS = ('user_id', 'amount', 'upi_id', 'status', 'requested_at')
+
+    # Statement texts are fixed so sqlite3's per-connection statement cache
+    # keeps every one of them prepared
+    SELECT_USER = "SELECT * FROM users WHERE id = ?"
+    UPSERT_USER = (
+        "INSERT INTO users (id, first_name, balance, referrals, referral_code, joined, blocked, extra) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT(id) DO UPDATE SET first_name = excluded.first_name, balance = excluded.balance, "
+        "referrals = excluded.referrals, referral_code = excluded.referral_code, "
+        "joined = excluded.joined, blocked = excluded.blocked, extra = excluded.extra"
+    )
+    SET_USER_COLUMN = {
+        column: f"INSERT INTO users (id, {column}) VALUES (?, ?) "
+                f"ON CONFLICT(id) DO UPDATE SET {column} = excluded.{column}"
+        for column in USER_COLUMNS
+    }
+    SET_USER_EXTRA = (
+        "INSERT INTO users (id, extra) VALUES (?, ?) "
+        "ON CONFLICT(id) DO UPDATE SET extra = excluded.extra"
+    )
+    SELECT_USER_EXTRA = "SELECT extra FROM users WHERE id = ?"
+    SELECT_TOTALS = "SELECT users, blocked, balance, referrals FROM user_totals WHERE id = 0"
+    SELECT_TOP_BALANCE = "SELECT * FROM users ORDER BY balance DESC LIMIT ?"
+    SELECT_USER_PAGE = "SELECT rowid AS seq, * FROM users WHERE rowid > ? ORDER BY rowid LIMIT ?"
+    SELECT_TASKS = "SELECT data FROM tasks ORDER BY seq"
+    SELECT_TASK = "SELECT data FROM tasks WHERE id = ?"
+    INSERT_TASK = "INSERT INTO tasks (id, data) VALUES (?, ?)"
+    UPDATE_TASK = "UPDATE tasks SET data = ? WHERE id = ?"
+    INCREMENT_TASK_COMPLETIONS = (
+        "UPDATE tasks SET data = json_set(data, '$.completed_count', "
+        "COALESCE(json_extract(data, '$.completed_count'), 0) + 1) WHERE id = ?"
+    )
+    INSERT_SUBMISSION = (
+        "INSERT INTO submissions (user_id, task_id, file_id, status, submitted_at) "
+        "VALUES (?, ?, ?, ?, ?)"
+    )
+    SELECT_USER_SUBMISSIONS = "SELECT task_id, status, submitted_at FROM submissions WHERE user_id = ? ORDER BY id"
+    SELECT_PENDING_SUBMISSIONS = (
+        "SELECT id, user_id, task_id, file_id, submitted_at FROM submissions "
+        "WHERE status = 'pending' ORDER BY id LIMIT ? OFFSET ?"
+    )
+    UPDATE_SUBMISSION_STATUS = (
+        "UPDATE submissions SET status = ?, processed_at = ?, reason = COALESCE(?, reason) "
+        "WHERE id = (SELECT id FROM submissions WHERE user_id = ? AND task_id = ? "
+        "AND status = 'pending' ORDER BY id LIMIT 1)"
+    )
+    COUNT_SUBMISSIONS = "SELECT count FROM submission_counts WHERE status = ?"
+    INSERT_WITHDRAWAL = (
+        "INSERT INTO withdrawals (user_id, amount, upi_id, status, requested_at, extra) "
+        "VALUES (?, ?, ?, ?, ?, ?)"
+    )
+    SELECT_WITHDRAWAL = (
+        "SELECT * FROM withdrawals WHERE user_id = ? AND requested_at = ? ORDER BY id LIMIT 1"
+    )
+    UPDATE_WITHDRAWAL = "UPDATE withdrawals SET status = ?, extra = ? WHERE id = ?"
+    INSERT_LEDGER_ENTRY = (
+        "INSERT INTO ledger (at, debit, credit, amount, kind, ref) VALUES (?, ?, ?, ?, ?, ?)"
+    )
+    UPSERT_BROADCAST = (
+        "INSERT INTO broadcasts (id, data) VALUES (?, ?) "
+        "ON CONFLICT(id) DO UPDATE SET data = excluded.data"
+    )
+    SELECT_WITHDRAWALS_BY_STATUS = "SELECT * FROM withdrawals WHERE status = ? ORDER BY id"
+    COUNT_WITHDRAWALS = "SELECT count FROM withdrawal_counts WHERE status = ?"
+    SELECT_CONVERSATION = "SELECT data FROM conversations WHERE key = ?"
+    UPSERT_CONVERSATION = (
+        "INSERT INTO conversations (key, data, expires_at) VALUES (?, ?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at"
+    )
+    DELETE_CONVERSATION = "DELETE FROM conversations WHERE key = ?"
+    DELETE_EXPIRED_CONVERSATIONS = "DELETE FROM conversations WHERE expires_at <= ?"
+    DELETE_OLDEST_CONVERSATIONS = (
+        "DELETE FROM conversations WHERE key IN "
+        "(SELECT key FROM conversations ORDER BY expires_at LIMIT ?)"
+    )
+    COUNT_CONVERSATIONS = "SELECT COUNT(*) FROM conversations"
+
+    def __init__(self, path, seed_tasks=None):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(self.SCHEMA)
+        if not conn.execute("SELECT 1 FROM submission_counts LIMIT 1").fetchone():
+            # Database created before the counters existed
+            conn.execute(
+                "INSERT INTO submission_counts (status, count) "
+                "SELECT status, COUNT(*) FROM submissions GROUP BY status"
+            )
+        if not conn.execute("SELECT 1 FROM withdrawal_counts LIMIT 1").fetchone():
+            conn.execute(
+                "INSERT INTO withdrawal_counts (status, count) "
+                "SELECT status, COUNT(*) FROM withdrawals GROUP BY status"
+            )
+        # Once per database; the triggers keep the row current from then on
+        conn.execute(
+            "INSERT OR IGNORE INTO user_totals (id, users, blocked, balance, referrals) "
+            "SELECT 0, COUNT(*), COALESCE(SUM(blocked), 0), COALESCE(SUM(balance), 0), "
+            "COALESCE(SUM(referrals), 0) FROM users"
+        )
+        if seed_tasks and not conn.execute("SELECT 1 FROM tasks LIMIT 1").fetchone():
+            for task in seed_tasks:
+                self.add_task(task)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.path,
+                timeout=30,
+                isolation_level=None,
+                check_same_thread=False,
+                cached_statements=256
+            )
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=OFF")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        return conn
+
+    def _row_to_user(self, row):
+        data = json.loads(row['extra'])
+        for column in self.USER_COLUMNS:
+            if row[column] is not None:
+                data[column] = bool(row[column]) if column == 'blocked' else row[column]
+        return data
+
+    def _row_to_withdrawal(self, row):
+        data = {column: row[column] for column in self.WITHDRAWAL_COLUMNS}
+        data.update(json.loads(row['extra']))
+        return data
+
+    # Users
+
+    def get_user(self, user_id):
+        row = self._conn().execute(self.SELECT_USER, (str(user_id),)).fetchone()
+        return self._row_to_user(row) if row else None
+
+    def put_user(self, user_id, data):
+        extra = {k: v for k, v in data.items() if k not in self.USER_COLUMNS}
+        blocked = data.get('blocked')
+        self._conn().execute(self.UPSERT_USER, (
+            str(user_id),
+            data.get('first_name'),
+            data.get('balance'),
+            data.get('referrals'),
+            data.get('referral_code'),
+            data.get('joined'),
+            None if blocked is None else int(blocked),
+            json.dumps(extra, ensure_ascii=False)
+        ))
+
+    def set_user_field(self, user_id, field, value):
+        if field in self.SET_USER_COLUMN:
+            if field == 'blocked':
+                value = int(value)
+            self._conn().execute(self.SET_USER_COLUMN[field], (str(user_id), value))
+            return
+
+        conn = self._transaction()
+        try:
+            row = conn.execute(self.SELECT_USER_EXTRA, (str(user_id),)).fetchone()
+            extra = json.loads(row['extra']) if row else {}
+            extra[field] = value
+            conn.execute(self.SET_USER_EXTRA, (str(user_id), json.dumps(extra, ensure_ascii=False)))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def add_completion(self, user_id, task_id, completed_at):
+        conn = self._transaction()
+        try:
+            row = conn.execute(self.SELECT_USER_EXTRA, (str(user_id),)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return False
+            extra = json.loads(row['extra'])
+            extra.setdefault('completed_tasks', []).append({'task_id': task_id, 'completed_at': completed_at})
+            conn.execute(self.SET_USER_EXTRA, (str(user_id), json.dumps(extra, ensure_ascii=False)))
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def count_users(self):
+        return self._conn().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def user_page(self, cursor, limit):
+        # Users in rowid order; the cursor is the last rowid seen
+        rows = self._conn().execute(self.SELECT_USER_PAGE, (cursor or 0, limit)).fetchall()
+        page = [(row['id'], self._row_to_user(row)) for row in rows]
+        return page, rows[-1]['seq'] if rows else cursor
+
+    def blocked_user_ids(self):
+        return [row[0] for row in self._conn().execute("SELECT id FROM users WHERE blocked = 1")]
+
+    def user_totals(self):
+        users, blocked, balance, referrals = self._conn().execute(self.SELECT_TOTALS).fetchone()
+        return {'users': users, 'blocked': blocked, 'balance': balance, 'referrals': referrals}
+
+    def top_users_by_balance(self, limit):
+        rows = self._conn().execute(self.SELECT_TOP_BALANCE, (limit,)).fetchall()
+        return [(row['id'], self._row_to_user(row)) for row in rows]
+
+    # Tasks
+
+    def get_tasks(self):
+        return [json.loads(row['data']) for row in self._conn().execute(self.SELECT_TASKS)]
+
+    def add_task(self, task):
+        self._conn().execute(self.INSERT_TASK, (task['id'], json.dumps(task, ensure_ascii=False)))
+
+    def update_task(self, task_id, field, value):
+        conn = self._transaction()
+        try:
+            row = conn.execute(self.SELECT_TASK, (task_id,)).fetchone()
+            if row:
+                task = json.loads(row['data'])
+                task[field] = value
+                conn.execute(self.UPDATE_TASK, (json.dumps(task, ensure_ascii=False), task_id))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return row is not None
+
+    def increment_task_completions(self, task_id):
+        return self._conn().execute(self.INCREMENT_TASK_COMPLETIONS, (task_id,)).rowcount > 0
+
+    # Submissions
+
+    def add_submission(self, user_id, submission):
+        self._conn().execute(self.INSERT_SUBMISSION, (
+            str(user_id),
+            submission['task_id'],
+            submission['file_id'],
+            submission['status'],
+            submission['submitted_at']
+        ))
+
+    def pending_submissions(self, limit=None, offset=0):
+        rows = self._conn().execute(
+            self.SELECT_PENDING_SUBMISSIONS, (-1 if limit is None else limit, offset)
+        )
+        return [dict(row) for row in rows]
+
+    def set_submission_status(self, user_id, task_id, status, processed_at, reason=None):
+        cursor = self._conn().execute(
+            self.UPDATE_SUBMISSION_STATUS,
+            (status, processed_at, reason or None, str(user_id), task_id)
+        )
+        return cursor.rowcount > 0
+
+    def count_submissions(self, status):
+        row = self._conn().execute(self.COUNT_SUBMISSIONS, (status,)).fetchone()
+        return row[0] if row else 0
+
+    def user_submissions(self, user_id):
+        return [dict(row) for row in self._conn().execute(self.SELECT_USER_SUBMISSIONS, (str(user_id),))]
+
+    # Withdrawals
+
+    def add_withdrawal(self, withdrawal):
+        extra = {k: v for k, v in withdrawal.items() if k not in self.WITHDRAWAL_COLUMNS}
+        self._conn().execute(self.INSERT_WITHDRAWAL, (
+            withdrawal['user_id'],
+            withdrawal['amount'],
+            withdrawal.get('upi_id'),
+            withdrawal['status'],
+            withdrawal['requested_at'],
+            json.dumps(extra, ensure_ascii=False)
+        ))
+
+    def update_withdrawal(self, user_id, requested_at, fields, from_status=None):
+        conn = self._transaction()
+        try:
+            row = conn.execute(self.SELECT_WITHDRAWAL, (str(user_id), requested_at)).fetchone()
+            wd = None
+            if row and (not from_status or row['status'] == from_status):
+                wd = self._row_to_withdrawal(row)
+                wd.update(fields)
+                extra = {k: v for k, v in wd.items() if k not in self.WITHDRAWAL_COLUMNS}
+                conn.execute(
+                    self.UPDATE_WITHDRAWAL,
+                    (wd['status'], json.dumps(extra, ensure_ascii=False), row['id'])
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wd
+
+    def withdrawals_by_status(self, status):
+        rows = self._conn().execute(self.SELECT_WITHDRAWALS_BY_STATUS, (status,)).fetchall()
+        return [self._row_to_withdrawal(row) for row in rows]
+
+    def count_withdrawals(self, status):
+        row = self._conn().execute(self.COUNT_WITHDRAWALS, (status,)).fetchone()
+        return row[0] if row else 0
+
+    # Ledger
+
+    def post_ledger_entry(self, entry, user_id=None, balance=None):
+        conn = self._transaction()
+        try:
+            if user_id is not None:
+                conn.execute(self.SET_USER_COLUMN['balance'], (str(user_id), balance))
+            conn.execute(self.INSERT_LEDGER_ENTRY, (
+                entry['at'], entry['debit'], entry['credit'], entry['amount'], entry['kind'], entry.get('ref')
+            ))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # Broadcasts
+
+    def save_broadcast(self, job):
+        self._conn().execute(self.UPSERT_BROADCAST, (job['id'], json.dumps(job, ensure_ascii=False)))
+
+    def get_broadcasts(self):
+        return [json.loads(row[0]) for row in self._conn().execute("SELECT data FROM broadcasts")]
+
+    # Conversations
+
+    def get_conversation(self, key):
+        row = self._conn().execute(self.SELECT_CONVERSATION, (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_conversation(self, key, state):
+        self._conn().execute(
+            self.UPSERT_CONVERSATION, (key, json.dumps(state, ensure_ascii=False), state['expires_at']))
+
+    def delete_conversation(self, key):
+        return self._conn().execute(self.DELETE_CONVERSATION, (key,)).rowcount > 0
+
+    def expire_conversations(self, now, limit):
+        conn = self._transaction()
+        try:
+            removed = conn.execute(self.DELETE_EXPIRED_CONVERSATIONS, (now,)).rowcount
+            excess = conn.execute(self.COUNT_CONVERSATIONS).fetchone()[0] - limit
+            if excess > 0:
+                removed += conn.execute(self.DELETE_OLDEST_CONVERSATIONS, (excess,)).rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return removed
+
+    def count_conversations(self):
+        return self._conn().execute(self.COUNT_CONVERSATIONS).fetchone()[0]
+
+
+class JournalStorage(MemoryStorage):
+    # Event-sourced backend: state lives in memory, every mutation is appended
+    # to a group-committed journal and compacted into periodic snapshots
+
+    name = 'journal'
+
+    def __init__(self, directory, commit_interval=0.05, snapshot_interval=300,
+                 users=None, tasks=None, submissions=None, withdrawals=None, ledger=None,
+                 broadcasts=None, conversations=None):
+        super().__init__(users, tasks, submissions, withdrawals, ledger, broadcasts, conversations)
+        self.directory = directory
+        self.commit_interval = commit_interval
+        self.snapshot_interval = snapshot_interval
+        self._lock = threading.RLock()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self._pending = []
+        self._closed = False
+        self._seq = 0
+        self._snapshot_seq = 0
+        self.commits = 0
+        self.events_written = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+        self._journal = open(self._segment_path(self._seq + 1), 'a', encoding='utf-8')
+
+        threading.Thread(target=self._writer_loop, name='journal-writer', daemon=True).start()
+        threading.Thread(target=self._snapshot_loop, name='journal-snapshot', daemon=True).start()
+
+    def _segment_path(self, start_seq):
+        return os.path.join(self.directory, f"journal-{start_seq:012d}.log")
+
+    def _snapshot_path(self, seq):
+        return os.path.join(self.directory, f"snapshot-{seq:012d}.json")
+
+    def _ledger_path(self, seq):
+        return os.path.join(self.directory, f"ledger-{seq:012d}.jsonl")
+
+    def _files(self, prefix):
+        # [(seq, path)] for journal segments or snapshots, oldest first
+        found = []
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix + '-') and not name.endswith('.tmp'):
+                seq = name[len(prefix) + 1:].split('.', 1)[0]
+                if seq.isdigit():
+                    found.append((int(seq), os.path.join(self.directory, name)))
+        return sorted(found)
+
+    # Recovery
+
+    def _recover(self):
+        snapshots = self._files('snapshot')
+        if snapshots:
+            seq, path = snapshots[-1]
+            self._load_snapshot(self, path)
+            self._seq = self._snapshot_seq = seq
+        else:
+            # Snapshots are rebuilt from the previous one plus the journal,
+            # so the state handed to the constructor must be on disk too
+            self._write_snapshot(0, self._state(self))
+
+        for event in self._events(self._seq, repair=True):
+            self._replay(event)
+            self._seq = event['seq']
+
+    def _load_snapshot(self, target, path):
+        with open(path, encoding='utf-8') as f:
+            state = json.load(f)
+        target.users.clear()
+        target.users.update(state['users'])
+        target.submissions.clear()
+        target.submissions.update(state['submissions'])
+        target._compact_records()
+        target.tasks[:] = state['tasks']
+        target.withdrawals[:] = state['withdrawals']
+        target.ledger.clear()
+        target.ledger.extend(state.get('ledger', []))
+        target.ledger_totals.clear()
+        if 'ledger_totals' in state:
+            target.ledger_totals.update(state['ledger_totals'])
+        else:
+            # Written before totals: fold the full entry list into them
+            for entry in state.get('ledger', []):
+                target._total_entry(entry)
+        target.broadcasts.clear()
+        target.broadcasts.update(state.get('broadcasts', {}))
+        target.conversations.clear()
+        target.conversations.update(state.get('conversations', {}))
+        target._rebuild_submission_index()
+        target._rebuild_withdrawal_index()
+
+    def _events(self, after, upto=None, repair=False):
+        # Journaled events with after < seq <= upto, in order. A crash can
+        # leave a torn last line; with repair the segment is cut back to the
+        # last whole line, so records appended after restart stay readable
+        for start_seq, path in self._files('journal'):
+            if upto is not None and start_seq > upto:
+                break
+            torn_at = None
+            with open(path, 'rb') as f:
+                offset = 0
+                for line in f:
+                    try:
+                        if not line.endswith(b'\n'):
+                            raise ValueError("unterminated line")
+                        event = json.loads(line)
+                    except ValueError:
+                        torn_at = offset  # torn tail write from a crash
+                        break
+                    offset += len(line)
+                    if upto is not None and event['seq'] > upto:
+                        break
+                    if event['seq'] > after:
+                        yield event
+            if torn_at is not None and repair:
+                # Runs while the module loads, before log_activity exists
+                os.truncate(path, torn_at)
+                telebot.logger.warning("Journal %s: dropped torn tail at byte %d", os.path.basename(path), torn_at)
+
+    def _replay(self, event, target=None):
+        args = {k: v for k, v in event.items() if k not in ('seq', 'op')}
+        return getattr(MemoryStorage, event['op'])(self if target is None else target, **args)
+
+    # Journal
+
+    def _append(self, op, **args):
+        with self._lock:
+            self._seq += 1
+            event = {'seq': self._seq, 'op': op, **args}
+            result = self._replay(event)
+            line = json.dumps(event, ensure_ascii=False) + '\n'
+            with self._cond:
+                self._pending.append(line)
+                self._cond.notify()
+        return result
+
+    def _writer_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed and not self._pending:
+                    return
+            # Group commit: let more events pile up, then pay for one fsync
+            time.sleep(self.commit_interval)
+            self.flush()
+
+    def flush(self):
+        # One flush at a time, so batches reach the file in order
+        with self._flush_lock:
+            with self._cond:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return
+            for item in batch:
+                if isinstance(item, tuple):
+                    # Snapshot taken: later events go to a fresh segment
+                    self._sync()
+                    self._journal.close()
+                    self._journal = open(self._segment_path(item[1]), 'a', encoding='utf-8')
+                else:
+                    self._journal.write(item)
+            self._sync()
+            self.commits += 1
+            self.events_written += sum(1 for item in batch if not isinstance(item, tuple))
+
+    def _sync(self):
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self.flush()
+
+    # Snapshots
+
+    def _snapshot_loop(self):
+        while not self._closed:
+            time.sleep(self.snapshot_interval)
+            if self._seq != self._snapshot_seq:
+                try:
+                    self.snapshot()
+                except Exception as e:
+                    log_activity(f"Snapshot error: {str(e)}")
+
+    def _state(self, source):
+        return {
+            'users': {str(uid): dict(data) for uid, data in source.users.items()},
+            'tasks': [dict(task) for task in source.tasks],
+            'submissions': {uid: [dict(s) for s in subs] for uid, subs in source.submissions.items()},
+            'withdrawals': [dict(wd) for wd in source.withdrawals],
+            'ledger': list(source.ledger),
+            'ledger_totals': dict(source.ledger_totals),
+            'broadcasts': {job_id: dict(job) for job_id, job in source.broadcasts.items()},
+            'conversations': {key: dict(state) for key, state in source.conversations.items()}
+        }
+
+    def _write_snapshot(self, seq, state):
+        path = self._snapshot_path(seq)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+        return path
+
+    def _archive_ledger(self, seq, entries):
+        # Ledger entries from the segments a snapshot is about to delete; one
+        # file per snapshot, so a crash before the delete rewrites the same file
+        path = self._ledger_path(seq)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+
+    def ledger_history(self):
+        # Every ledger entry ever posted, oldest first: the archive written
+        # by snapshots, then the entries still in the journal
+        archived_seq = 0
+        for archived_seq, path in self._files('ledger'):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    yield json.loads(line)
+        self.flush()
+        for event in self._events(archived_seq):
+            if event['op'] == 'post_ledger_entry':
+                yield {'seq': event['seq'], **event['entry']}
+
+    def snapshot(self):
+        # Only the journal switch happens under the lock: later events go to
+        # a new segment, and the state at seq is rebuilt off to the side from
+        # the previous snapshot plus the closed segments, so writers never
+        # wait on the copy or the serialization
+        with self._snapshot_lock:
+            with self._lock:
+                seq = self._seq
+                with self._cond:
+                    self._pending.append(('rotate', seq + 1))
+                    self._cond.notify()
+            self.flush()  # everything up to seq is on disk after this
+
+            base_seq, base_path = self._files('snapshot')[-1]
+            shadow = MemoryStorage()
+            self._load_snapshot(shadow, base_path)
+            archived = []
+            for event in self._events(base_seq, seq):
+                self._replay(event, shadow)
+                if event['op'] == 'post_ledger_entry':
+                    archived.append({'seq': event['seq'], **event['entry']})
+            path = self._write_snapshot(seq, self._state(shadow))
+            if archived:
+                self._archive_ledger(seq, archived)
+            self._snapshot_seq = seq
+
+            # Everything up to seq is now covered by the snapshot (and the
+            # ledger archive); archive files are never removed
+            for old_seq, old_path in self._files('snapshot'):
+                if old_seq < seq:
+                    os.remove(old_path)
+            for start_seq, old_path in self._files('journal'):
+                if start_seq <= seq:
+                    os.remove(old_path)
+        return path
+
+    # Mutations
+
+    def put_user(self, user_id, data):
+        self._append('put_user', user_id=str(user_id), data=dict(data))
+
+    def set_user_field(self, user_id, field, value):
+        self._append('set_user_field', user_id=str(user_id), field=field, value=value)
+
+    def add_completion(self, user_id, task_id, completed_at):
+        return self._append('add_completion', user_id=str(user_id), task_id=task_id, completed_at=completed_at)
+
+    def add_task(self, task):
+        self._append('add_task', task=task)
+
+    def update_task(self, task_id, field, value):
+        return self._append('update_task', task_id=task_id, field=field, value=value)
+
+    def increment_task_completions(self, task_id):
+        return self._append('increment_task_completions', task_id=task_id)
+
+    def add_submission(self, user_id, submission):
+        self._append('add_submission', user_id=str(user_id), submission=submission)
+
+    def set_submission_status(self, user_id, task_id, status, processed_at, reason=None):
+        return self._append(
+            'set_submission_status', user_id=str(user_id), task_id=task_id,
+            status=status, processed_at=processed_at, reason=reason
+        )
+
+    def add_withdrawal(self, withdrawal):
+        self._append('add_withdrawal', withdrawal=withdrawal)
+
+    def update_withdrawal(self, user_id, requested_at, fields, from_status=None):
+        return self._append(
+            'update_withdrawal', user_id=str(user_id), requested_at=requested_at,
+            fields=fields, from_status=from_status
+        )
+
+    def post_ledger_entry(self, entry, user_id=None, balance=None):
+        self._append(
+            'post_ledger_entry', entry=entry,
+            user_id=None if user_id is None else str(user_id), balance=balance
+        )
+
+    def save_broadcast(self, job):
+        self._append('save_broadcast', job=job)
+
+    def put_conversation(self, key, state):
+        self._append('put_conversation', key=key, state=state)
+
+    def delete_conversation(self, key):
+        return self._append('delete_conversation', key=key)
+
+    def expire_conversations(self, now, limit):
+        # Only journal sweeps that remove something; replay gives the same cut
+        oldest = next(iter(self.conversations.values()), None)
+        if oldest is None or (oldest['expires_at'] > now and len(self.conversations) <= limit):
+            return 0
+        return self._append('expire_conversations', now=now, limit=limit)
+
+
+def create_storage(backend):
+    if backend == 'memory':
+        return MemoryStorage(USERS_DB, TASKS_DB, SUBMISSIONS_DB, WITHDRAWALS_DB, LEDGER_DB, BROADCASTS_DB,
+                             CONVERSATIONS_DB)
+    if backend == 'sqlite':
+        return SQLiteStorage(SQLITE_PATH, seed_tasks=TASKS_DB)
+    if backend == 'journal':
+        journal = JournalStorage(
+            JOURNAL_DIR,
+            commit_interval=JOURNAL_COMMIT_INTERVAL,
+            snapshot_interval=SNAPSHOT_INTERVAL,
+            users=USERS_DB,
+            tasks=TASKS_DB,
+            submissions=SUBMISSIONS_DB,
+            withdrawals=WITHDRAWALS_DB,
+            ledger=LEDGER_DB,
+            broadcasts=BROADCASTS_DB,
+            conversations=CONVERSATIONS_DB
+        )
+        atexit.register(journal.close)
+        return journal
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+storage = create_storage(STORAGE_BACKEND)
+
+# Global variables
+blocked_users = set(storage.blocked_user_ids())
+
+# Initialize bot
+if TELEGRAM_API_URL:
+    telebot.apihelper.API_URL = TELEGRAM_API_URL
+    if asyncio_helper is not None:
+        asyncio_helper.API_URL = TELEGRAM_API_URL
+bot = RewardsBot(BOT_TOKEN)
+bot.executor = KeyedExecutor(
+    lanes=UPDATE_LANES,
+    depth=UPDATE_LANE_DEPTH,
+    block_timeout=UPDATE_BACKPRESSURE_TIMEOUT,
+    on_error=bot._handle_exception
+)
+
+# ======================
+# Activity Log
+# ======================
+
+def activity_terms(record):
+    # Search terms a record is indexed under
+    terms = {f"action:{record.get('action')}"}
+    for key in ('user_id', 'referrer_id'):
+        if record.get(key):
+            terms.add(f"user:{record[key]}")
+    if record.get('admin_id'):
+        terms.add(f"admin:{record['admin_id']}")
+    if record.get('upi'):
+        terms.add(f"upi:{str(record['upi']).lower()}")
+    return terms
+
+def activity_block_entry(offset, length, records):
+    terms = set()
+    for record in records:
+        terms |= activity_terms(record)
+    return {
+        'offset': offset,
+        'length': length,
+        'count': len(records),
+        'min_ts': min(r['ts'] for r in records),
+        'max_ts': max(r['ts'] for r in records),
+        'terms': sorted(terms)
+    }
+
+def activity_index_path(segment_path):
+    return segment_path[:-len('.jsonl.gz')] + '.idx.jsonl'
+
+def index_activity_segment(segment_path):
+    # Rebuilds a segment's block index by walking its gzip members
+    with open(segment_path, 'rb') as f:
+        data = memoryview(f.read())
+    blocks = []
+    offset = 0
+    while offset < len(data):
+        decompressor = zlib.decompressobj(wbits=31)
+        try:
+            text = decompressor.decompress(data[offset:])
+        except zlib.error:
+            break
+        if not decompressor.eof:
+            break  # torn tail write
+        length = len(data) - offset - len(decompressor.unused_data)
+        records = [json.loads(line) for line in text.decode('utf-8').splitlines() if line]
+        if records:
+            blocks.append(activity_block_entry(offset, length, records))
+        offset += length
+    with open(activity_index_path(segment_path), 'w', encoding='utf-8') as f:
+        f.write(''.join(json.dumps(block) + '\n' for block in blocks))
+    return blocks
+
+
+class ActivityLogWriter:
+    # Handler threads only append to an in-memory queue. A background
+    # thread echoes each batch to stderr (stdout stays free for whatever
+    # the process reports) and appends it to the current segment as one
+    # gzip member (concatenated members read back as a single gzip stream).
+    # Every member is a block with a line in the segment's sidecar index:
+    # its offset, time range and the terms it contains. Segments rotate by
+    # size and the oldest are deleted past `retain`.
+
+    def __init__(self, directory, segment_bytes=8 * 1024 * 1024, retain=100,
+                 flush_interval=1.0, max_pending=100000, console=True):
+        self.directory = directory
+        self.console = console
+        self.segment_bytes = segment_bytes
+        self.retain = retain
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._started = False
+        self._segment = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            segments = self.segments()
+            self._segment = segments[-1][1] if segments else self._segment_path(1)
+            if os.path.exists(self._segment) and not os.path.exists(activity_index_path(self._segment)):
+                index_activity_segment(self._segment)
+
+    def segments(self):
+        # [(seq, path)] oldest first
+        if not self.directory:
+            return []
+        found = []
+        for name in os.listdir(self.directory):
+            if name.startswith('activity-') and name.endswith('.jsonl.gz'):
+                found.append((int(name[len('activity-'):-len('.jsonl.gz')]), os.path.join(self.directory, name)))
+        return sorted(found)
+
+    def _segment_path(self, seq):
+        return os.path.join(self.directory, f"activity-{seq:08d}.jsonl.gz")
+
+    def write(self, record):
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return
+            self._pending.append(record)
+            if not self._started:
+                self._started = True
+                threading.Thread(target=self._run, name="activity-log", daemon=True).start()
+
+    def flush(self):
+        with self._lock:
+            batch = list(self._pending)
+            self._pending.clear()
+        if not batch:
+            return
+        if self.console:
+            sys.stderr.write(''.join(f"[{r['timestamp']}] {r['message']}\n" for r in batch))
+            sys.stderr.flush()
+        if self._segment:
+            data = ''.join(json.dumps(r, ensure_ascii=False, default=str) + '\n' for r in batch)
+            member = gzip.compress(data.encode('utf-8'))
+            with open(self._segment, 'ab') as f:
+                offset = f.tell()
+                f.write(member)
+            entry = activity_block_entry(offset, len(member), batch)
+            with open(activity_index_path(self._segment), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+            if offset + len(member) >= self.segment_bytes:
+                self._rotate()
+
+    def _rotate(self):
+        segments = self.segments()
+        self._segment = self._segment_path(segments[-1][0] + 1)
+        for _, path in segments[:max(0, len(segments) + 1 - self.retain)]:
+            os.remove(path)
+            if os.path.exists(activity_index_path(path)):
+                os.remove(activity_index_path(path))
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                sys.stderr.write(f"Activity log write failed: {str(e)}\n")
+
+activity_log_writer = ActivityLogWriter(
+    ACTIVITY_LOG_DIR,
+    segment_bytes=ACTIVITY_LOG_SEGMENT_BYTES,
+    retain=ACTIVITY_LOG_RETAIN_SEGMENTS,
+    flush_interval=ACTIVITY_LOG_FLUSH_INTERVAL,
+    console=ACTIVITY_LOG_CONSOLE
+)
+atexit.register(activity_log_writer.flush)
+
+class ActivityLogSearch:
+    # Answers term queries newest-first from the segments on disk. Per
+    # segment it keeps the block list and an inverted index term -> blocks,
+    # so only blocks holding every term (inside the time range) are read and
+    # decompressed. Sidecars are read incrementally as the writer appends.
+    # Entries reach disk within ACTIVITY_LOG_FLUSH_INTERVAL.
+
+    def __init__(self, writer):
+        self.writer = writer
+        self._segments = {}  # path -> {'read': bytes of sidecar read, 'blocks': [...], 'postings': {...}}
+        self._lock = threading.Lock()
+
+    def _segment_index(self, path):
+        index_path = activity_index_path(path)
+        with self._lock:
+            index = self._segments.get(path)
+            if index is None:
+                index = self._segments[path] = {'read': 0, 'blocks': [], 'postings': {}}
+                if not os.path.exists(index_path) and path != self.writer._segment:
+                    index_activity_segment(path)
+            if os.path.exists(index_path) and os.path.getsize(index_path) > index['read']:
+                with open(index_path, encoding='utf-8') as f:
+                    f.seek(index['read'])
+                    for line in f:
+                        if not line.endswith('\n'):
+                            break  # being written
+                        index['read'] += len(line.encode('utf-8'))
+                        block = json.loads(line)
+                        for term in block['terms']:
+                            index['postings'].setdefault(term, []).append(len(index['blocks']))
+                        index['blocks'].append(block)
+            return index
+
+    def warm(self):
+        # Loads every sidecar so the first admin query doesn't pay for it
+        for _, path in self.writer.segments():
+            self._segment_index(path)
+
+    def _candidates(self, index, terms):
+        if not terms:
+            return list(range(len(index['blocks'])))
+        postings = [index['postings'].get(term, ()) for term in terms]
+        candidates = set(min(postings, key=len))
+        for block_ids in postings:
+            candidates.intersection_update(block_ids)
+        return sorted(candidates)
+
+    @staticmethod
+    def _read_block(path, block):
+        with open(path, 'rb') as f:
+            f.seek(block['offset'])
+            data = gzip.decompress(f.read(block['length']))
+        return [json.loads(line) for line in data.decode('utf-8').splitlines() if line]
+
+    def search(self, terms, since=None, until=None, offset=0, limit=10):
+        # Returns (records newest first, whether more exist)
+        wanted = offset + limit + 1
+        matches = []
+        live = set()
+        for _, path in reversed(self.writer.segments()):
+            live.add(path)
+            index = self._segment_index(path)
+            blocks = index['blocks']
+            if blocks and since is not None and blocks[-1]['max_ts'] < since:
+                break
+            for block_id in reversed(self._candidates(index, terms)):
+                block = blocks[block_id]
+                if (since is not None and block['max_ts'] < since) or (until is not None and block['min_ts'] > until):
+                    continue
+                for record in reversed(self._read_block(path, block)):
+                    if (since is not None and record['ts'] < since) or (until is not None and record['ts'] > until):
+                        continue
+                    if terms <= activity_terms(record):
+                        matches.append(record)
+                        if len(matches) >= wanted:
+                            return matches[offset:offset + limit], True
+        with self._lock:
+            for path in list(self._segments):
+                if path not in live:
+                    del self._segments[path]  # rotated away
+        return matches[offset:offset + limit], False
+
+activity_log_search = ActivityLogSearch(activity_log_writer)
+
+def parse_log_query(query):
+    # "<user_id>", "<upi@bank>", "<action>" or key:value words (user, admin,
+    # action, upi, since, until; dates as YYYY-MM-DD), all ANDed together
+    terms, since, until = set(), None, None
+    for word in query.split():
+        key, sep, value = word.partition(':')
+        if not sep:
+            if word.isdigit():
+                terms.add(f"user:{word}")
+            elif '@' in word:
+                terms.add(f"upi:{word.lower()}")
+            else:
+                terms.add(f"action:{word}")
+        elif key in ('since', 'until'):
+            day = datetime.strptime(value, "%Y-%m-%d").timestamp()
+            if key == 'since':
+                since = day
+            else:
+                until = day + 86400
+        elif key in ('user', 'admin', 'action'):
+            terms.add(f"{key}:{value}")
+        elif key == 'upi':
+            terms.add(f"upi:{value.lower()}")
+        else:
+            raise ValueError(f"Unknown filter: {word}")
+    return terms, since, until
+
+def log_activity(message, action='system', **fields):
+    # Structured record: free-text message plus fields such as user_id and amount
+    now = datetime.now()
+    record = {
+        'ts': now.timestamp(),
+        'timestamp': now.strftime("%Y-%m-%d %H:%M:%S"),
+        'action': action,
+        'message': message
+    }
+    for key, value in fields.items():
+        record[key] = str(value) if key.endswith('_id') and value is not None else value
+    ACTIVITY_LOGS.append(record)  # deque with maxlen drops the oldest in O(1)
+    activity_log_writer.write(record)
+
+# ======================
+# Database Functions
+# ======================
+
+def _referral_checksum(user_id):
+    digest = hmac.new(REFERRAL_SECRET.encode(), str(user_id).encode(), hashlib.sha256).digest()
+    return base64.b32encode(digest)[:6].decode()
+
+def generate_referral_code(user_id):
+    # The code embeds the (unique) user id, so codes never collide and the
+    # referrer is found by decoding instead of scanning every user
+    return f"REF-{user_id}-{_referral_checksum(user_id)}"
+
+def resolve_referral_code(code):
+    # Returns (user_id, user) for a valid code, else None. Comparing with the
+    # stored code rejects typos and also accepts codes issued before the
+    # checksum format, which carry a random suffix.
+    parts = code.split('-')
+    # isdigit() alone also accepts digits like '²' that int() rejects
+    if len(parts) != 3 or parts[0] != 'REF' or not (parts[1].isascii() and parts[1].isdigit()):
+        return None
+    user = get_user_data(parts[1])
+    if not user or user.get('referral_code') != code:
+        return None
+    return parts[1], user
+
+def is_admin(user_id):
+    return int(user_id) == ADMIN_ID
+
+def is_user_blocked(user_id):
+    return str(user_id) in blocked_users
+
+def block_user(user_id):
+    blocked_users.add(str(user_id))
+    if get_user_data(user_id):
+        update_user_data(user_id, field='blocked', value=True)
+    log_activity(f"User {user_id} blocked by system", action='user_blocked', user_id=user_id)
+
+@traced('store')
+def get_user_data(user_id):
+    return storage.get_user(user_id)
+
+@traced('store')
+def update_user_data(user_id, data=None, field=None, value=None):
+    if data:
+        storage.put_user(user_id, data)
+    elif field:
+        storage.set_user_field(user_id, field, value)
+    return True
+
+@traced('store')
+def record_completion(user_id, task_id):
+    return storage.add_completion(user_id, task_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+@traced('store')
+def count_users():
+    return storage.count_users()
+
+@traced('store')
+def get_tasks():
+    return task_registry.all()
+
+@traced('store')
+def get_task(task_id):
+    return task_registry.get(task_id)
+
+@traced('store')
+def get_active_tasks():
+    return task_registry.active()
+
+@traced('store')
+def add_task(task):
+    storage.add_task(task)
+    task_registry.invalidate()
+    return True
+
+@traced('store')
+def update_task(task_id, field, value):
+    updated = storage.update_task(task_id, field, value)
+    task_registry.invalidate()
+    return updated
+
+@traced('store')
+def increment_task_completions(task_id):
+    # Not part of the catalogue view, so the registry stays valid
+    return storage.increment_task_completions(task_id)
+
+@traced('store')
+def record_submission(user_id, task_id, file_id):
+    storage.add_submission(user_id, {
+        'task_id': task_id,
+        'file_id': file_id,
+        'status': 'pending',
+        'submitted_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    })
+    return True
+
+@traced('store')
+def get_pending_submissions(limit=None, offset=0):
+    return storage.pending_submissions(limit, offset)
+
+@traced('store')
+def update_submission_status(user_id, task_id, status, reason=None):
+    return storage.set_submission_status(
+        user_id, task_id, status, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), reason
+    )
+
+@traced('store')
+def count_submissions(status):
+    return storage.count_submissions(status)
+
+@traced('store')
+def record_withdrawal(withdrawal):
+    storage.add_withdrawal(withdrawal)
+    return True
+
+@traced('store')
+def update_withdrawal(user_id, requested_at, from_status=None, **fields):
+    return storage.update_withdrawal(user_id, requested_at, fields, from_status)
+
+@traced('store')
+def get_pending_withdrawals():
+    return storage.withdrawals_by_status('pending')
+
+@traced('store')
+def count_withdrawals(status):
+    return storage.count_withdrawals(status)
+
+# ======================
+# Callback Tokens
+# ======================
+
+class CallbackTokens:
+    # Inline buttons carry "<prefix><token>" instead of raw ids, and the
+    # record behind the token stays here: an LRU bounded by capacity with a
+    # TTL. A token is a hash of its record, so re-issuing the same record
+    # (e.g. after a restart) gives the same token. Pinned records back
+    # long-lived keyboards such as the task list and are never evicted.
+    # With a path, a new pinned record is written through to it at once;
+    # other new tokens are saved by the periodic save_if_dirty.
+
+    def __init__(self, capacity=50000, ttl=7 * 24 * 3600, path=None):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.path = path
+        self._records = OrderedDict()  # token -> (expires_at, record)
+        self._pinned = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load()
+
+    @staticmethod
+    def token_for(record):
+        key = json.dumps(record, sort_keys=True, ensure_ascii=False).encode()
+        return base64.urlsafe_b64encode(hashlib.blake2b(key, digest_size=9).digest()).decode()
+
+    def issue(self, pin=False, **record):
+        token = self.token_for(record)
+        write_through = False
+        with self._lock:
+            if pin:
+                write_through = token not in self._pinned and self.path is not None
+                self._pinned[token] = record
+            else:
+                self._records[token] = (time.time() + self.ttl, record)
+                self._records.move_to_end(token)
+                if len(self._records) > self.capacity:
+                    self._records.popitem(last=False)
+                self._dirty = True
+        if write_through:
+            self.save()
+        return token
+
+    def resolve(self, token):
+        with self._lock:
+            record = self._pinned.get(token)
+            if record is not None:
+                return record
+            entry = self._records.get(token)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._records[token]
+                return None
+            self._records.move_to_end(token)
+            return entry[1]
+
+    def __len__(self):
+        return len(self._records) + len(self._pinned)
+
+    def save(self):
+        # Pinned records are stored with no expiry
+        with self._save_lock:
+            with self._lock:
+                now = time.time()
+                entries = [[token, None, record] for token, record in self._pinned.items()]
+                entries += [[token, expires_at, record] for token, (expires_at, record) in self._records.items()
+                            if expires_at > now]
+                self._dirty = False
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+    def save_if_dirty(self):
+        if self._dirty:
+            self.save()
+
+    def load(self):
+        with open(self.path, encoding='utf-8') as f:
+            entries = json.load(f)
+        now = time.time()
+        with self._lock:
+            for token, expires_at, record in entries:
+                if expires_at is None:
+                    self._pinned[token] = record
+                elif expires_at > now:
+                    self._records[token] = (expires_at, record)
+            while len(self._records) > self.capacity:
+                self._records.popitem(last=False)
+
+callback_tokens = CallbackTokens(CALLBACK_TOKEN_CAPACITY, CALLBACK_TOKEN_TTL, CALLBACK_TOKENS_FILE or None)
+if CALLBACK_TOKENS_FILE:
+    atexit.register(callback_tokens.save)
+
+def callback_data(prefix, pin=False, **record):
+    return prefix + callback_tokens.issue(pin=pin, **record)
+
+def notify_callback(call, text):
+    # Toast for the tapped button; once acknowledged early it can't have
+    # one, so the button's message is replaced with the text instead
+    if getattr(call, 'acknowledged', False):
+        outbound.edit_message_text(text, call.message.chat.id, call.message.message_id)
+    else:
+        outbound.answer_callback_query(call.id, text)
+
+def resolve_callback(call, prefix, expired_key='button_expired'):
+    # Record behind the button, or None (already answered) if it expired
+    record = callback_tokens.resolve(call.data[len(prefix):])
+    if record is None:
+        notify_callback(call, text_for(call, expired_key))
+    return record
+
+# ======================
+# Conversation State
+# ======================
+
+class ConversationStore:
+    # Per-chat state of multi-step flows, kept in the storage backend so a
+    # restart resumes them. While a chat has a state with a registered step,
+    # its next message goes to that step (see RewardsBot) with the state's
+    # data as keyword arguments. Slots other than 'step' hold passive state,
+    # such as the task a screenshot is for, that handlers read themselves.
+    # States expire after ttl seconds; the sweep also drops the oldest
+    # beyond limit, so abandoned flows can't pile up.
+
+    def __init__(self, storage, ttl=1800, limit=100000):
+        self.storage = storage
+        self.ttl = ttl
+        self.limit = limit
+        self.steps = {}
+
+    def step(self, state):
+        def decorator(function):
+            self.steps[state] = timed_handler(function)
+            return function
+        return decorator
+
+    def install(self, bot):
+        bot.conversations = self
+
+    def begin(self, chat_id, state, slot='step', **data):
+        self.storage.put_conversation(f"{slot}:{chat_id}", {
+            'state': state,
+            'data': data,
+            'expires_at': time.time() + self.ttl
+        })
+
+    def get(self, chat_id, slot='step'):
+        record = self.storage.get_conversation(f"{slot}:{chat_id}")
+        if record is None or record['expires_at'] <= time.time():
+            return None
+        return record
+
+    def finish(self, chat_id, slot='step'):
+        # The live record, removed; None if there was none or it expired
+        record = self.get(chat_id, slot)
+        if record is not None:
+            self.storage.delete_conversation(f"{slot}:{chat_id}")
+        return record
+
+    def resume(self, message):
+        # (step handler, data) for a message that continues a flow, else None
+        record = self.get(message.chat.id)
+        if record is None or record['state'] not in self.steps:
+            return None
+        self.storage.delete_conversation(f"step:{message.chat.id}")
+        return self.steps[record['state']], record['data']
+
+    def sweep(self):
+        return self.storage.expire_conversations(time.time(), self.limit)
+
+    def __len__(self):
+        return self.storage.count_conversations()
+
+conversations = ConversationStore(storage, CONVERSATION_TTL, CONVERSATION_LIMIT)
+
+# ======================
+# Task Quotas
+# ======================
+
+class QuotaCounter:
+    __slots__ = ('lifetime', 'window', 'hour', 'buckets')
+
+    def __init__(self, hour, buckets):
+        self.lifetime = 0
+        self.window = 0  # sum of buckets
+        self.hour = hour  # hour of the newest bucket
+        self.buckets = array('H', bytes(2 * buckets))
+
+class TaskQuotas:
+    # Per-user task quotas: at most `daily` proofs in any rolling 24 hours
+    # and `lifetime` tasks in total (pending or approved; a rejection gives
+    # the slot back). The day is a ring of hourly buckets with a running
+    # sum, so a check or an increment touches at most one ring. Counters
+    # are kept for recently active users only (LRU bounded by capacity);
+    # anyone else is seeded from their stored submissions on first use.
+
+    BUCKETS = 24
+    BUCKET_SECONDS = 3600
+
+    def __init__(self, daily, lifetime, capacity=100000):
+        self.daily = daily
+        self.lifetime = lifetime
+        self.capacity = capacity
+        self._counters = OrderedDict()  # user_id -> QuotaCounter
+        self._lock = threading.Lock()
+
+    def _hour(self, now):
+        return int(now // self.BUCKET_SECONDS)
+
+    def _advance(self, counter, hour):
+        # Empty the buckets that fell out of the window since the last use
+        gap = hour - counter.hour
+        if gap <= 0:
+            return
+        if gap >= self.BUCKETS:
+            counter.buckets = array('H', bytes(2 * self.BUCKETS))
+            counter.window = 0
+        else:
+            for h in range(counter.hour + 1, hour + 1):
+                i = h % self.BUCKETS
+                counter.window -= counter.buckets[i]
+                counter.buckets[i] = 0
+        counter.hour = hour
+
+    def _seed(self, user_id, now):
+        counter = QuotaCounter(self._hour(now), self.BUCKETS)
+        since = now - self.BUCKETS * self.BUCKET_SECONDS
+        for sub in storage.user_submissions(user_id):
+            if sub['status'] != 'rejected':
+                counter.lifetime += 1
+            try:
+                at = datetime.fromisoformat(sub['submitted_at']).timestamp()
+            except (TypeError, ValueError):
+                continue
+            if since < at <= now:
+                counter.buckets[self._hour(at) % self.BUCKETS] += 1
+                counter.window += 1
+        return counter
+
+    def _counter(self, user_id, now):
+        key = str(user_id)
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is not None:
+                self._counters.move_to_end(key)
+        if counter is None:
+            seeded = self._seed(user_id, now)
+            with self._lock:
+                counter = self._counters.setdefault(key, seeded)
+                while len(self._counters) > self.capacity:
+                    self._counters.popitem(last=False)
+        return counter
+
+    def _exceeded(self, counter):
+        if counter.lifetime >= self.lifetime:
+            return 'lifetime'
+        if counter.window >= self.daily:
+            return 'daily'
+        return None
+
+    def check(self, user_id, now=None):
+        # Name of the limit the user has hit ('daily' or 'lifetime'), else None
+        now = time.time() if now is None else now
+        counter = self._counter(user_id, now)
+        with self._lock:
+            self._advance(counter, self._hour(now))
+            limit = self._exceeded(counter)
+        if limit:
+            quota_rejections.inc(limit)
+        return limit
+
+    def acquire(self, user_id, now=None):
+        # Like check(), but takes a slot from both quotas when none is hit
+        now = time.time() if now is None else now
+        counter = self._counter(user_id, now)
+        with self._lock:
+            hour = self._hour(now)
+            self._advance(counter, hour)
+            limit = self._exceeded(counter)
+            if limit is None:
+                counter.lifetime += 1
+                counter.buckets[hour % self.BUCKETS] += 1
+                counter.window += 1
+        if limit:
+            quota_rejections.inc(limit)
+        return limit
+
+    def release(self, user_id):
+        # A rejected or unsaved proof gives its lifetime slot back; the daily
+        # window still counts the attempt
+        with self._lock:
+            counter = self._counters.get(str(user_id))
+            if counter is not None and counter.lifetime > 0:
+                counter.lifetime -= 1
+
+    def __len__(self):
+        return len(self._counters)
+
+task_quotas = TaskQuotas(DAILY_TASK_LIMIT, MAX_TASKS_PER_USER, QUOTA_CACHE_SIZE)
+
+# ======================
+# Task Registry
+# ======================
+
+class TaskRegistry:
+    # Read-through cache of the task catalogue: tasks by id, the ordered
+    # active view and the serialized "🎯 नया कार्य" keyboard. Built on first
+    # use and dropped whenever add_task/update_task change the catalogue.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._view = None
+
+    def invalidate(self):
+        with self._lock:
+            self._view = None
+
+    def _current(self):
+        view = self._view
+        if view is None:
+            with self._lock:
+                if self._view is None:
+                    self._view = self._build(storage.get_tasks())
+                view = self._view
+        return view
+
+    def _build(self, tasks):
+        tasks = list(tasks)
+        active = [task for task in tasks if task.get('active', True)]
+        keyboard = None
+        if active:
+            markup = types.InlineKeyboardMarkup()
+            for task in active:
+                task_type = TASK_TYPES.get(task.get('type')) or task.get('type') or messages.render('task_type_general')
+                markup.add(types.InlineKeyboardButton(
+                    text=messages.render('task_button', task_type=task_type, title=task['title'], reward=task['reward']),
+                    callback_data=callback_data('task_', pin=True, task_id=task['id'])
+                ))
+            keyboard = markup.to_json()
+        return {
+            'tasks': tasks,
+            'by_id': {task['id']: task for task in tasks},
+            'active': active,
+            'keyboard': keyboard
+        }
+
+    def all(self):
+        return self._current()['tasks']
+
+    def get(self, task_id):
+        return self._current()['by_id'].get(task_id)
+
+    def active(self):
+        return self._current()['active']
+
+    def keyboard(self):
+        return self._current()['keyboard']
+
+task_registry = TaskRegistry()
+
+# ======================
+# Balance Ledger
+# ======================
+
+class BalanceLedger:
+    # Double-entry ledger: every balance change is an append-only entry that
+    # debits one account and credits another. User balances are changed only
+    # here, under a per-user striped lock, and the sum of all user balances is
+    # kept as a running total.
+
+    def __init__(self, stripes=LEDGER_LOCK_STRIPES):
+        self._locks = [threading.RLock() for _ in range(stripes)]
+        self._totals_lock = threading.Lock()
+        self.total_balance = storage.user_totals()['balance']
+        self.entries_posted = 0
+
+    def user_lock(self, user_id):
+        return self._locks[hash(str(user_id)) % len(self._locks)]
+
+    def _entry(self, debit, credit, amount, kind, ref):
+        return {
+            'at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'debit': debit,
+            'credit': credit,
+            'amount': amount,
+            'kind': kind,
+            'ref': None if ref is None else str(ref)
+        }
+
+    def _adjust_total(self, delta):
+        with self._totals_lock:
+            self.total_balance += delta
+            self.entries_posted += 1
+
+    def credit(self, user_id, amount, kind, source=None, ref=None):
+        # Move `amount` from a system account (default rewards:<kind>) into
+        # the user's balance. Returns the new balance, or None for an unknown user.
+        with self.user_lock(user_id):
+            user = get_user_data(user_id)
+            if not user:
+                return None
+            balance = user.get('balance', 0) + amount
+            entry = self._entry(source or f"rewards:{kind}", f"user:{user_id}", amount, kind, ref)
+            storage.post_ledger_entry(entry, user_id=user_id, balance=balance)
+        self._adjust_total(amount)
+        return balance
+
+    def debit_all(self, user_id, kind, destination=None, minimum=0, ref=None):
+        # Atomically move the user's whole balance out to a system account
+        # (default payable:<kind>). Returns the amount moved, or 0 if the
+        # balance is below `minimum`.
+        with self.user_lock(user_id):
+            user = get_user_data(user_id)
+            amount = user.get('balance', 0) if user else 0
+            if amount <= 0 or amount < minimum:
+                return 0
+            entry = self._entry(f"user:{user_id}", destination or f"payable:{kind}", amount, kind, ref)
+            storage.post_ledger_entry(entry, user_id=user_id, balance=0)
+        self._adjust_total(-amount)
+        return amount
+
+    def transfer(self, debit, credit, amount, kind, ref=None):
+        # Posting between system accounts; user balances are untouched
+        storage.post_ledger_entry(self._entry(debit, credit, amount, kind, ref))
+        with self._totals_lock:
+            self.entries_posted += 1
+
+ledger = BalanceLedger()
+
+# ======================
+# Outbound Dispatcher
+# ======================
+
+# Lower value = sent first
+PRIORITY_ACK = 0          # answer_callback_query
+PRIORITY_INTERACTIVE = 1  # replies to something the user just did
+PRIORITY_BULK = 2         # broadcasts and other fan-out
+
+class CallbackAcks:
+    # Follows callback queries from arrival to their answer, for the ack
+    # latency histogram, and remembers which were answered: Telegram takes
+    # one answer per query, so a second one (after an early ack) is dropped.
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self._received = OrderedDict()  # id -> arrival (monotonic), until answered
+        self._answered = OrderedDict()
+        self._lock = threading.Lock()
+
+    def received(self, callback_query_id):
+        with self._lock:
+            self._received[callback_query_id] = time.monotonic()
+            if len(self._received) > self.capacity:
+                self._received.popitem(last=False)
+
+    def answer(self, callback_query_id):
+        # (first answer?, arrival time if known)
+        with self._lock:
+            if callback_query_id in self._answered:
+                return False, None
+            self._answered[callback_query_id] = True
+            if len(self._answered) > self.capacity:
+                self._answered.popitem(last=False)
+            return True, self._received.pop(callback_query_id, None)
+
+callback_acks = CallbackAcks()
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, now):
+        # Takes one token and returns how long to wait before using it.
+        # Tokens may go negative: that is the queue of earlier reservations.
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def take(self, now):
+        # Takes one token if there is one; never goes into debt
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def pause(self, until):
+        # No tokens before `until`, and none saved up from before it, so
+        # sending resumes at the normal rate instead of in a burst
+        self.tokens = min(self.tokens, 0)
+        self.updated = max(self.updated, until)
+
+
+class OutboundJob:
+    __slots__ = ('method', 'chat_id', 'args', 'kwargs', 'future', 'attempts', 'enqueued_at', 'trace_parent',
+                 'reserved')
+
+    def __init__(self, method, chat_id, args, kwargs):
+        self.method = method
+        self.chat_id = chat_id
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.attempts = 0
+        self.enqueued_at = time.monotonic()
+        self.trace_parent = current_span.get()
+        self.reserved = False  # holds a rate-limit slot, waiting for its time
+
+
+class OutboundLane:
+    # One worker's jobs: those ready to send, by priority, and those held
+    # back by a rate limit, by the time they may go. A job waiting for its
+    # chat's bucket sits in `delayed` instead of holding the worker, so the
+    # other chats on the lane keep moving.
+
+    def __init__(self):
+        self.ready = []  # (priority, seq, job)
+        self.delayed = []  # (ready_at, seq, priority, job)
+        self.cond = threading.Condition()
+
+    def put(self, item):
+        with self.cond:
+            heapq.heappush(self.ready, item)
+            self.cond.notify()
+
+    def delay(self, ready_at, priority, seq, job):
+        with self.cond:
+            heapq.heappush(self.delayed, (ready_at, seq, priority, job))
+
+    def get(self):
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                while self.delayed and self.delayed[0][0] <= now:
+                    _, seq, priority, job = heapq.heappop(self.delayed)
+                    heapq.heappush(self.ready, (priority, seq, job))
+                if self.ready:
+                    return heapq.heappop(self.ready)
+                self.cond.wait(self.delayed[0][0] - now if self.delayed else None)
+
+    def qsize(self):
+        return len(self.ready) + len(self.delayed)
+
+
+class OutboundDispatcher:
+    # Every Telegram API call made by a handler goes through here. Calls are
+    # queued by priority and sent by a few worker threads under a global and
+    # a per-chat token bucket; a 429 pauses all sending for retry_after.
+    # Jobs for one chat always land in the same lane, so they keep their order.
+
+    def __init__(self, bot, workers=4, global_rate=30, chat_rate=1, chat_burst=3,
+                 max_retries=5, max_chat_buckets=10000):
+        self.bot = bot
+        self.lanes = [OutboundLane() for _ in range(workers)]
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.max_chat_buckets = max_chat_buckets
+        self.stats = Counter()
+        self._chat_buckets = OrderedDict()
+        self._paused_until = 0
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._started = False
+        self._in_flight = 0
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for i, lane in enumerate(self.lanes):
+            threading.Thread(target=self._worker, args=(lane,), name=f"outbound-{i}", daemon=True).start()
+
+    def submit(self, method, chat_id, args, kwargs, priority=PRIORITY_INTERACTIVE):
+        if not self._started:
+            self.start()
+        job = OutboundJob(method, chat_id, args, kwargs)
+        seq = next(self._seq)
+        lane_key = seq if chat_id is None else hash(str(chat_id))
+        self.lanes[lane_key % len(self.lanes)].put((priority, seq, job))
+        return job.future
+
+    # Handler-facing API, mirrors the TeleBot methods
+
+    def send_message(self, chat_id, text, priority=PRIORITY_INTERACTIVE, **kwargs):
+        return self.submit('send_message', chat_id, (chat_id, text), kwargs, priority)
+
+    def reply_to(self, message, text, priority=PRIORITY_INTERACTIVE, **kwargs):
+        return self.submit('reply_to', message.chat.id, (message, text), kwargs, priority)
+
+    def send_photo(self, chat_id, photo, priority=PRIORITY_INTERACTIVE, **kwargs):
+        return self.submit('send_photo', chat_id, (chat_id, photo), kwargs, priority)
+
+    def edit_message_text(self, text, chat_id, message_id, priority=PRIORITY_INTERACTIVE, **kwargs):
+        return self.submit('edit_message_text', chat_id, (text, chat_id, message_id), kwargs, priority)
+
+    def answer_callback_query(self, callback_query_id, text=None, priority=PRIORITY_ACK, **kwargs):
+        first, received_at = callback_acks.answer(callback_query_id)
+        if not first:
+            future = Future()
+            future.set_result(False)
+            return future
+        # Not a chat message, so only a 429 pause holds it back
+        future = self.submit('answer_callback_query', None, (callback_query_id, text), kwargs, priority)
+        if received_at is not None:
+            future.add_done_callback(lambda f: callback_ack_seconds.observe(time.monotonic() - received_at))
+        return future
+
+    # Metrics
+
+    def queue_depth(self):
+        return sum(lane.qsize() for lane in self.lanes)
+
+    def metrics(self):
+        return {
+            'queue_depth': self.queue_depth(),
+            'in_flight': self._in_flight,
+            'sent': self.stats['sent'],
+            'failed': self.stats['failed'],
+            'retried': self.stats['retried']
+        }
+
+    def drain(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.queue_depth() or self._in_flight:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    # Workers
+
+    def _reserve(self, chat_id):
+        # Returns (seconds to wait, whether a send slot was reserved)
+        with self._lock:
+            now = time.monotonic()
+            if self._paused_until > now:
+                return self._paused_until - now, False
+            if chat_id is None:
+                return 0, True
+            bucket = self._chat_buckets.get(chat_id)
+            if bucket is None:
+                bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+                if len(self._chat_buckets) > self.max_chat_buckets:
+                    self._chat_buckets.popitem(last=False)
+            else:
+                self._chat_buckets.move_to_end(chat_id)
+            return max(self.global_bucket.reserve(now), bucket.reserve(now)), True
+
+    def _worker(self, lane):
+        while True:
+            priority, seq, job = lane.get()
+            if job.reserved and self._paused_until > time.monotonic():
+                # Its slot was reserved before a 429: queue again behind the pause
+                job.reserved = False
+            if not job.reserved:
+                wait, job.reserved = self._reserve(job.chat_id)
+                if wait > 0:
+                    # Not sendable yet: park it and serve the lane's other chats
+                    lane.delay(time.monotonic() + wait, priority, seq, job)
+                    continue
+            job.reserved = False  # spent by this attempt
+            with self._lock:
+                self._in_flight += 1
+            try:
+                self._execute(lane, priority, seq, job)
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+
+    def _execute(self, lane, priority, seq, job):
+        start = time.perf_counter()
+        if job.attempts == 0:
+            outbound_wait_seconds.observe(time.monotonic() - job.enqueued_at, priority)
+        try:
+            with start_span(f"telegram.{job.method}", parent=job.trace_parent,
+                            chat_id=job.chat_id, attempt=job.attempts,
+                            queued_ms=round((time.monotonic() - job.enqueued_at) * 1000, 1)):
+                result = getattr(self.bot, job.method)(*job.args, **job.kwargs)
+        except ApiTelegramException as e:
+            api_seconds.observe(time.perf_counter() - start, job.method)
+            api_errors.inc(job.method, e.error_code)
+            if e.error_code == 429 and job.attempts < self.max_retries:
+                retry_after = (e.result_json.get('parameters') or {}).get('retry_after', 1)
+                with self._lock:
+                    # The 429 does not say whether the chat or the bot hit the
+                    # limit, so every lane and bucket waits out retry_after
+                    self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                    self.global_bucket.pause(self._paused_until)
+                    bucket = self._chat_buckets.get(job.chat_id)
+                    if bucket is not None:
+                        bucket.pause(self._paused_until)
+                    self.stats['retried'] += 1
+                job.attempts += 1
+                lane.put((priority, seq, job))  # keeps its place in the queue
+                return
+            self._fail(priority, job, e)
+        except Exception as e:
+            api_errors.inc(job.method, type(e).__name__)
+            self._fail(priority, job, e)
+        else:
+            api_seconds.observe(time.perf_counter() - start, job.method)
+            with self._lock:
+                self.stats['sent'] += 1
+            job.future.set_result(result)
+
+    def _fail(self, priority, job, error):
+        with self._lock:
+            self.stats['failed'] += 1
+        if priority != PRIORITY_BULK:
+            log_activity(f"Outbound {job.method} to {job.chat_id} failed: {str(error)}")
+        job.future.set_exception(error)
+
+outbound = OutboundDispatcher(
+    bot,
+    workers=OUTBOUND_WORKERS,
+    global_rate=OUTBOUND_GLOBAL_RATE,
+    chat_rate=OUTBOUND_CHAT_RATE,
+    chat_burst=OUTBOUND_CHAT_BURST
+)
+
+# ======================
+# Flood Control
+# ======================
+
+class FloodState:
+    __slots__ = ('bucket', 'strikes', 'last_strike', 'blocks', 'blocked_until')
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.strikes = 0
+        self.last_strike = 0.0
+        self.blocks = 0
+        self.blocked_until = 0.0
+
+class FloodControl:
+    # Admission check for messages and button taps, run on the ingestion
+    # thread before an update is traced, queued or dispatched. Blocked
+    # users are dropped, everyone else spends a token from their own
+    # bucket. Each dropped update is a strike; `strikes` of them within
+    # `strike_window` seconds mute the user for `block_seconds`, doubling
+    # each time, and after `max_blocks` mutes they are blocked for good.
+    # A user with no dropped update for `block_decay` seconds starts again
+    # from no mutes, so occasional bursts months apart never add up.
+    # Dropped updates get no reply, so they cost no API calls. State is
+    # kept for recently seen users only (LRU bounded by capacity).
+
+    GUARDED_TYPES = ('message', 'edited_message', 'callback_query')
+
+    def __init__(self, rate=1.0, burst=10, strikes=30, strike_window=60, block_seconds=300,
+                 max_blocks=3, block_decay=86400, capacity=100000):
+        self.rate = rate
+        self.burst = burst
+        self.strikes = strikes
+        self.strike_window = strike_window
+        self.block_seconds = block_seconds
+        self.max_blocks = max_blocks
+        self.block_decay = block_decay
+        self.capacity = capacity
+        self._states = OrderedDict()  # user_id -> FloodState
+        self._lock = threading.Lock()
+
+    def admit(self, update, update_type):
+        if update_type not in self.GUARDED_TYPES:
+            return True
+        user = getattr(getattr(update, update_type), 'from_user', None)
+        if user is None or user.id == ADMIN_ID:
+            return True
+        if str(user.id) in blocked_users:
+            flood_dropped.inc('blocked')
+            return False
+
+        now = time.monotonic()
+        with self._lock:
+            state = self._states.get(user.id)
+            if state is None:
+                state = self._states[user.id] = FloodState(TokenBucket(self.rate, self.burst))
+                if len(self._states) > self.capacity:
+                    self._states.popitem(last=False)
+            else:
+                self._states.move_to_end(user.id)
+
+            if state.blocked_until > now:
+                reason = 'muted'
+            elif state.bucket.take(now):
+                return True
+            else:
+                reason = 'rate'
+                if now - state.last_strike > self.strike_window:
+                    state.strikes = 0
+                    if now - state.last_strike > self.block_decay:
+                        state.blocks = 0
+                state.strikes += 1
+                state.last_strike = now
+                escalate = state.strikes >= self.strikes
+                if escalate:
+                    state.strikes = 0
+                    state.blocks += 1
+                    state.blocked_until = now + self.block_seconds * 2 ** (state.blocks - 1)
+                    blocks = state.blocks
+        flood_dropped.inc(reason)
+
+        if reason == 'rate' and escalate:
+            if blocks >= self.max_blocks:
+                block_user(user.id)
+            else:
+                log_activity(
+                    f"User {user.id} muted for {self.block_seconds * 2 ** (blocks - 1)}s for flooding",
+                    action='user_muted', user_id=user.id, blocks=blocks
+                )
+        return False
+
+    def __len__(self):
+        return len(self._states)
+
+flood_control = FloodControl(
+    rate=FLOOD_RATE,
+    burst=FLOOD_BURST,
+    strikes=FLOOD_STRIKES,
+    strike_window=FLOOD_STRIKE_WINDOW,
+    block_seconds=FLOOD_BLOCK_SECONDS,
+    max_blocks=FLOOD_MAX_BLOCKS,
+    block_decay=FLOOD_BLOCK_DECAY,
+    capacity=FLOOD_STATE_LIMIT
+)
+bot.flood_control = flood_control
+
+# ======================
+# Broadcast Engine
+# ======================
+
+# Running broadcast jobs by id
+broadcast_runners = {}
+
+class BroadcastRunner:
+    # Sends one broadcast page by page through the outbound queue at bulk
+    # priority. After each page the cursor and counters are checkpointed to
+    # storage, so a restart resumes where it stopped (a page interrupted by a
+    # crash is sent again). Users who blocked the bot are marked and skipped
+    # by later broadcasts.
+
+    STATUS_TEXT = {
+        'running': '⏳ Running',
+        'paused': '⏸️ Paused',
+        'cancelled': '🛑 Cancelled',
+        'completed': '✅ Completed'
+    }
+
+    def __init__(self, job):
+        self.job = job
+        self.wakeup = threading.Event()
+        self._last_progress_text = None
+        self._last_progress_at = 0
+
+    def start(self):
+        broadcast_runners[self.job['id']] = self
+        threading.Thread(target=self._run, name=f"broadcast-{self.job['id']}", daemon=True).start()
+
+    def set_status(self, status):
+        self.job['status'] = status
+        save_broadcast(self.job)
+        self.wakeup.set()
+        self.update_progress(force=True)
+
+    def _progress(self):
+        job = self.job
+        done = job['sent'] + job['blocked'] + job['skipped'] + job['failed']
+        text = (
+            f"📢 Broadcast {job['id']}\n\n"
+            f"{self.STATUS_TEXT[job['status']]}\n"
+            f"📊 Progress: {done}/{job['total']}\n"
+            f"✅ Sent: {job['sent']}\n"
+            f"🚫 Blocked bot: {job['blocked']}\n"
+            f"⏭️ Skipped: {job['skipped']}\n"
+            f"❌ Failed: {job['failed']}"
+        )
+        markup = types.InlineKeyboardMarkup()
+        if job['status'] == 'running':
+            markup.add(
+                types.InlineKeyboardButton("⏸️ Pause", callback_data=f"bcast_pause_{job['id']}"),
+                types.InlineKeyboardButton("🛑 Cancel", callback_data=f"bcast_cancel_{job['id']}")
+            )
+        elif job['status'] == 'paused':
+            markup.add(
+                types.InlineKeyboardButton("▶️ Resume", callback_data=f"bcast_resume_{job['id']}"),
+                types.InlineKeyboardButton("🛑 Cancel", callback_data=f"bcast_cancel_{job['id']}")
+            )
+        return text, markup
+
+    def update_progress(self, force=False):
+        job = self.job
+        now = time.monotonic()
+        if not force and now - self._last_progress_at < BROADCAST_PROGRESS_INTERVAL:
+            return
+        text, markup = self._progress()
+        if text == self._last_progress_text:
+            return
+        self._last_progress_text = text
+        self._last_progress_at = now
+        if job.get('progress_message_id'):
+            outbound.edit_message_text(text, job['admin_id'], job['progress_message_id'], reply_markup=markup)
+
+    def _send_page(self, users):
+        job = self.job
+        sends = []
+        for uid, user in users:
+            if user.get('blocked', False) or user.get('bot_blocked', False):
+                job['skipped'] += 1
+                continue
+            sends.append((uid, outbound.send_message(
+                uid, messages.render('broadcast', text=job['text']), priority=PRIORITY_BULK
+            )))
+
+        # A send still queued at the deadline is counted as failed; the
+        # dispatcher may deliver it later, but the broadcast moves on
+        deadline = time.monotonic() + BROADCAST_PAGE_TIMEOUT
+        for uid, future in sends:
+            try:
+                error = future.exception(timeout=max(0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                job['failed'] += 1
+                continue
+            if error is None:
+                job['sent'] += 1
+            elif isinstance(error, ApiTelegramException) and error.error_code == 403:
+                # Bot blocked or account deleted
+                job['blocked'] += 1
+                update_user_data(uid, field='bot_blocked', value=True)
+            else:
+                job['failed'] += 1
+
+    def _run(self):
+        job = self.job
+        try:
+            if not job.get('progress_message_id'):
+                text, markup = self._progress()
+                try:
+                    message = outbound.send_message(job['admin_id'], text, reply_markup=markup).result(timeout=60)
+                    job['progress_message_id'] = message.message_id
+                except Exception as e:
+                    log_activity(f"Broadcast {job['id']} progress message failed: {str(e)}")
+
+            while job['status'] in ('running', 'paused'):
+                if job['status'] == 'paused':
+                    self.wakeup.wait()
+                    self.wakeup.clear()
+                    continue
+
+                users, cursor = storage.user_page(job['cursor'], BROADCAST_PAGE_SIZE)
+                if not users:
+                    job['status'] = 'completed'
+                    break
+                self._send_page(users)
+                job['cursor'] = cursor
+                save_broadcast(job)
+                self.update_progress()
+        except Exception as e:
+            log_activity(f"Broadcast {job['id']} stopped: {str(e)}")
+        finally:
+            save_broadcast(job)
+            self.update_progress(force=True)
+            broadcast_runners.pop(job['id'], None)
+
+        log_activity(
+            f"Broadcast {job['id']} {job['status']}: {job['sent']} sent, "
+            f"{job['blocked']} blocked, {job['failed']} failed",
+            action='broadcast_finished', broadcast_id=job['id']
+        )
+
+def save_broadcast(job):
+    storage.save_broadcast(dict(job))
+
+def start_broadcast(admin_id, text):
+    job = {
+        'id': uuid.uuid4().hex[:8],
+        'admin_id': admin_id,
+        'text': text,
+        'status': 'running',
+        'cursor': None,
+        'total': count_users(),
+        'sent': 0,
+        'blocked': 0,
+        'skipped': 0,
+        'failed': 0,
+        'created_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'progress_message_id': None
+    }
+    save_broadcast(job)
+    BroadcastRunner(job).start()
+    return job
+
+def resume_broadcasts():
+    for job in storage.get_broadcasts():
+        if job['status'] in ('running', 'paused') and job['id'] not in broadcast_runners:
+            BroadcastRunner(job).start()
+            log_activity(f"Broadcast {job['id']} resumed at cursor {job['cursor']}")
+
+# ======================
+# Async Engine
+# ======================
+
+if AsyncTeleBot is not None:
+    class AsyncRewardsBot(AsyncTeleBot):
+        # Long-polls over aiohttp and hands every batch to the handlers
+        # registered on the sync `bot`, so both engines share one set of
+        # handlers. Dispatch can block (storage reads for conversation
+        # steps, lane backpressure), so batches are passed in order to one
+        # ingestion thread, which queues them on the executor lanes; the
+        # loop itself only polls and runs outbound API calls.
 
-def is_user_blocked(user_id):
-    return str(user_id) in blocked_users
+        ingest = ThreadPoolExecutor(max_workers=1, thread_name_prefix='async-ingest')
 
-def block_user(user_id):
-    blocked_users.add(str(user_id))
-    if str(user_id) in USERS_DB:
-        USERS_DB[str(user_id)]['blocked'] = True
-    log_activity(f"User {user_id} blocked by system")
+        async def process_new_updates(self, updates):
+            await asyncio.get_running_loop().run_in_executor(self.ingest, bot.process_new_updates, updates)
 
-def get_user_data(user_id):
-    return USERS_DB.get(str(user_id))
 
-def update_user_data(user_id, data=None, field=None, value=None):
-    if data:
-        USERS_DB[str(user_id)] = data
-    elif field:
-        if str(user_id) not in USERS_DB:
-            USERS_DB[str(user_id)] = {}
-        USERS_DB[str(user_id)][field] = value
-    return True
+class AsyncTransport:
+    # Stands in for `bot` inside the outbound dispatcher: each TeleBot call
+    # runs as the matching AsyncTeleBot coroutine on the engine loop, over
+    # its pooled aiohttp session. Telegram errors are re-raised as the sync
+    # ApiTelegramException so retry and 403 handling work unchanged.
 
-def get_tasks():
-    return TASKS_DB
+    def __init__(self, engine, loop):
+        self.engine = engine
+        self.loop = loop
 
-def add_task(task):
-    TASKS_DB.append(task)
-    return True
+    def __getattr__(self, method):
+        coroutine_function = getattr(self.engine, method)
 
-def record_submission(user_id, task_id, file_id):
-    if str(user_id) not in SUBMISSIONS_DB:
-        SUBMISSIONS_DB[str(user_id)] = []
-    
-    SUBMISSIONS_DB[str(user_id)].append({
-        'task_id': task_id,
-        'file_id': file_id,
-        'status': 'pending',
-        'submitted_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    })
-    return True
+        def call(*args, **kwargs):
+            future = asyncio.run_coroutine_threadsafe(coroutine_function(*args, **kwargs), self.loop)
+            try:
+                return future.result()
+            except asyncio_helper.ApiTelegramException as e:
+                raise ApiTelegramException(e.function_name, e.result, e.result_json) from e
 
-def get_pending_submissions():
-    pending = []
-    for user_id, user_submissions in SUBMISSIONS_DB.items():
-        for sub in user_submissions:
-            if sub['status'] == 'pending':
-                pending.append({
-                    'user_id': user_id,
-                    'task_id': sub['task_id'],
-                    'file_id': sub['file_id'],
-                    'submitted_at': sub['submitted_at']
-                })
-    return pending
+        return call
 
-def update_submission_status(user_id, task_id, status, reason=None):
-    if str(user_id) not in SUBMISSIONS_DB:
-        return False
-    
-    for sub in SUBMISSIONS_DB[str(user_id)]:
-        if sub['task_id'] == task_id and sub['status'] == 'pending':
-            sub['status'] = status
-            sub['processed_at'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            if reason:
-                sub['reason'] = reason
-            break
-    return True
+def create_async_engine():
+    if AsyncTeleBot is None:
+        raise RuntimeError("BOT_ENGINE=async needs aiohttp: pip install aiohttp")
+    asyncio_helper.REQUEST_LIMIT = ASYNC_CONNECTION_LIMIT
+    loop = asyncio.new_event_loop()
+    engine = AsyncRewardsBot(BOT_TOKEN)
+    outbound.bot = AsyncTransport(engine, loop)
+    return engine, loop
 
-def get_pending_withdrawals():
-    return [w for w in WITHDRAWALS_DB if w['status'] == 'pending']
+def run_async_engine(engine, loop, **polling_kwargs):
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(engine.infinity_polling(**polling_kwargs))
+    finally:
+        loop.run_until_complete(engine.close_session())
+        loop.close()
 
 # ======================
 # Keep Alive Server
@@ -369,19 +3739,89 @@ def alive():
 @app.route('/stats')
 def web_stats():
     stats = {
-        'total_users': len(USERS_DB),
-        'total_tasks': len(TASKS_DB),
-        'pending_submissions': len(get_pending_submissions()),
+        'total_users': count_users(),
+        'total_tasks': len(get_tasks()),
+        'pending_submissions': count_submissions('pending'),
         'pending_withdrawals': len(get_pending_withdrawals()),
-        'activity_logs': len(ACTIVITY_LOGS)
+        'activity_logs': len(ACTIVITY_LOGS),
+        'outbound': outbound.metrics(),
+        'webhook_queue': webhook_updates.qsize()
     }
     return stats
 
+@app.route('/metrics')
+def metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+def store_sizes():
+    return {
+        ('users',): count_users(),
+        ('tasks',): len(get_tasks()),
+        ('pending_submissions',): count_submissions('pending'),
+        ('pending_withdrawals',): count_withdrawals('pending'),
+        ('activity_logs',): len(ACTIVITY_LOGS),
+        ('running_broadcasts',): len(broadcast_runners),
+        ('conversations',): len(conversations),
+        ('quota_counters',): len(task_quotas),
+        ('flood_states',): len(flood_control)
+    }
+
+register_metric(GaugeMetric('bot_outbound_queue_depth', 'Outbound API calls waiting to be sent', outbound.queue_depth))
+register_metric(GaugeMetric('bot_outbound_in_flight', 'Outbound API calls being sent', lambda: outbound._in_flight))
+register_metric(GaugeMetric('bot_update_queue_depth', 'Updates waiting on executor lanes', bot.executor.queue_depth))
+register_metric(GaugeMetric('bot_update_in_flight', 'Handlers running on executor lanes', bot.executor.in_flight))
+register_metric(GaugeMetric('bot_webhook_queue_depth', 'Webhook updates waiting to be ingested', lambda: webhook_updates.qsize()))
+register_metric(GaugeMetric('bot_store_size', 'Records held by the store', store_sizes, ('store',)))
+
 def keep_alive():
     server = threading.Thread(target=lambda: app.run(host='0.0.0.0', port=8080))
     server.daemon = True
     server.start()
 
+# ======================
+# Webhook Ingestion
+# ======================
+
+# Raw update bodies waiting for the ingest thread
+webhook_updates = queue.Queue(maxsize=WEBHOOK_QUEUE_SIZE)
+
+@app.route(WEBHOOK_PATH, methods=['POST'])
+def telegram_webhook():
+    secret = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+    if not hmac.compare_digest(secret, WEBHOOK_SECRET):
+        return "Forbidden", 403
+    
+    # Parsing and handling happen off the request so Telegram gets its 200 at once
+    try:
+        webhook_updates.put_nowait(request.get_data(as_text=True))
+    except queue.Full:
+        # Telegram retries the update later
+        return "Busy", 503
+    return "OK"
+
+def webhook_ingest():
+    # One thread, so updates reach the executor lanes in the order they
+    # were received; it only parses and queues, handlers run on the lanes
+    while True:
+        body = webhook_updates.get()
+        try:
+            bot.process_new_updates([types.Update.de_json(body)])
+        except Exception as e:
+            log_activity(f"Webhook update failed: {str(e)}")
+
+def start_webhook():
+    threading.Thread(target=webhook_ingest, name="webhook-ingest", daemon=True).start()
+    
+    if WEBHOOK_URL:
+        bot.set_webhook(
+            url=WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            max_connections=WEBHOOK_MAX_CONNECTIONS
+        )
+        log_activity(f"Webhook registered at {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}")
+    else:
+        log_activity(f"Webhook serving {WEBHOOK_PATH} without registering (WEBHOOK_URL not set)")
+
 # ======================
 # Background Tasks
 # ======================
@@ -400,10 +3840,456 @@ def heartbeat_loop():
         log_activity("Heartbeat check - Bot is running")
         time.sleep(3600)
 
+def callback_tokens_save_loop():
+    while True:
+        time.sleep(CALLBACK_TOKENS_SAVE_INTERVAL)
+        try:
+            callback_tokens.save_if_dirty()
+        except Exception as e:
+            log_activity(f"Callback token save error: {str(e)}")
+
+def conversation_sweep_loop():
+    while True:
+        time.sleep(CONVERSATION_SWEEP_INTERVAL)
+        try:
+            conversations.sweep()
+        except Exception as e:
+            log_activity(f"Conversation sweep error: {str(e)}")
+
+# ======================
+# Update Router
+# ======================
+
+class PrefixTrie:
+    # Character trie of callback_data prefixes. A lookup walks the data once
+    # (at most 64 bytes) and returns the value of the longest registered
+    # prefix, so 'approve_wd_' wins over 'approve_' whatever the order.
+
+    END = None  # Key marking a node where a prefix ends
+
+    def __init__(self):
+        self.root = {}
+
+    def insert(self, prefix, value):
+        node = self.root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node[self.END] = value
+
+    def longest_match(self, text):
+        node = self.root
+        match = node.get(self.END)
+        for char in text:
+            node = node.get(char)
+            if node is None:
+                break
+            if self.END in node:
+                match = node[self.END]
+        return match
+
+
+class UpdateRouter:
+    # Reply-keyboard buttons are looked up by exact text and callbacks by
+    # longest prefix, behind one registered TeleBot handler each, so dispatch
+    # cost does not grow with the number of buttons.
+    # Callbacks registered with defer=True are acknowledged (ack) before the
+    # handler runs, so slow ones don't leave the client's spinner running;
+    # the handler then runs as its own task on the bot's executor and
+    # reports back by editing the message (see notify_callback).
+
+    def __init__(self, unmatched_callback=None, ack=None):
+        self.buttons = {}
+        self.callbacks = PrefixTrie()
+        self.deferred = set()
+        self.unmatched_callback = unmatched_callback
+        self.ack = ack
+        self.executor = None
+
+    def button(self, *texts):
+        def decorator(function):
+            handler = timed_handler(function)
+            for text in texts:
+                self.buttons[text] = handler
+            return function
+        return decorator
+
+    def callback(self, *prefixes, defer=False):
+        def decorator(function):
+            handler = timed_handler(function)
+            if defer:
+                self.deferred.add(handler)
+            for prefix in prefixes:
+                self.callbacks.insert(prefix, handler)
+            return function
+        return decorator
+
+    def is_button(self, message):
+        return message.text in self.buttons
+
+    def dispatch_button(self, message):
+        self.buttons[message.text](message)
+
+    def dispatch_callback(self, call):
+        handler = self.callbacks.longest_match(call.data or '')
+        if handler is None:
+            if self.unmatched_callback is not None:
+                self.unmatched_callback(call)
+        elif handler in self.deferred and self.ack is not None:
+            call.acknowledged = True
+            self.ack(call)
+            if self.executor is None:
+                handler(call)
+            else:
+                # Behind the user's own queued updates; admin work, so never shed
+                self.executor.submit(call.from_user.id, KeyedExecutor.HIGH, handler, call)
+        else:
+            handler(call)
+
+    def install(self, bot):
+        bot.register_message_handler(self.dispatch_button, func=self.is_button)
+        bot.register_callback_query_handler(self.dispatch_callback, func=lambda call: True)
+        self.executor = bot.executor if bot.threaded else None
+
+def acknowledge_callback(call):
+    outbound.answer_callback_query(call.id)
+
+# Stale or unknown buttons still get an answer so the client stops spinning
+router = UpdateRouter(unmatched_callback=acknowledge_callback, ack=acknowledge_callback)
+
+# ======================
+# Bot Identity
+# ======================
+
+class BotIdentity:
+    # The bot's own User from get_me, fetched at startup and refreshed every
+    # refresh_interval in the background, so a referral link costs no API
+    # round trip. Until a fetch succeeds the fallback username is used and
+    # a fetch is retried at most once a minute.
+
+    def __init__(self, bot, refresh_interval=3600, fallback_username=None):
+        self.bot = bot
+        self.refresh_interval = refresh_interval
+        self.fallback_username = fallback_username
+        self.user = None
+        self._retry_at = 0
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        with self._lock:
+            self._retry_at = time.monotonic() + 60
+            try:
+                self.user = self.bot.get_me()
+            except Exception as e:
+                log_activity(f"get_me failed: {str(e)}")
+                return False
+        return True
+
+    @property
+    def username(self):
+        if self.user is None and time.monotonic() >= self._retry_at:
+            self.refresh()
+        user = self.user
+        return user.username if user is not None else self.fallback_username
+
+    def refresh_loop(self):
+        while True:
+            time.sleep(self.refresh_interval if self.user is not None else 60)
+            self.refresh()
+
+bot_identity = BotIdentity(bot, BOT_IDENTITY_REFRESH, BOT_USERNAME_FALLBACK)
+
+# ======================
+# Message Catalogue
+# ======================
+
+# User-facing copy by locale. {placeholders} named in STATIC_SLOTS are filled
+# in once at startup; the rest are per-user slots passed to render(). To add
+# a language, add a locale here with the same keys (missing keys fall back
+# to DEFAULT_LOCALE); users whose Telegram language matches get it. Messages
+# sent to someone other than the sender (approvals, broadcasts) use
+# DEFAULT_LOCALE, since a user's language is only known from their updates.
+# Admin panel screens are operator tooling and stay inline in English.
+MESSAGES = {
+    'hi': {
+        'register_first': "❌ पहले /start कमांड के साथ बॉट शुरू करें",
+        'welcome': (
+            "🙏 नमस्ते {first_name}! TaskCompleteRewardsBot में आपका स्वागत है!\n\n"
+            "✅ सरल कार्य पूरे करके पैसे कमाएं\n"
+            "📸 प्रमाण सबमिट करके रिवॉर्ड पाएं\n"
+            "👥 दोस्तों को रेफर करके बोनस कैश पाएं\n"
+            "💸 कभी भी अपनी कमाई निकालें\n\n"
+            "💰 न्यूनतम निकासी: ₹{min_withdrawal}\n"
+            "🎁 रेफरल बोनस: ₹{referral_reward} प्रति रेफरल\n\n"
+            "🏆 मिलेस्टोन बोनस:\n"
+            "• 5 रेफरल = ₹10\n"
+            "• 10 रेफरल = ₹25\n"
+            "• 25 रेफरल = ₹50\n"
+            "• 50 रेफरल = ₹100\n"
+            "• 100 रेफरल = ₹250"
+        ),
+        'referral': (
+            "🔗 अपने दोस्तों को रेफर करें और प्रत्येक के लिए ₹{referral_reward} कमाएं!\n\n"
+            "📱 आपका रेफरल लिंक:\n"
+            "https://t.me/{bot_username}?start={referral_code}\n\n"
+            "👥 कुल रेफरल: {referrals}\n"
+            "💰 रेफरल से कमाई: ₹{referral_earnings}\n\n"
+            "🏆 मिलेस्टोन बोनस:\n"
+            "• 5 रेफरल = ₹10 बोनस\n"
+            "• 10 रेफरल = ₹25 बोनस\n"
+            "• 25 रेफरल = ₹50 बोनस\n"
+            "• 50 रेफरल = ₹100 बोनस\n"
+            "• 100 रेफरल = ₹250 बोनस"
+        ),
+        'help': (
+            "❓ TaskCompleteRewardsBot सहायता\n\n"
+            "📋 उपलब्ध कमांड:\n"
+            "/start - बॉट शुरू करें और रजिस्टर करें\n"
+            "/balance - अपनी कमाई देखें\n"
+            "/refer - अपना रेफरल लिंक पाएं\n"
+            "/withdrawal - पैसे निकालने का अनुरोध करें\n"
+            "/help - यह सहायता संदेश दिखाएं\n\n"
+            "📌 यह कैसे काम करता है:\n"
+            "1. 🎯 नया कार्य से उपलब्ध कार्य देखें\n"
+            "2. कोई कार्य पूरा करें\n"
+            "3. प्रमाण (स्क्रीनशॉट) सबमिट करें\n"
+            "4. अप्रूवल के बाद रिवॉर्ड पाएं\n"
+            "5. अपनी कमाई निकालें\n\n"
+            "🎁 कार्य प्रकार:\n"
+            "• YouTube Subscribe - ₹2-5\n"
+            "• Instagram Follow - ₹2-5\n"
+            "• Telegram Join - ₹2-5\n"
+            "• Facebook Like - ₹2-5\n"
+            "• WhatsApp Join - ₹2-5\n\n"
+            "👥 दोस्तों को रेफर करके अतिरिक्त पैसे कमाएं!\n"
+            "💰 न्यूनतम निकासी: ₹{min_withdrawal}\n"
+            "🔗 रेफरल बोनस: ₹{referral_reward} प्रति रेफरल"
+        ),
+        'help_buttons': (
+            "❓ TaskCompleteRewardsBot सहायता\n\n"
+            "📋 उपलब्ध बटन:\n"
+            "🎯 नया कार्य - कार्य ब्राउज़ करें और पूरा करें\n"
+            "💰 बैलेंस - अपनी कमाई देखें\n"
+            "🔗 रेफर - अपना रेफरल लिंक पाएं\n"
+            "💸 निकासी - पैसे निकालने का अनुरोध करें\n"
+            "❓ सहायता - यह सहायता संदेश दिखाएं\n\n"
+            "📌 यह कैसे काम करता है:\n"
+            "1. 🎯 नया कार्य से उपलब्ध कार्य देखें\n"
+            "2. कोई कार्य पूरा करें\n"
+            "3. प्रमाण (स्क्रीनशॉट) सबमिट करें\n"
+            "4. अप्रूवल के बाद रिवॉर्ड पाएं\n"
+            "5. अपनी कमाई निकालें\n\n"
+            "🎁 कार्य प्रकार:\n"
+            "• YouTube Subscribe - ₹2-5\n"
+            "• Instagram Follow - ₹2-5\n"
+            "• Telegram Join - ₹2-5\n"
+            "• Facebook Like - ₹2-5\n"
+            "• WhatsApp Join - ₹2-5\n\n"
+            "👥 दोस्तों को रेफर करके अतिरिक्त पैसे कमाएं!\n"
+            "💰 न्यूनतम निकासी: ₹{min_withdrawal}\n"
+            "🔗 रेफरल बोनस: ₹{referral_reward} प्रति रेफरल\n\n"
+            "📞 सहायता के लिए Admin से संपर्क करें"
+        ),
+
+        # Main keyboard; the router matches these labels in DEFAULT_LOCALE
+        'button_tasks': "🎯 नया कार्य",
+        'button_balance': "💰 बैलेंस",
+        'button_refer': "🔗 रेफर",
+        'button_withdraw': "💸 निकासी",
+        'button_help': "❓ सहायता",
+        'button_admin': "🔧 Admin Panel",
+        'button_expired': "⌛ This button has expired",
+        'admin_only': "❌ Admin only",
+        'admin_panel_denied': "❌ आपको Admin Panel का Access नहीं है।",
+
+        'balance': (
+            "💰 आपका वर्तमान बैलेंस: ₹{balance}\n\n"
+            "👥 रेफरल: {referrals} (₹{referral_earnings})\n"
+            "💵 न्यूनतम निकासी: ₹{min_withdrawal}\n"
+            "📊 पूरे किए गए कार्य: {completed_tasks}"
+        ),
+        'milestone_bonus': (
+            "🎉 बधाई हो! आपने {milestone} रेफरल पूरे किए!\n"
+            "🎁 मिलेस्टोन बोनस: ₹{bonus}\n"
+            "💰 कुल बैलेंस: ₹{balance}"
+        ),
+
+        'withdrawal_below_minimum': (
+            "❌ न्यूनतम निकासी राशि ₹{min_withdrawal} है\n"
+            "आपका वर्तमान बैलेंस: ₹{balance}"
+        ),
+        'withdrawal_ask_upi': (
+            "💸 निकासी राशि: ₹{balance}\n\n"
+            "कृपया अपना UPI ID भेजें (जैसे: 9876543210@paytm):"
+        ),
+        'withdrawal_invalid_upi': "❌ कृपया सही UPI ID भेजें (जैसे: 9876543210@paytm)",
+        'withdrawal_minimum': "❌ न्यूनतम निकासी राशि ₹{min_withdrawal} है",
+        'withdrawal_requested': (
+            "✅ निकासी अनुरोध सबमिट हो गया!\n\n"
+            "💰 राशि: ₹{amount}\n"
+            "💳 UPI ID: {upi_id}\n\n"
+            "Admin 24 घंटे के अंदर आपका पेमेंट प्रोसेस करेगा।"
+        ),
+        'withdrawal_approved': (
+            "✅ आपका निकासी अनुरोध स्वीकृत हो गया!\n\n"
+            "💰 राशि: ₹{amount}\n"
+            "💳 UPI ID: {upi_id}\n\n"
+            "पेमेंट 24 घंटे के अंदर आपके अकाउंट में ट्रांसफर हो जाएगा।"
+        ),
+        'withdrawal_rejected': (
+            "❌ आपका निकासी अनुरोध रद्द कर दिया गया।\n\n"
+            "📝 कारण: {reason}\n\n"
+            "💰 राशि ₹{amount} आपके बैलेंस में वापस कर दी गई है।"
+        ),
+
+        'no_tasks': "❌ फिलहाल कोई कार्य उपलब्ध नहीं है। बाद में जांचें!",
+        'task_list': (
+            "🎯 उपलब्ध कार्य\n\n"
+            "विवरण देखने और कार्य पूरा करने के लिए किसी कार्य पर क्लिक करें:"
+        ),
+        'task_button': "{task_type}: {title} (₹{reward})",
+        'task_type_general': "सामान्य कार्य",
+        'task_button_expired': "⌛ यह बटन पुराना हो गया है, कृपया कार्य सूची दोबारा खोलें",
+        'task_unavailable': "❌ कार्य अब उपलब्ध नहीं है",
+        'task_details': (
+            "🎯 कार्य: {title}\n"
+            "📱 प्रकार: {task_type}\n"
+            "💰 रिवॉर्ड: ₹{reward}\n\n"
+            "📝 विवरण:\n{description}\n\n"
+            "🔗 लिंक: {link}\n\n"
+            "📋 निर्देश:\n"
+            "1. ऊपर दिए गए लिंक पर जाएं\n"
+            "2. कार्य पूरा करें ({task_type})\n"
+            "3. कार्य पूरा होने का स्क्रीनशॉट लें\n"
+            "4. स्क्रीनशॉट को इस चैट में भेजें\n\n"
+            "⚠️ कार्य पूरा करने के बाद, स्क्रीनशॉट को फोटो के रूप में इस चैट में भेजें।"
+        ),
+        'task_complete_button': "✅ कार्य पूरा करके स्क्रीनशॉट भेजें",
+        'quota_lifetime': "🚫 आप अधिकतम {max_tasks} कार्य पूरे कर चुके हैं।",
+        'quota_daily': "⏳ 24 घंटे में अधिकतम {daily_task_limit} कार्य भेजे जा सकते हैं। कृपया बाद में कोशिश करें।",
+        'proof_request': (
+            "📸 कृपया कार्य पूरा होने का स्क्रीनशॉट भेजें:\n\n"
+            "⚠️ सुनिश्चित करें कि स्क्रीनशॉट में:\n"
+            "• आपका यूजरनेम दिखाई दे\n"
+            "• कार्य पूरा होने का प्रमाण हो\n"
+            "• इमेज स्पष्ट और पूरी दिखाई दे\n\n"
+            "अब स्क्रीनशॉट को फोटो के रूप में भेजें।"
+        ),
+        'proof_request_toast': "📸 अब स्क्रीनशॉट भेजें",
+        'proof_submitted': (
+            "✅ प्रमाण सफलतापूर्वक सबमिट हो गया!\n\n"
+            "आपका सबमिशन समीक्षा के लिए भेजा गया है। स्वीकृति के बाद आपको सूचित किया जाएगा।\n"
+            "💰 स्वीकृति के बाद रिवॉर्ड आपके बैलेंस में जोड़ दिया जाएगा।"
+        ),
+        'submission_approved': (
+            "🎉 आपका '{title}' कार्य स्वीकृत हो गया!\n"
+            "💰 ₹{reward} आपके बैलेंस में जोड़ दिए गए।\n"
+            "💵 नया बैलेंस: ₹{balance}\n\n"
+            "✅ बधाई हो! आप और भी कार्य पूरे कर सकते हैं।"
+        ),
+        'submission_rejected': (
+            "❌ आपका '{title}' कार्य रद्द कर दिया गया।\n\n"
+            "📝 कारण: {reason}\n\n"
+            "🔄 आप सही प्रमाण के साथ दोबारा कोशिश कर सकते हैं।\n"
+            "💡 सुझाव: स्क्रीनशॉट में आपका यूजरनेम और कार्य पूरा होने का स्पष्ट प्रमाण होना चाहिए।"
+        ),
+        'broadcast': "📢 Admin Announcement:\n\n{text}"
+    }
+}
+
+STATIC_SLOTS = {
+    'min_withdrawal': MIN_WITHDRAWAL,
+    'referral_reward': REWARD_PER_REFERRAL,
+    'max_tasks': MAX_TASKS_PER_USER,
+    'daily_task_limit': DAILY_TASK_LIMIT
+}
+
+
+class MessageCatalog:
+    # Compiles every template once per locale: static slots are substituted
+    # up front, so a template without per-user slots is a ready string and
+    # the rest need a single str.format over the remaining slots.
+
+    def __init__(self, messages, static_slots, default_locale):
+        self.default_locale = default_locale
+        self.locales = {}
+        for locale, templates in messages.items():
+            self.locales[locale] = {key: self._compile(template, static_slots)
+                                    for key, template in templates.items()}
+
+    @staticmethod
+    def _compile(template, static_slots):
+        # Unknown slots are written back as {name}; static values are escaped
+        # so the second format pass leaves them alone
+        class Slots(dict):
+            def __missing__(self, key):
+                return '{' + key + '}'
+        escaped = Slots({k: str(v).replace('{', '{{').replace('}', '}}') for k, v in static_slots.items()})
+        compiled = template.format_map(escaped)
+        has_slots = any(name for _, name, _, _ in string.Formatter().parse(compiled))
+        return compiled, has_slots
+
+    def locale_for(self, user):
+        code = (getattr(user, 'language_code', None) or '').split('-')[0]
+        return code if code in self.locales else self.default_locale
+
+    def render(self, key, locale=None, **slots):
+        templates = self.locales.get(locale) or self.locales[self.default_locale]
+        compiled, has_slots = templates.get(key) or self.locales[self.default_locale][key]
+        return compiled.format(**slots) if has_slots else compiled
+
+messages = MessageCatalog(MESSAGES, STATIC_SLOTS, DEFAULT_LOCALE)
+
+def text_for(message, key, **slots):
+    # Catalogue text in the sender's language (message or callback query)
+    return messages.render(key, messages.locale_for(message.from_user), **slots)
+
 # ======================
 # User Handlers
 # ======================
 
+def register_user(user_id, first_name, ref_code=None):
+    referral_code = generate_referral_code(user_id)
+    new_user = {
+        "id": user_id,
+        "first_name": first_name,
+        "balance": 0,
+        "referrals": 0,
+        "referral_code": referral_code,
+        "joined": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "blocked": False,
+        "completed_tasks": []
+    }
+    
+    if ref_code:
+        referrer = resolve_referral_code(ref_code)
+        if referrer:
+            uid = referrer[0]
+            with ledger.user_lock(uid):
+                old_referrals = get_user_data(uid)['referrals']
+                new_referrals = old_referrals + 1
+                update_user_data(uid, field='referrals', value=new_referrals)
+                balance = ledger.credit(uid, REWARD_PER_REFERRAL, 'referral_reward', ref=user_id)
+                
+                # Check for milestone bonuses
+                for milestone, bonus in MILESTONE_BONUSES.items():
+                    if new_referrals >= milestone and old_referrals < milestone:
+                        balance = ledger.credit(uid, bonus, 'milestone_bonus', ref=milestone)
+                        outbound.send_message(
+                            uid, messages.render('milestone_bonus', milestone=milestone, bonus=bonus, balance=balance))
+                        log_activity(
+                            f"User {uid} received milestone bonus ₹{bonus} for {milestone} referrals",
+                            action='milestone_bonus', user_id=uid, amount=bonus, milestone=milestone
+                        )
+            
+            log_activity(
+                f"User {user_id} joined via referral from {uid}",
+                action='referral_joined', user_id=user_id, referrer_id=uid
+            )
+    
+    update_user_data(user_id, new_user)
+    log_activity(f"New user registered: {user_id}", action='user_registered', user_id=user_id)
+    return new_user
+
 @bot.message_handler(commands=['start'])
 def handle_start(message):
     if is_user_blocked(message.from_user.id):
@@ -416,73 +4302,26 @@ def handle_start(message):
     user = get_user_data(user_id)
     
     if not user:
-        referral_code = generate_referral_code(user_id)
-        new_user = {
-            "id": user_id,
-            "first_name": first_name,
-            "balance": 0,
-            "referrals": 0,
-            "referral_code": referral_code,
-            "joined": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "blocked": False,
-            "completed_tasks": []
-        }
-        
-        if len(message.text.split()) > 1:
-            ref_code = message.text.split()[1]
-            for uid, data in USERS_DB.items():
-                if data.get('referral_code') == ref_code:
-                    old_referrals = data['referrals']
-                    data['referrals'] += 1
-                    data['balance'] += REWARD_PER_REFERRAL
-                    
-                    # Check for milestone bonuses
-                    new_referrals = data['referrals']
-                    for milestone, bonus in MILESTONE_BONUSES.items():
-                        if new_referrals >= milestone and old_referrals < milestone:
-                            data['balance'] += bonus
-                            bot.send_message(
-                                uid,
-                                f"🎉 बधाई हो! आपने {milestone} रेफरल पूरे किए!\n"
-                                f"🎁 मिलेस्टोन बोनस: ₹{bonus}\n"
-                                f"💰 कुल बैलेंस: ₹{data['balance']}"
-                            )
-                            log_activity(f"User {uid} received milestone bonus ₹{bonus} for {milestone} referrals")
-                    
-                    log_activity(f"User {user_id} joined via referral from {uid}")
-                    break
-        
-        update_user_data(user_id, new_user)
-        log_activity(f"New user registered: {user_id}")
+        parts = message.text.split()
+        register_user(user_id, first_name, parts[1] if len(parts) > 1 else None)
+    elif user.get('bot_blocked', False):
+        # User came back after blocking the bot; include them in broadcasts again
+        update_user_data(user_id, field='bot_blocked', value=False)
     
     # Check if user is admin to show admin panel
+    # Labels stay in DEFAULT_LOCALE, the language the router matches them in
+    rows = [
+        ['button_tasks', 'button_admin'] if is_admin(user_id) else ['button_tasks'],
+        ['button_balance', 'button_refer'],
+        ['button_withdraw', 'button_help']
+    ]
     markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-    if is_admin(user_id):
-        markup.add(types.KeyboardButton('🎯 नया कार्य'), types.KeyboardButton('🔧 Admin Panel'))
-        markup.add(types.KeyboardButton('💰 बैलेंस'), types.KeyboardButton('🔗 रेफर'))
-        markup.add(types.KeyboardButton('💸 निकासी'), types.KeyboardButton('❓ सहायता'))
-    else:
-        markup.add(types.KeyboardButton('🎯 नया कार्य'))
-        markup.add(types.KeyboardButton('💰 बैलेंस'), types.KeyboardButton('🔗 रेफर'))
-        markup.add(types.KeyboardButton('💸 निकासी'), types.KeyboardButton('❓ सहायता'))
-    
-    welcome_msg = (
-        f"🙏 नमस्ते {first_name}! TaskCompleteRewardsBot में आपका स्वागत है!\n\n"
-        "✅ सरल कार्य पूरे करके पैसे कमाएं\n"
-        "📸 प्रमाण सबमिट करके रिवॉर्ड पाएं\n"
-        "👥 दोस्तों को रेफर करके बोनस कैश पाएं\n"
-        "💸 कभी भी अपनी कमाई निकालें\n\n"
-        f"💰 न्यूनतम निकासी: ₹{MIN_WITHDRAWAL}\n"
-        f"🎁 रेफरल बोनस: ₹{REWARD_PER_REFERRAL} प्रति रेफरल\n\n"
-        "🏆 मिलेस्टोन बोनस:\n"
-        "• 5 रेफरल = ₹10\n"
-        "• 10 रेफरल = ₹25\n"
-        "• 25 रेफरल = ₹50\n"
-        "• 50 रेफरल = ₹100\n"
-        "• 100 रेफरल = ₹250"
-    )
+    for row in rows:
+        markup.add(*(types.KeyboardButton(messages.render(key)) for key in row))
     
-    bot.send_message(chat_id, welcome_msg, reply_markup=markup)
+    welcome_msg = text_for(message, 'welcome', first_name=first_name)
+    
+    outbound.send_message(chat_id, welcome_msg, reply_markup=markup)
 
 @bot.message_handler(commands=['balance'])
 def handle_balance(message):
@@ -493,16 +4332,16 @@ def handle_balance(message):
     user = get_user_data(user_id)
     
     if not user:
-        bot.reply_to(message, "❌ पहले /start कमांड के साथ बॉट शुरू करें")
+        outbound.reply_to(message, text_for(message, 'register_first'))
         return
     
-    bot.reply_to(
-        message,
-        f"💰 आपका वर्तमान बैलेंस: ₹{user['balance']}\n\n"
-        f"👥 रेफरल: {user['referrals']} (₹{user['referrals'] * REWARD_PER_REFERRAL})\n"
-        f"💵 न्यूनतम निकासी: ₹{MIN_WITHDRAWAL}\n"
-        f"📊 पूरे किए गए कार्य: {len(user.get('completed_tasks', []))}"
-    )
+    outbound.reply_to(message, text_for(
+        message, 'balance',
+        balance=user['balance'],
+        referrals=user['referrals'],
+        referral_earnings=user['referrals'] * REWARD_PER_REFERRAL,
+        completed_tasks=len(user.get('completed_tasks', []))
+    ))
 
 @bot.message_handler(commands=['refer'])
 def handle_refer(message):
@@ -513,31 +4352,18 @@ def handle_refer(message):
     user = get_user_data(user_id)
     
     if not user:
-        bot.reply_to(message, "❌ पहले /start कमांड के साथ बॉट शुरू करें")
+        outbound.reply_to(message, text_for(message, 'register_first'))
         return
     
-    # Get bot username dynamically
-    try:
-        bot_info = bot.get_me()
-        bot_username = bot_info.username
-    except:
-        bot_username = "TaskCompleteRewardsBot"  # Fallback
-    
-    referral_msg = (
-        f"🔗 अपने दोस्तों को रेफर करें और प्रत्येक के लिए ₹{REWARD_PER_REFERRAL} कमाएं!\n\n"
-        f"📱 आपका रेफरल लिंक:\n"
-        f"https://t.me/{bot_username}?start={user['referral_code']}\n\n"
-        f"👥 कुल रेफरल: {user['referrals']}\n"
-        f"💰 रेफरल से कमाई: ₹{user['referrals'] * REWARD_PER_REFERRAL}\n\n"
-        f"🏆 मिलेस्टोन बोनस:\n"
-        f"• 5 रेफरल = ₹10 बोनस\n"
-        f"• 10 रेफरल = ₹25 बोनस\n"
-        f"• 25 रेफरल = ₹50 बोनस\n"
-        f"• 50 रेफरल = ₹100 बोनस\n"
-        f"• 100 रेफरल = ₹250 बोनस"
+    referral_msg = text_for(
+        message, 'referral',
+        bot_username=bot_identity.username,
+        referral_code=user['referral_code'],
+        referrals=user['referrals'],
+        referral_earnings=user['referrals'] * REWARD_PER_REFERRAL
     )
     
-    bot.reply_to(message, referral_msg)
+    outbound.reply_to(message, referral_msg)
 
 @bot.message_handler(commands=['withdrawal'])
 def handle_withdrawal(message):
@@ -548,24 +4374,17 @@ def handle_withdrawal(message):
     user = get_user_data(user_id)
     
     if not user:
-        bot.reply_to(message, "❌ पहले /start कमांड के साथ बॉट शुरू करें")
+        outbound.reply_to(message, text_for(message, 'register_first'))
         return
     
     if user['balance'] < MIN_WITHDRAWAL:
-        bot.reply_to(
-            message,
-            f"❌ न्यूनतम निकासी राशि ₹{MIN_WITHDRAWAL} है\n"
-            f"आपका वर्तमान बैलेंस: ₹{user['balance']}"
-        )
+        outbound.reply_to(message, text_for(message, 'withdrawal_below_minimum', balance=user['balance']))
         return
     
-    msg = bot.reply_to(
-        message,
-        f"💸 निकासी राशि: ₹{user['balance']}\n\n"
-        "कृपया अपना UPI ID भेजें (जैसे: 9876543210@paytm):"
-    )
-    bot.register_next_step_handler(msg, process_upi_id)
+    outbound.reply_to(message, text_for(message, 'withdrawal_ask_upi', balance=user['balance']))
+    conversations.begin(message.chat.id, 'withdrawal_upi')
 
+@conversations.step('withdrawal_upi')
 def process_upi_id(message):
     user_id = message.from_user.id
     if is_user_blocked(user_id):
@@ -575,93 +4394,57 @@ def process_upi_id(message):
     
     # Basic UPI ID validation
     if '@' not in upi_id or len(upi_id) < 5:
-        bot.reply_to(message, "❌ कृपया सही UPI ID भेजें (जैसे: 9876543210@paytm)")
+        outbound.reply_to(message, text_for(message, 'withdrawal_invalid_upi'))
+        return
+    
+    requested_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    
+    # Move the whole balance out atomically; a concurrent request gets 0
+    amount = ledger.debit_all(user_id, 'withdrawal', minimum=MIN_WITHDRAWAL, ref=requested_at)
+    if not amount:
+        outbound.reply_to(message, text_for(message, 'withdrawal_minimum'))
         return
     
-    user = get_user_data(user_id)
     withdrawal_data = {
         'user_id': str(user_id),
-        'amount': user['balance'],
+        'amount': amount,
         'upi_id': upi_id,
         'status': 'pending',
-        'requested_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        'requested_at': requested_at
     }
     
     # Save withdrawal request
-    WITHDRAWALS_DB.append(withdrawal_data)
+    record_withdrawal(withdrawal_data)
     
-    # Reset user balance to 0
-    update_user_data(user_id, field='balance', value=0)
-    
-    bot.reply_to(
-        message,
-        f"✅ निकासी अनुरोध सबमिट हो गया!\n\n"
-        f"💰 राशि: ₹{withdrawal_data['amount']}\n"
-        f"💳 UPI ID: {upi_id}\n\n"
-        "Admin 24 घंटे के अंदर आपका पेमेंट प्रोसेस करेगा।"
+    outbound.reply_to(message, text_for(message, 'withdrawal_requested', amount=withdrawal_data['amount'], upi_id=upi_id))
+    log_activity(
+        f"User {user_id} requested ₹{withdrawal_data['amount']} withdrawal to UPI {upi_id}",
+        action='withdrawal_requested', user_id=user_id, amount=withdrawal_data['amount'], upi=upi_id
     )
-    log_activity(f"User {user_id} requested ₹{withdrawal_data['amount']} withdrawal to UPI {upi_id}")
 
 @bot.message_handler(commands=['help'])
 def handle_help(message):
     if is_user_blocked(message.from_user.id):
         return
     
-    help_text = (
-        "❓ TaskCompleteRewardsBot सहायता\n\n"
-        "📋 उपलब्ध कमांड:\n"
-        "/start - बॉट शुरू करें और रजिस्टर करें\n"
-        "/balance - अपनी कमाई देखें\n"
-        "/refer - अपना रेफरल लिंक पाएं\n"
-        "/withdrawal - पैसे निकालने का अनुरोध करें\n"
-        "/help - यह सहायता संदेश दिखाएं\n\n"
-        "📌 यह कैसे काम करता है:\n"
-        "1. 🎯 नया कार्य से उपलब्ध कार्य देखें\n"
-        "2. कोई कार्य पूरा करें\n"
-        "3. प्रमाण (स्क्रीनशॉट) सबमिट करें\n"
-        "4. अप्रूवल के बाद रिवॉर्ड पाएं\n"
-        "5. अपनी कमाई निकालें\n\n"
-        "🎁 कार्य प्रकार:\n"
-        "• YouTube Subscribe - ₹2-5\n"
-        "• Instagram Follow - ₹2-5\n"
-        "• Telegram Join - ₹2-5\n"
-        "• Facebook Like - ₹2-5\n"
-        "• WhatsApp Join - ₹2-5\n\n"
-        "👥 दोस्तों को रेफर करके अतिरिक्त पैसे कमाएं!\n"
-        f"💰 न्यूनतम निकासी: ₹{MIN_WITHDRAWAL}\n"
-        f"🔗 रेफरल बोनस: ₹{REWARD_PER_REFERRAL} प्रति रेफरल"
-    )
-    bot.reply_to(message, help_text)
+    help_text = text_for(message, 'help')
+    outbound.reply_to(message, help_text)
 
-@bot.message_handler(func=lambda message: message.text == '🎯 नया कार्य')
+@router.button(messages.render('button_tasks'))
 def show_available_tasks(message):
     if is_user_blocked(message.from_user.id):
         return
     
-    user_id = message.from_user.id
-    tasks = get_tasks()
+    # Pre-serialized by the task registry; rebuilt only when tasks change
+    keyboard = task_registry.keyboard()
     
-    if not tasks:
-        bot.reply_to(message, "❌ फिलहाल कोई कार्य उपलब्ध नहीं है। बाद में जांचें!")
+    if not keyboard:
+        outbound.reply_to(message, text_for(message, 'no_tasks'))
         return
     
-    markup = types.InlineKeyboardMarkup()
-    for task in tasks:
-        if task.get('active', True):
-            task_type_hindi = TASK_TYPES.get(task.get('type', 'general'), task.get('type', 'सामान्य'))
-            markup.add(types.InlineKeyboardButton(
-                text=f"{task_type_hindi}: {task['title']} (₹{task['reward']})",
-                callback_data=f"task_{task['id']}"
-            ))
-    
-    bot.reply_to(
-        message,
-        "🎯 उपलब्ध कार्य\n\n"
-        "विवरण देखने और कार्य पूरा करने के लिए किसी कार्य पर क्लिक करें:",
-        reply_markup=markup
-    )
+    outbound.reply_to(message, text_for(message, 'task_list'), reply_markup=keyboard)
 
-@bot.message_handler(func=lambda message: message.text == '💰 बैलेंस')
+@router.button(messages.render('button_balance'))
 def handle_balance_button(message):
     if is_user_blocked(message.from_user.id):
         return
@@ -670,18 +4453,18 @@ def handle_balance_button(message):
     user = get_user_data(user_id)
     
     if not user:
-        bot.reply_to(message, "❌ पहले /start कमांड के साथ बॉट शुरू करें")
+        outbound.reply_to(message, text_for(message, 'register_first'))
         return
     
-    bot.reply_to(
-        message,
-        f"💰 आपका वर्तमान बैलेंस: ₹{user['balance']}\n\n"
-        f"👥 रेफरल: {user['referrals']} (₹{user['referrals'] * REWARD_PER_REFERRAL})\n"
-        f"💵 न्यूनतम निकासी: ₹{MIN_WITHDRAWAL}\n"
-        f"📊 पूरे किए गए कार्य: {len(user.get('completed_tasks', []))}"
-    )
+    outbound.reply_to(message, text_for(
+        message, 'balance',
+        balance=user['balance'],
+        referrals=user['referrals'],
+        referral_earnings=user['referrals'] * REWARD_PER_REFERRAL,
+        completed_tasks=len(user.get('completed_tasks', []))
+    ))
 
-@bot.message_handler(func=lambda message: message.text == '🔗 रेफर')
+@router.button(messages.render('button_refer'))
 def handle_refer_button(message):
     if is_user_blocked(message.from_user.id):
         return
@@ -690,33 +4473,20 @@ def handle_refer_button(message):
     user = get_user_data(user_id)
     
     if not user:
-        bot.reply_to(message, "❌ पहले /start कमांड के साथ बॉट शुरू करें")
+        outbound.reply_to(message, text_for(message, 'register_first'))
         return
     
-    # Get bot username dynamically
-    try:
-        bot_info = bot.get_me()
-        bot_username = bot_info.username
-    except:
-        bot_username = "TaskCompleteRewardsBot"  # Fallback
-    
-    referral_msg = (
-        f"🔗 अपने दोस्तों को रेफर करें और प्रत्येक के लिए ₹{REWARD_PER_REFERRAL} कमाएं!\n\n"
-        f"📱 आपका रेफरल लिंक:\n"
-        f"https://t.me/{bot_username}?start={user['referral_code']}\n\n"
-        f"👥 कुल रेफरल: {user['referrals']}\n"
-        f"💰 रेफरल से कमाई: ₹{user['referrals'] * REWARD_PER_REFERRAL}\n\n"
-        f"🏆 मिलेस्टोन बोनस:\n"
-        f"• 5 रेफरल = ₹10 बोनस\n"
-        f"• 10 रेफरल = ₹25 बोनस\n"
-        f"• 25 रेफरल = ₹50 बोनस\n"
-        f"• 50 रेफरल = ₹100 बोनस\n"
-        f"• 100 रेफरल = ₹250 बोनस"
+    referral_msg = text_for(
+        message, 'referral',
+        bot_username=bot_identity.username,
+        referral_code=user['referral_code'],
+        referrals=user['referrals'],
+        referral_earnings=user['referrals'] * REWARD_PER_REFERRAL
     )
     
-    bot.reply_to(message, referral_msg)
+    outbound.reply_to(message, referral_msg)
 
-@bot.message_handler(func=lambda message: message.text == '💸 निकासी')
+@router.button(messages.render('button_withdraw'))
 def handle_withdraw_button(message):
     if is_user_blocked(message.from_user.id):
         return
@@ -725,61 +4495,29 @@ def handle_withdraw_button(message):
     user = get_user_data(user_id)
     
     if not user:
-        bot.reply_to(message, "❌ पहले /start कमांड के साथ बॉट शुरू करें")
+        outbound.reply_to(message, text_for(message, 'register_first'))
         return
     
     if user['balance'] < MIN_WITHDRAWAL:
-        bot.reply_to(
-            message,
-            f"❌ न्यूनतम निकासी राशि ₹{MIN_WITHDRAWAL} है\n"
-            f"आपका वर्तमान बैलेंस: ₹{user['balance']}"
-        )
+        outbound.reply_to(message, text_for(message, 'withdrawal_below_minimum', balance=user['balance']))
         return
     
-    msg = bot.reply_to(
-        message,
-        f"💸 निकासी राशि: ₹{user['balance']}\n\n"
-        "कृपया अपना UPI ID भेजें (जैसे: 9876543210@paytm):"
-    )
-    bot.register_next_step_handler(msg, process_upi_id)
+    outbound.reply_to(message, text_for(message, 'withdrawal_ask_upi', balance=user['balance']))
+    conversations.begin(message.chat.id, 'withdrawal_upi')
 
-@bot.message_handler(func=lambda message: message.text == '❓ सहायता')
+@router.button(messages.render('button_help'))
 def handle_help_button(message):
     if is_user_blocked(message.from_user.id):
         return
     
-    help_text = (
-        "❓ TaskCompleteRewardsBot सहायता\n\n"
-        "📋 उपलब्ध बटन:\n"
-        "🎯 नया कार्य - कार्य ब्राउज़ करें और पूरा करें\n"
-        "💰 बैलेंस - अपनी कमाई देखें\n"
-        "🔗 रेफर - अपना रेफरल लिंक पाएं\n"
-        "💸 निकासी - पैसे निकालने का अनुरोध करें\n"
-        "❓ सहायता - यह सहायता संदेश दिखाएं\n\n"
-        "📌 यह कैसे काम करता है:\n"
-        "1. 🎯 नया कार्य से उपलब्ध कार्य देखें\n"
-        "2. कोई कार्य पूरा करें\n"
-        "3. प्रमाण (स्क्रीनशॉट) सबमिट करें\n"
-        "4. अप्रूवल के बाद रिवॉर्ड पाएं\n"
-        "5. अपनी कमाई निकालें\n\n"
-        "🎁 कार्य प्रकार:\n"
-        "• YouTube Subscribe - ₹2-5\n"
-        "• Instagram Follow - ₹2-5\n"
-        "• Telegram Join - ₹2-5\n"
-        "• Facebook Like - ₹2-5\n"
-        "• WhatsApp Join - ₹2-5\n\n"
-        "👥 दोस्तों को रेफर करके अतिरिक्त पैसे कमाएं!\n"
-        f"💰 न्यूनतम निकासी: ₹{MIN_WITHDRAWAL}\n"
-        f"🔗 रेफरल बोनस: ₹{REWARD_PER_REFERRAL} प्रति रेफरल\n\n"
-        "📞 सहायता के लिए Admin से संपर्क करें"
-    )
-    bot.reply_to(message, help_text)
+    help_text = text_for(message, 'help_buttons')
+    outbound.reply_to(message, help_text)
 
 # Admin Panel Handler
-@bot.message_handler(func=lambda message: message.text == '🔧 Admin Panel')
+@router.button(messages.render('button_admin'))
 def handle_admin_panel(message):
     if not is_admin(message.from_user.id):
-        bot.reply_to(message, "❌ आपको Admin Panel का Access नहीं है।")
+        outbound.reply_to(message, text_for(message, 'admin_panel_denied'))
         return
     
     markup = types.InlineKeyboardMarkup(row_width=2)
@@ -800,7 +4538,7 @@ def handle_admin_panel(message):
         types.InlineKeyboardButton("📝 Logs", callback_data="admin_logs")
     )
     
-    bot.send_message(
+    outbound.send_message(
         message.chat.id,
         "🔧 Admin Panel\n\nSelect an option:",
         reply_markup=markup
@@ -809,16 +4547,62 @@ def handle_admin_panel(message):
 @bot.message_handler(commands=['admin'])
 def handle_admin_command(message):
     if not is_admin(message.from_user.id):
-        bot.reply_to(message, "❌ You don't have admin access.")
+        outbound.reply_to(message, text_for(message, 'admin_panel_denied'))
         return
     
     handle_admin_panel(message)
 
+# Admin screens that summarise the whole dataset; kept apart from the
+# callback handler so benchmarks/bench_data.py can time them
+def admin_users_text():
+    totals = storage.user_totals()
+    total_users = totals['users']
+    active_users = total_users - totals['blocked']
+    
+    user_text = f"👥 User Management\n\n"
+    user_text += f"📊 Total Users: {total_users}\n"
+    user_text += f"✅ Active Users: {active_users}\n"
+    user_text += f"❌ Blocked Users: {total_users - active_users}\n\n"
+    
+    # Show top 5 users by balance
+    top_users = storage.top_users_by_balance(5)
+    user_text += "💰 Top Earners:\n"
+    for i, (uid, data) in enumerate(top_users, 1):
+        user_text += f"{i}. {data.get('first_name', 'Unknown')} - ₹{data.get('balance', 0)}\n"
+    return user_text
+
+def admin_stats_text():
+    totals = storage.user_totals()
+    total_users = totals['users']
+    total_tasks = len(get_tasks())
+    active_tasks = len(get_active_tasks())
+    pending_withdrawals = count_withdrawals('pending')
+    approved_withdrawals = count_withdrawals('approved')
+    total_balance = ledger.total_balance
+    total_referrals = totals['referrals']
+    
+    # Count completed tasks
+    completed_tasks = count_submissions('approved')
+    
+    stats_text = (
+        f"📊 Bot Statistics\n\n"
+        f"👥 Total Users: {total_users}\n"
+        f"📋 Total Tasks: {total_tasks}\n"
+        f"✅ Active Tasks: {active_tasks}\n"
+        f"🎯 Completed Tasks: {completed_tasks}\n"
+        f"💰 Total Balance: ₹{total_balance}\n"
+        f"🔗 Total Referrals: {total_referrals}\n"
+        f"💸 Pending Withdrawals: {pending_withdrawals}\n"
+        f"✅ Approved Withdrawals: {approved_withdrawals}\n\n"
+        f"📈 Revenue: ₹{completed_tasks * 3} (avg)\n"
+        f"📊 User Growth: {total_users} users"
+    )
+    return stats_text
+
 # Admin Callback Handlers
-@bot.callback_query_handler(func=lambda call: call.data.startswith('admin_'))
+@router.callback('admin_', defer=True)
 def handle_admin_callbacks(call):
     if not is_admin(call.from_user.id):
-        bot.answer_callback_query(call.id, "❌ Admin access required")
         return
     
     action = call.data.split('_')[1]
@@ -836,7 +4620,7 @@ def handle_admin_callbacks(call):
         )
         markup.add(types.InlineKeyboardButton("🔙 Back", callback_data="admin_back"))
         
-        bot.edit_message_text(
+        outbound.edit_message_text(
             "📋 Task Management\n\nSelect an option:",
             call.message.chat.id,
             call.message.message_id,
@@ -845,19 +4629,7 @@ def handle_admin_callbacks(call):
     
     elif action == 'users':
         # View Users with pagination
-        total_users = len(USERS_DB)
-        active_users = len([u for u in USERS_DB.values() if not u.get('blocked', False)])
-        
-        user_text = f"👥 User Management\n\n"
-        user_text += f"📊 Total Users: {total_users}\n"
-        user_text += f"✅ Active Users: {active_users}\n"
-        user_text += f"❌ Blocked Users: {total_users - active_users}\n\n"
-        
-        # Show top 5 users by balance
-        sorted_users = sorted(USERS_DB.items(), key=lambda x: x[1].get('balance', 0), reverse=True)
-        user_text += "💰 Top Earners:\n"
-        for i, (uid, data) in enumerate(sorted_users[:5], 1):
-            user_text += f"{i}. {data.get('first_name', 'Unknown')} - ₹{data.get('balance', 0)}\n"
+        user_text = admin_users_text()
         
         markup = types.InlineKeyboardMarkup(row_width=2)
         markup.add(
@@ -866,7 +4638,7 @@ def handle_admin_callbacks(call):
         )
         markup.add(types.InlineKeyboardButton("🔙 Back", callback_data="admin_back"))
         
-        bot.edit_message_text(
+        outbound.edit_message_text(
             user_text,
             call.message.chat.id,
             call.message.message_id,
@@ -878,7 +4650,7 @@ def handle_admin_callbacks(call):
         pending_withdrawals = get_pending_withdrawals()
         
         if not pending_withdrawals:
-            bot.edit_message_text(
+            outbound.edit_message_text(
                 "💳 Withdrawal Management\n\n✅ No pending withdrawals",
                 call.message.chat.id,
                 call.message.message_id
@@ -902,16 +4674,16 @@ def handle_admin_callbacks(call):
                 markup.add(
                     types.InlineKeyboardButton(
                         f"✅ Approve #{i+1}", 
-                        callback_data=f"approve_wd_{wd['user_id']}_{wd['requested_at']}"
+                        callback_data=callback_data('approve_wd_', user_id=wd['user_id'], requested_at=wd['requested_at'])
                     ),
                     types.InlineKeyboardButton(
                         f"❌ Reject #{i+1}", 
-                        callback_data=f"reject_wd_{wd['user_id']}_{wd['requested_at']}"
+                        callback_data=callback_data('reject_wd_', user_id=wd['user_id'], requested_at=wd['requested_at'])
                     )
                 )
             markup.add(types.InlineKeyboardButton("🔙 Back", callback_data="admin_back"))
             
-            bot.edit_message_text(
+            outbound.edit_message_text(
                 wd_text,
                 call.message.chat.id,
                 call.message.message_id,
@@ -920,22 +4692,22 @@ def handle_admin_callbacks(call):
     
     elif action == 'screenshots':
         # View pending screenshots
-        pending_submissions = get_pending_submissions()
+        pending_count = count_submissions('pending')
+        pending_submissions = get_pending_submissions(limit=5)
         
         if not pending_submissions:
-            bot.edit_message_text(
+            outbound.edit_message_text(
                 "📸 Screenshot Verification\n\n✅ No pending submissions",
                 call.message.chat.id,
                 call.message.message_id
             )
         else:
-            sub_text = f"📸 Pending Screenshots ({len(pending_submissions)}):\n\n"
-            for i, sub in enumerate(pending_submissions[:5], 1):
+            sub_text = f"📸 Pending Screenshots ({pending_count}):\n\n"
+            for i, sub in enumerate(pending_submissions, 1):
                 try:
                     user = get_user_data(sub['user_id'])
                     user_name = user['first_name'] if user else 'Unknown'
-                    tasks = get_tasks()
-                    task = next((t for t in tasks if t['id'] == sub['task_id']), {'title': 'Unknown Task'})
+                    task = get_task(sub['task_id']) or {'title': 'Unknown Task'}
                 except:
                     user_name = 'Unknown'
                     task = {'title': 'Unknown Task'}
@@ -948,7 +4720,7 @@ def handle_admin_callbacks(call):
             markup.add(types.InlineKeyboardButton("📸 View Submissions", callback_data="admin_view_submissions"))
             markup.add(types.InlineKeyboardButton("🔙 Back", callback_data="admin_back"))
             
-            bot.edit_message_text(
+            outbound.edit_message_text(
                 sub_text,
                 call.message.chat.id,
                 call.message.message_id,
@@ -957,37 +4729,12 @@ def handle_admin_callbacks(call):
     
     elif action == 'stats':
         # Show comprehensive statistics
-        total_users = len(USERS_DB)
-        total_tasks = len(TASKS_DB)
-        active_tasks = len([t for t in TASKS_DB if t.get('active', True)])
-        pending_withdrawals = len(get_pending_withdrawals())
-        approved_withdrawals = len([w for w in WITHDRAWALS_DB if w['status'] == 'approved'])
-        total_balance = sum(user.get('balance', 0) for user in USERS_DB.values())
-        total_referrals = sum(user.get('referrals', 0) for user in USERS_DB.values())
-        
-        # Count completed tasks
-        completed_tasks = 0
-        for user_subs in SUBMISSIONS_DB.values():
-            completed_tasks += len([s for s in user_subs if s['status'] == 'approved'])
-        
-        stats_text = (
-            f"📊 Bot Statistics\n\n"
-            f"👥 Total Users: {total_users}\n"
-            f"📋 Total Tasks: {total_tasks}\n"
-            f"✅ Active Tasks: {active_tasks}\n"
-            f"🎯 Completed Tasks: {completed_tasks}\n"
-            f"💰 Total Balance: ₹{total_balance}\n"
-            f"🔗 Total Referrals: {total_referrals}\n"
-            f"💸 Pending Withdrawals: {pending_withdrawals}\n"
-            f"✅ Approved Withdrawals: {approved_withdrawals}\n\n"
-            f"📈 Revenue: ₹{completed_tasks * 3} (avg)\n"
-            f"📊 User Growth: {total_users} users"
-        )
+        stats_text = admin_stats_text()
         
         markup = types.InlineKeyboardMarkup()
         markup.add(types.InlineKeyboardButton("🔙 Back", callback_data="admin_back"))
         
-        bot.edit_message_text(
+        outbound.edit_message_text(
             stats_text,
             call.message.chat.id,
             call.message.message_id,
@@ -996,13 +4743,11 @@ def handle_admin_callbacks(call):
     
     elif action == 'broadcast':
         # Broadcast message
-        msg = bot.send_message(
+        outbound.send_message(
             call.from_user.id,
             "📢 Enter broadcast message:"
         )
-        bot.register_next_step_handler(msg, process_broadcast_message)
-        bot.answer_callback_query(call.id)
-        return
+        conversations.begin(call.from_user.id, 'broadcast_text')
     
     elif action == 'settings':
         # Bot settings
@@ -1020,7 +4765,7 @@ def handle_admin_callbacks(call):
         markup = types.InlineKeyboardMarkup()
         markup.add(types.InlineKeyboardButton("🔙 Back", callback_data="admin_back"))
         
-        bot.edit_message_text(
+        outbound.edit_message_text(
             settings_text,
             call.message.chat.id,
             call.message.message_id,
@@ -1029,16 +4774,17 @@ def handle_admin_callbacks(call):
     
     elif action == 'logs':
         # Show activity logs
-        logs = ACTIVITY_LOGS[-10:] if len(ACTIVITY_LOGS) > 10 else ACTIVITY_LOGS
+        logs = list(islice(reversed(ACTIVITY_LOGS), 10))[::-1]
         
         log_text = "📝 Activity Logs (Last 10):\n\n"
         for log in logs:
             log_text += f"• [{log['timestamp']}] {log['message']}\n"
+        log_text += "\n🔎 Search history: /logs <user_id | upi | action>"
         
         markup = types.InlineKeyboardMarkup()
         markup.add(types.InlineKeyboardButton("🔙 Back", callback_data="admin_back"))
         
-        bot.edit_message_text(
+        outbound.edit_message_text(
             log_text,
             call.message.chat.id,
             call.message.message_id,
@@ -1048,8 +4794,6 @@ def handle_admin_callbacks(call):
     elif action == 'back':
         # Back to main admin panel
         handle_admin_panel_callback(call)
-    
-    bot.answer_callback_query(call.id)
 
 def handle_admin_panel_callback(call):
     markup = types.InlineKeyboardMarkup(row_width=2)
@@ -1070,7 +4814,7 @@ def handle_admin_panel_callback(call):
         types.InlineKeyboardButton("📝 Logs", callback_data="admin_logs")
     )
     
-    bot.edit_message_text(
+    outbound.edit_message_text(
         "🔧 Admin Panel\n\nSelect an option:",
         call.message.chat.id,
         call.message.message_id,
@@ -1078,12 +4822,12 @@ def handle_admin_panel_callback(call):
     )
 
 # Additional Admin Callbacks for Task Management
-@bot.callback_query_handler(func=lambda call: call.data.startswith('admin_add_task'))
+@router.callback('admin_add_task')
 def handle_add_task_callback(call):
     if not is_admin(call.from_user.id):
         return
     
-    msg = bot.send_message(
+    outbound.send_message(
         call.from_user.id,
         "📝 Add New Task\n\nPlease enter task details in this format:\n\n"
         "Title|Description|Link|Reward|Task Type\n\n"
@@ -1091,9 +4835,10 @@ def handle_add_task_callback(call):
         "Example:\n"
         "Subscribe to Channel|Subscribe to our YouTube channel|https://youtube.com/channel|5|youtube_subscribe"
     )
-    bot.register_next_step_handler(msg, process_new_task)
-    bot.answer_callback_query(call.id)
+    conversations.begin(call.from_user.id, 'new_task')
+    outbound.answer_callback_query(call.id)
 
+@conversations.step('new_task')
 def process_new_task(message):
     if not is_admin(message.from_user.id):
         return
@@ -1101,18 +4846,18 @@ def process_new_task(message):
     try:
         parts = message.text.split('|')
         if len(parts) != 5:
-            bot.reply_to(message, "❌ Invalid format. Please use: Title|Description|Link|Reward|Task Type")
+            outbound.reply_to(message, "❌ Invalid format. Please use: Title|Description|Link|Reward|Task Type")
             return
         
         title, description, link, reward, task_type = parts
         reward = int(reward)
         
         if task_type not in TASK_TYPES:
-            bot.reply_to(message, f"❌ Invalid task type. Use: {', '.join(TASK_TYPES.keys())}")
+            outbound.reply_to(message, f"❌ Invalid task type. Use: {', '.join(TASK_TYPES.keys())}")
             return
         
         # Generate task ID
-        task_id = f"task_{len(TASKS_DB) + 1}_{int(time.time())}"
+        task_id = f"task_{len(get_tasks()) + 1}_{int(time.time())}"
         
         new_task = {
             'id': task_id,
@@ -1131,7 +4876,7 @@ def process_new_task(message):
         
         task_type_hindi = TASK_TYPES[task_type]
         
-        bot.reply_to(
+        outbound.reply_to(
             message,
             f"✅ Task added successfully!\n\n"
             f"📋 Title: {title}\n"
@@ -1140,77 +4885,90 @@ def process_new_task(message):
             f"🆔 Task ID: {task_id}"
         )
         
-        log_activity(f"Admin {message.from_user.id} added new task: {title}")
+        log_activity(
+            f"Admin {message.from_user.id} added new task: {title}",
+            action='task_added', admin_id=message.from_user.id, task_id=task_id, amount=reward
+        )
         
     except ValueError:
-        bot.reply_to(message, "❌ Reward must be a number")
+        outbound.reply_to(message, "❌ Reward must be a number")
     except Exception as e:
-        bot.reply_to(message, f"❌ Error adding task: {str(e)}")
+        outbound.reply_to(message, f"❌ Error adding task: {str(e)}")
 
 # Withdrawal approval handlers
-@bot.callback_query_handler(func=lambda call: call.data.startswith('approve_wd_'))
+@router.callback('approve_wd_')
 def handle_withdrawal_approval(call):
     if not is_admin(call.from_user.id):
         return
     
+    record = resolve_callback(call, 'approve_wd_')
+    if record is None:
+        return
+    user_id, requested_at = record['user_id'], record['requested_at']
+    
     try:
-        _, _, user_id, requested_at = call.data.split('_', 3)
-        
         # Update withdrawal status
-        for wd in WITHDRAWALS_DB:
-            if wd['user_id'] == user_id and wd['requested_at'] == requested_at:
-                wd['status'] = 'approved'
-                wd['approved_at'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                wd['approved_by'] = call.from_user.id
-                break
+        wd = update_withdrawal(
+            user_id,
+            requested_at,
+            from_status='pending',
+            status='approved',
+            approved_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            approved_by=call.from_user.id
+        )
+        if not wd:
+            outbound.answer_callback_query(call.id, "⚠️ Withdrawal already processed")
+            return
+        ledger.transfer('payable:withdrawal', 'paid:upi', wd['amount'], 'withdrawal_paid', ref=user_id)
         
         # Notify user
         try:
             user = get_user_data(user_id)
-            bot.send_message(
-                user_id,
-                f"✅ आपका निकासी अनुरोध स्वीकृत हो गया!\n\n"
-                f"💰 राशि: ₹{wd['amount']}\n"
-                f"💳 UPI ID: {wd.get('upi_id', 'N/A')}\n\n"
-                "पेमेंट 24 घंटे के अंदर आपके अकाउंट में ट्रांसफर हो जाएगा।"
-            )
+            outbound.send_message(
+                user_id, messages.render('withdrawal_approved', amount=wd['amount'], upi_id=wd.get('upi_id', 'N/A')))
         except:
             pass
         
-        bot.answer_callback_query(call.id, "✅ Withdrawal approved!")
-        log_activity(f"Admin {call.from_user.id} approved withdrawal for user {user_id}")
+        outbound.answer_callback_query(call.id, "✅ Withdrawal approved!")
+        log_activity(
+            f"Admin {call.from_user.id} approved withdrawal for user {user_id}",
+            action='withdrawal_approved', admin_id=call.from_user.id, user_id=user_id,
+            amount=wd['amount'], upi=wd.get('upi_id')
+        )
         
         # Refresh the withdrawal list
-        bot.edit_message_text(
+        outbound.edit_message_text(
             f"✅ Withdrawal approved for user {user_id}",
             call.message.chat.id,
             call.message.message_id
         )
         
     except Exception as e:
-        bot.answer_callback_query(call.id, f"❌ Error: {str(e)}")
+        outbound.answer_callback_query(call.id, f"❌ Error: {str(e)}")
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith('reject_wd_'))
+@router.callback('reject_wd_')
 def handle_withdrawal_rejection(call):
     if not is_admin(call.from_user.id):
         return
     
+    record = resolve_callback(call, 'reject_wd_')
+    if record is None:
+        return
+    user_id, requested_at = record['user_id'], record['requested_at']
+    
     try:
-        _, _, user_id, requested_at = call.data.split('_', 3)
-        
-        msg = bot.send_message(
+        outbound.send_message(
             call.from_user.id,
             "📝 Enter rejection reason:"
         )
-        bot.register_next_step_handler(
-            msg, 
-            lambda m: process_withdrawal_rejection(m, user_id, requested_at)
-        )
-        bot.answer_callback_query(call.id)
+        conversations.begin(
+            call.from_user.id, 'withdrawal_rejection', user_id=user_id, requested_at=requested_at)
+        outbound.answer_callback_query(call.id)
         
     except Exception as e:
-        bot.answer_callback_query(call.id, f"❌ Error: {str(e)}")
+        outbound.answer_callback_query(call.id, f"❌ Error: {str(e)}")
 
+@conversations.step('withdrawal_rejection')
 def process_withdrawal_rejection(message, user_id, requested_at):
     if not is_admin(message.from_user.id):
         return
@@ -1218,101 +4976,100 @@ def process_withdrawal_rejection(message, user_id, requested_at):
     reason = message.text
     
     # Update withdrawal status and restore user balance
-    for wd in WITHDRAWALS_DB:
-        if wd['user_id'] == user_id and wd['requested_at'] == requested_at:
-            wd['status'] = 'rejected'
-            wd['rejected_at'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            wd['rejected_by'] = message.from_user.id
-            wd['rejection_reason'] = reason
-            
-            # Restore user balance
-            user = get_user_data(user_id)
-            if user:
-                update_user_data(user_id, field='balance', value=user['balance'] + wd['amount'])
-            
-            break
+    wd = update_withdrawal(
+        user_id,
+        requested_at,
+        from_status='pending',
+        status='rejected',
+        rejected_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        rejected_by=message.from_user.id,
+        rejection_reason=reason
+    )
+    if not wd:
+        outbound.reply_to(message, f"⚠️ Withdrawal for user {user_id} was already processed.")
+        return
+    
+    # Restore user balance
+    ledger.credit(user_id, wd['amount'], 'withdrawal_refund', source='payable:withdrawal', ref=requested_at)
     
     # Notify user
     try:
-        bot.send_message(
-            user_id,
-            f"❌ आपका निकासी अनुरोध रद्द कर दिया गया।\n\n"
-            f"📝 कारण: {reason}\n\n"
-            f"💰 राशि ₹{wd['amount']} आपके बैलेंस में वापस कर दी गई है।"
-        )
+        outbound.send_message(user_id, messages.render('withdrawal_rejected', reason=reason, amount=wd['amount']))
     except:
         pass
     
-    bot.reply_to(
+    outbound.reply_to(
         message,
         f"✅ Withdrawal rejected for user {user_id}. Balance restored."
     )
-    log_activity(f"Admin {message.from_user.id} rejected withdrawal for user {user_id}: {reason}")
+    log_activity(
+        f"Admin {message.from_user.id} rejected withdrawal for user {user_id}: {reason}",
+        action='withdrawal_rejected', admin_id=message.from_user.id, user_id=user_id,
+        amount=wd['amount'], upi=wd.get('upi_id'), reason=reason
+    )
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith('task_'))
+@router.callback('task_')
 def handle_task_selection(call):
     user_id = call.from_user.id
     if is_user_blocked(user_id):
         return
     
-    task_id = call.data.split('_')[1]
-    tasks = get_tasks()
-    task = next((t for t in tasks if t['id'] == task_id), None)
+    record = resolve_callback(call, 'task_', 'task_button_expired')
+    if record is None:
+        return
+    task_id = record['task_id']
+    task = get_task(task_id)
     
     if not task:
-        bot.answer_callback_query(call.id, "❌ कार्य अब उपलब्ध नहीं है")
+        outbound.answer_callback_query(call.id, text_for(call, 'task_unavailable'))
         return
     
-    task_type_hindi = TASK_TYPES.get(task.get('type', 'general'), 'सामान्य कार्य')
-    
-    task_msg = (
-        f"🎯 कार्य: {task['title']}\n"
-        f"📱 प्रकार: {task_type_hindi}\n"
-        f"💰 रिवॉर्ड: ₹{task['reward']}\n\n"
-        f"📝 विवरण:\n{task['description']}\n\n"
-        f"🔗 लिंक: {task.get('link', 'N/A')}\n\n"
-        f"📋 निर्देश:\n"
-        f"1. ऊपर दिए गए लिंक पर जाएं\n"
-        f"2. कार्य पूरा करें ({task_type_hindi})\n"
-        f"3. कार्य पूरा होने का स्क्रीनशॉट लें\n"
-        f"4. स्क्रीनशॉट को इस चैट में भेजें\n\n"
-        f"⚠️ कार्य पूरा करने के बाद, स्क्रीनशॉट को फोटो के रूप में इस चैट में भेजें।"
+    task_msg = text_for(
+        call, 'task_details',
+        title=task['title'],
+        task_type=TASK_TYPES.get(task.get('type', 'general')) or text_for(call, 'task_type_general'),
+        reward=task['reward'],
+        description=task['description'],
+        link=task.get('link', 'N/A')
     )
     
     # Add task completion button
     markup = types.InlineKeyboardMarkup()
     markup.add(types.InlineKeyboardButton(
-        "✅ कार्य पूरा करके स्क्रीनशॉट भेजें", 
-        callback_data=f"complete_{task_id}"
+        text_for(call, 'task_complete_button'),
+        callback_data=callback_data('complete_', pin=True, task_id=task_id)
     ))
     
-    bot.send_message(
+    outbound.send_message(
         call.message.chat.id,
         task_msg,
         reply_markup=markup,
         disable_web_page_preview=False
     )
-    bot.answer_callback_query(call.id)
+    outbound.answer_callback_query(call.id)
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith('complete_'))
+def quota_message(source, limit):
+    # limit is 'lifetime' or 'daily', as returned by TaskQuotas
+    return text_for(source, f"quota_{limit}")
+
+@router.callback('complete_')
 def handle_complete_task(call):
     user_id = call.from_user.id
     if is_user_blocked(user_id):
         return
     
-    task_id = call.data.split('_')[1]
-    user_current_task[user_id] = task_id
+    record = resolve_callback(call, 'complete_', 'task_button_expired')
+    if record is None:
+        return
     
-    bot.send_message(
-        call.message.chat.id,
-        "📸 कृपया कार्य पूरा होने का स्क्रीनशॉट भेजें:\n\n"
-        "⚠️ सुनिश्चित करें कि स्क्रीनशॉट में:\n"
-        "• आपका यूजरनेम दिखाई दे\n"
-        "• कार्य पूरा होने का प्रमाण हो\n"
-        "• इमेज स्पष्ट और पूरी दिखाई दे\n\n"
-        "अब स्क्रीनशॉट को फोटो के रूप में भेजें।"
-    )
-    bot.answer_callback_query(call.id, "📸 अब स्क्रीनशॉट भेजें")
+    limit = task_quotas.check(user_id)
+    if limit:
+        outbound.answer_callback_query(call.id, quota_message(call, limit), show_alert=True)
+        return
+    conversations.begin(call.message.chat.id, 'task_proof', slot='proof', task_id=record['task_id'])
+    
+    outbound.send_message(call.message.chat.id, text_for(call, 'proof_request'))
+    outbound.answer_callback_query(call.id, text_for(call, 'proof_request_toast'))
 
 @bot.message_handler(content_types=['photo'])
 def handle_proof_submission(message):
@@ -1323,72 +5080,79 @@ def handle_proof_submission(message):
     user = get_user_data(user_id)
     
     if not user:
-        bot.reply_to(message, "❌ पहले /start कमांड के साथ बॉट शुरू करें")
+        outbound.reply_to(message, text_for(message, 'register_first'))
         return
     
-    # Get the task ID for this user
-    task_id = user_current_task.get(user_id, "general_task")
+    limit = task_quotas.acquire(user_id)
+    if limit:
+        outbound.reply_to(message, quota_message(message, limit))
+        return
     
-    file_id = message.photo[-1].file_id
-    record_submission(user_id, task_id, file_id)
+    # Get the task ID for this user and clear it
+    pending = conversations.finish(message.chat.id, slot='proof')
+    task_id = pending['data']['task_id'] if pending else "general_task"
     
-    # Clear the current task
-    if user_id in user_current_task:
-        del user_current_task[user_id]
+    file_id = message.photo[-1].file_id
+    try:
+        record_submission(user_id, task_id, file_id)
+    except Exception:
+        task_quotas.release(user_id)
+        raise
     
-    bot.reply_to(
-        message,
-        "✅ प्रमाण सफलतापूर्वक सबमिट हो गया!\n\n"
-        "आपका सबमिशन समीक्षा के लिए भेजा गया है। स्वीकृति के बाद आपको सूचित किया जाएगा।\n"
-        "💰 स्वीकृति के बाद रिवॉर्ड आपके बैलेंस में जोड़ दिया जाएगा।"
+    outbound.reply_to(message, text_for(message, 'proof_submitted'))
+    log_activity(
+        f"User {user_id} submitted proof for task {task_id}",
+        action='proof_submitted', user_id=user_id, task_id=task_id
     )
-    log_activity(f"User {user_id} submitted proof for task {task_id}")
 
 # Screenshot verification for admin
 @bot.message_handler(commands=['approve'])
 def handle_approve(message):
     if not is_admin(message.from_user.id):
-        bot.reply_to(message, "❌ Admin only command")
+        outbound.reply_to(message, text_for(message, 'admin_only'))
         return
     
-    pending = get_pending_submissions()
+    pending = get_pending_submissions(limit=10)
     if not pending:
-        bot.reply_to(message, "✅ No pending submissions")
+        outbound.reply_to(message, "✅ No pending submissions")
         return
     
     markup = types.InlineKeyboardMarkup()
-    for sub in pending[:10]:
+    for sub in pending:
         user = get_user_data(sub['user_id'])
-        task = next((t for t in get_tasks() if t['id'] == sub['task_id']), None)
+        task = get_task(sub['task_id'])
         task_title = task['title'] if task else "Unknown Task"
         
         markup.add(types.InlineKeyboardButton(
             text=f"User {user['first_name']} - {task_title}",
-            callback_data=f"review_{sub['user_id']}_{sub['task_id']}_{sub['file_id']}"
+            callback_data=callback_data('review_', user_id=sub['user_id'], task_id=sub['task_id'], file_id=sub['file_id'])
         ))
     
-    bot.reply_to(
+    outbound.reply_to(
         message,
         "📝 Pending Submissions\n\n"
         "Click to review each submission:",
         reply_markup=markup
     )
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith('review_'))
+@router.callback('review_')
 def handle_submission_review(call):
     if not is_admin(call.from_user.id):
-        bot.answer_callback_query(call.id, "❌ Admin only")
+        outbound.answer_callback_query(call.id, text_for(call, 'admin_only'))
         return
     
-    _, user_id, task_id, file_id = call.data.split('_')
+    record = resolve_callback(call, 'review_')
+    if record is None:
+        return
+    user_id, task_id, file_id = record['user_id'], record['task_id'], record['file_id']
     user = get_user_data(user_id)
-    task = next((t for t in get_tasks() if t['id'] == task_id), None)
+    task = get_task(task_id)
     
     if not task:
-        bot.answer_callback_query(call.id, "❌ Task not found")
+        outbound.answer_callback_query(call.id, "❌ Task not found")
         return
     
-    bot.send_photo(
+    outbound.send_photo(
         call.from_user.id,
         file_id,
         caption=f"📌 Task: {task['title']}\n"
@@ -1398,115 +5162,193 @@ def handle_submission_review(call):
     
     markup = types.InlineKeyboardMarkup()
     markup.row(
-        types.InlineKeyboardButton("✅ Approve", callback_data=f"approve_{user_id}_{task_id}_{file_id}"),
-        types.InlineKeyboardButton("❌ Reject", callback_data=f"reject_{user_id}_{task_id}_{file_id}")
+        types.InlineKeyboardButton("✅ Approve", callback_data=callback_data('approve_', **record)),
+        types.InlineKeyboardButton("❌ Reject", callback_data=callback_data('reject_', **record))
     )
     
-    bot.send_message(
+    outbound.send_message(
         call.from_user.id,
         "Approve or reject this submission?",
         reply_markup=markup
     )
-    bot.answer_callback_query(call.id)
+    outbound.answer_callback_query(call.id)
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith(('approve_', 'reject_')))
+@router.callback('approve_', 'reject_', defer=True)
 def handle_approval_decision(call):
     if not is_admin(call.from_user.id):
-        bot.answer_callback_query(call.id, "❌ Admin only")
         return
     
-    action, user_id, task_id, file_id = call.data.split('_')
-    task = next((t for t in get_tasks() if t['id'] == task_id), None)
+    action, _ = call.data.split('_', 1)
+    record = resolve_callback(call, f"{action}_")
+    if record is None:
+        return
+    user_id, task_id, file_id = record['user_id'], record['task_id'], record['file_id']
+    task = get_task(task_id)
     
     if action == 'approve':
-        user = get_user_data(user_id)
-        new_balance = user['balance'] + task['reward']
-        update_user_data(user_id, field='balance', value=new_balance)
+        if not task:
+            notify_callback(call, "❌ Task not found")
+            return
+        reward = task['reward']
         
-        # Add to completed tasks
-        completed_tasks = user.get('completed_tasks', [])
-        completed_tasks.append({
-            'task_id': task_id,
-            'title': task['title'],
-            'reward': task['reward'],
-            'completed_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        })
-        update_user_data(user_id, field='completed_tasks', value=completed_tasks)
+        with ledger.user_lock(user_id):
+            # Flip the submission, then credit right away: a double tap can't
+            # pay twice and nothing that can fail sits between the two
+            if not update_submission_status(user_id, task_id, 'approved'):
+                notify_callback(call, "⚠️ Submission already processed")
+                return
+            
+            new_balance = ledger.credit(user_id, reward, 'task_reward', ref=task_id)
+            
+            # Add to completed tasks
+            record_completion(user_id, task_id)
         
         # Update task completion count
-        for i, t in enumerate(TASKS_DB):
-            if t['id'] == task_id:
-                TASKS_DB[i]['completed_count'] = TASKS_DB[i].get('completed_count', 0) + 1
-                break
+        increment_task_completions(task_id)
         
-        update_submission_status(user_id, task_id, 'approved')
+        outbound.send_message(
+            user_id, messages.render('submission_approved', title=task['title'], reward=reward, balance=new_balance))
         
-        bot.send_message(
-            user_id,
-            f"🎉 आपका '{task['title']}' कार्य स्वीकृत हो गया!\n"
-            f"💰 ₹{task['reward']} आपके बैलेंस में जोड़ दिए गए।\n"
-            f"💵 नया बैलेंस: ₹{new_balance}\n\n"
-            f"✅ बधाई हो! आप और भी कार्य पूरे कर सकते हैं।"
+        notify_callback(call, "✅ Submission approved")
+        log_activity(
+            f"Admin {call.from_user.id} approved submission from {user_id} for task {task_id}",
+            action='submission_approved', admin_id=call.from_user.id, user_id=user_id,
+            task_id=task_id, amount=reward
         )
-        
-        bot.answer_callback_query(call.id, "✅ Submission approved")
-        log_activity(f"Admin {call.from_user.id} approved submission from {user_id} for task {task_id}")
     else:
-        msg = bot.send_message(
+        outbound.send_message(
             call.from_user.id,
             "📝 Please enter rejection reason:"
         )
-        bot.register_next_step_handler(
-            msg, 
-            lambda m: process_rejection_reason(m, user_id, task_id, file_id)
-        )
-        bot.answer_callback_query(call.id)
+        conversations.begin(
+            call.from_user.id, 'submission_rejection', user_id=user_id, task_id=task_id, file_id=file_id)
+        notify_callback(call, "📝 Rejecting: waiting for the reason")
 
+@conversations.step('submission_rejection')
 def process_rejection_reason(message, user_id, task_id, file_id):
     if not is_admin(message.from_user.id):
         return
         
     reason = message.text
-    task = next((t for t in get_tasks() if t['id'] == task_id), None)
+    task = get_task(task_id)
     
-    update_submission_status(user_id, task_id, 'rejected', reason)
+    # Approved (or rejected) from another button while the reason was typed
+    if not update_submission_status(user_id, task_id, 'rejected', reason):
+        outbound.reply_to(message, "⚠️ Submission already processed")
+        return
+    task_quotas.release(user_id)
     
-    bot.send_message(
-        user_id,
-        f"❌ आपका '{task['title']}' कार्य रद्द कर दिया गया।\n\n"
-        f"📝 कारण: {reason}\n\n"
-        f"🔄 आप सही प्रमाण के साथ दोबारा कोशिश कर सकते हैं।\n"
-        f"💡 सुझाव: स्क्रीनशॉट में आपका यूजरनेम और कार्य पूरा होने का स्पष्ट प्रमाण होना चाहिए।"
-    )
+    outbound.send_message(user_id, messages.render('submission_rejected', title=task['title'], reason=reason))
     
-    bot.reply_to(
+    outbound.reply_to(
         message,
         "✅ User has been notified about the rejection."
     )
-    log_activity(f"Admin {message.from_user.id} rejected submission from {user_id} for task {task_id}")
+    log_activity(
+        f"Admin {message.from_user.id} rejected submission from {user_id} for task {task_id}",
+        action='submission_rejected', admin_id=message.from_user.id, user_id=user_id,
+        task_id=task_id, reason=reason
+    )
 
+@conversations.step('broadcast_text')
 def process_broadcast_message(message):
     if not is_admin(message.from_user.id):
         return
     
-    text = message.text
+    job = start_broadcast(message.from_user.id, message.text)
+    log_activity(
+        f"Admin {message.from_user.id} started broadcast {job['id']} to {job['total']} users",
+        action='broadcast_started', admin_id=message.from_user.id, broadcast_id=job['id']
+    )
+
+@router.callback('bcast_')
+def handle_broadcast_control(call):
+    if not is_admin(call.from_user.id):
+        outbound.answer_callback_query(call.id, text_for(call, 'admin_only'))
+        return
     
-    success = 0
-    failed = 0
-    for uid in USERS_DB.keys():
-        try:
-            bot.send_message(uid, f"📢 Admin Announcement:\n\n{text}")
-            success += 1
-        except Exception as e:
-            failed += 1
+    _, action, job_id = call.data.split('_', 2)
+    runner = broadcast_runners.get(job_id)
+    if not runner:
+        outbound.answer_callback_query(call.id, "❌ Broadcast is not running")
+        return
     
-    bot.reply_to(
-        message,
-        f"📢 Broadcast completed!\n\n"
-        f"✅ Success: {success}\n"
-        f"❌ Failed: {failed}"
+    status = runner.job['status']
+    if action == 'pause' and status == 'running':
+        runner.set_status('paused')
+    elif action == 'resume' and status == 'paused':
+        runner.set_status('running')
+    elif action == 'cancel' and status in ('running', 'paused'):
+        runner.set_status('cancelled')
+    outbound.answer_callback_query(call.id)
+
+LOGS_USAGE = (
+    "🔎 Search activity logs:\n\n"
+    "/logs 123456789 - events for a user\n"
+    "/logs name@upi - events for a UPI ID\n"
+    "/logs withdrawal_requested - events of one type\n"
+    "/logs user:123 action:withdrawal_approved since:2025-01-01 until:2025-01-31"
+)
+
+def render_log_page(query, page):
+    try:
+        terms, since, until = parse_log_query(query)
+    except ValueError as e:
+        return f"❌ {str(e)}\n\n{LOGS_USAGE}", None
+    
+    start = time.perf_counter()
+    records, has_more = activity_log_search.search(
+        terms, since, until, offset=page * ACTIVITY_LOG_PAGE_SIZE, limit=ACTIVITY_LOG_PAGE_SIZE
     )
-    log_activity(f"Admin {message.from_user.id} sent broadcast to {success} users")
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    
+    if not records:
+        return f"🔎 {query}\n\n✅ No matching events", None
+    
+    log_text = f"🔎 {query} (page {page + 1}, {elapsed_ms:.0f}ms)\n\n"
+    for record in records:
+        log_text += f"• [{record['timestamp']}] {record['message'][:200]}\n"
+    
+    markup = types.InlineKeyboardMarkup()
+    buttons = []
+    if page > 0:
+        buttons.append(types.InlineKeyboardButton("◀️ Newer", callback_data=callback_data('logs_', query=query, page=page - 1)))
+    if has_more:
+        buttons.append(types.InlineKeyboardButton("Older ▶️", callback_data=callback_data('logs_', query=query, page=page + 1)))
+    markup.row(*buttons)
+    return log_text, markup
+
+@bot.message_handler(commands=['logs'])
+def handle_logs_search(message):
+    if not is_admin(message.from_user.id):
+        outbound.reply_to(message, text_for(message, 'admin_only'))
+        return
+    
+    query = message.text.partition(' ')[2].strip()
+    if not query:
+        outbound.reply_to(message, LOGS_USAGE)
+        return
+    
+    log_text, markup = render_log_page(query, 0)
+    outbound.reply_to(message, log_text, reply_markup=markup)
+
+@router.callback('logs_')
+def handle_logs_page(call):
+    if not is_admin(call.from_user.id):
+        outbound.answer_callback_query(call.id, text_for(call, 'admin_only'))
+        return
+    
+    record = resolve_callback(call, 'logs_')
+    if record is None:
+        return
+    
+    log_text, markup = render_log_page(record['query'], record['page'])
+    outbound.edit_message_text(log_text, call.message.chat.id, call.message.message_id, reply_markup=markup)
+    outbound.answer_callback_query(call.id)
+
+# Button and callback handlers above are dispatched through the router
+router.install(bot)
+conversations.install(bot)
 
 # ======================
 # Main Function
@@ -1520,19 +5362,56 @@ def main():
     # Start keep alive server
     keep_alive()
     
+    # Async engine must be wired into the outbound dispatcher before it sends
+    if BOT_ENGINE == 'async':
+        engine, loop = create_async_engine()
+    
+    # Start outbound sender threads
+    outbound.start()
+    
+    # Pick up broadcasts interrupted by a restart
+    resume_broadcasts()
+    
+    # Cache the bot's username for referral links
+    bot_identity.refresh()
+    threading.Thread(target=bot_identity.refresh_loop, daemon=True).start()
+    
+    # Load the activity log indexes for /logs in the background
+    threading.Thread(target=activity_log_search.warm, daemon=True).start()
+    
     # Start background threads
     threading.Thread(target=self_ping_loop, daemon=True).start()
     threading.Thread(target=heartbeat_loop, daemon=True).start()
+    threading.Thread(target=conversation_sweep_loop, daemon=True).start()
+    if CALLBACK_TOKENS_FILE:
+        threading.Thread(target=callback_tokens_save_loop, daemon=True).start()
     
     # Start bot
     log_activity("Bot started successfully")
     print("🎯 TaskCompleteRewardsBot is now running!")
-    print("📋 All data stored in memory (no external files)")
+    print(f"📋 Storage backend: {storage.name}")
+    print(f"⚙️ Engine: {BOT_ENGINE}, ingest: {INGEST_MODE}")
     print("👨‍💼 Admin ID: 5367009004")
     print("🌐 Web server running on http://localhost:8080")
     print("📊 Bot statistics available at http://localhost:8080/stats")
     
-    bot.infinity_polling()
+    if INGEST_MODE == 'webhook':
+        start_webhook()
+        if BOT_ENGINE == 'async':
+            # No polling; the loop only carries outbound API calls
+            loop.run_forever()
+        else:
+            threading.Event().wait()
+    else:
+        # getUpdates is refused while a webhook is set
+        try:
+            bot.remove_webhook()
+        except Exception as e:
+            log_activity(f"Webhook removal failed: {str(e)}")
+        if BOT_ENGINE == 'async':
+            run_async_engine(engine, loop)
+        else:
+            bot.infinity_polling()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
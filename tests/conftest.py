@@ -0,0 +1,44 @@
+import os
+import sys
+
+# bot.py reads its configuration at import time
+os.environ.setdefault('BOT_TOKEN', '1:test')
+os.environ['STORAGE_BACKEND'] = 'memory'
+os.environ['ACTIVITY_LOG_DIR'] = ''
+os.environ['ACTIVITY_LOG_CONSOLE'] = '0'
+os.environ['TRACE_SAMPLE_RATE'] = '0'
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+import bot as bot_module  # noqa: E402
+
+
+@pytest.fixture
+def bot():
+    return bot_module
+
+
+@pytest.fixture
+def storage(bot, monkeypatch):
+    # A fresh in-memory store behind the module-level helpers
+    store = bot.MemoryStorage(tasks=[dict(task) for task in bot.TASKS_DB])
+    monkeypatch.setattr(bot, 'storage', store)
+    return store
+
+
+@pytest.fixture
+def user(bot):
+    def make(user_id, balance=0):
+        return {
+            'id': user_id,
+            'first_name': f"User{user_id}",
+            'balance': balance,
+            'referrals': 0,
+            'referral_code': f"REF-{user_id}-TEST",
+            'joined': "2025-01-01 00:00:00",
+            'blocked': False,
+            'completed_tasks': []
+        }
+    return make
@@ -0,0 +1,95 @@
+import os
+from datetime import datetime
+
+import pytest
+
+DAY = 86400
+START = datetime(2025, 3, 1).timestamp()
+
+
+def record(n, action='task_submitted', user_id=None, ts=None, **fields):
+    return {'ts': START + n if ts is None else ts, 'timestamp': '', 'action': action,
+            'message': f"entry {n}", 'user_id': user_id, **fields}
+
+
+@pytest.fixture
+def writer(bot, tmp_path):
+    return bot.ActivityLogWriter(str(tmp_path), console=False)
+
+
+def write_blocks(writer, blocks):
+    # Each flush becomes one gzip block with its own index line
+    for records in blocks:
+        for r in records:
+            writer._pending.append(r)
+        writer.flush()
+
+
+def messages(records):
+    return [r['message'] for r in records]
+
+
+def test_search_reads_only_matching_blocks(bot, writer, monkeypatch):
+    write_blocks(writer, [
+        [record(0, user_id='7'), record(1, user_id='8')],
+        [record(2, action='withdrawal_requested', user_id='8', upi='Me@Bank')],
+        [record(3, user_id='9')]
+    ])
+    search = bot.ActivityLogSearch(writer)
+    read = []
+    read_block = bot.ActivityLogSearch._read_block
+    monkeypatch.setattr(bot.ActivityLogSearch, '_read_block',
+                        staticmethod(lambda path, block: read.append(block['offset']) or read_block(path, block)))
+
+    found, more = search.search({'user:8'})
+    assert messages(found) == ['entry 2', 'entry 1'] and not more
+    assert len(read) == 2  # the block with only user 7 and 9 entries was skipped
+
+    found, _ = search.search({'upi:me@bank', 'action:withdrawal_requested'})
+    assert messages(found) == ['entry 2']
+    assert search.search({'user:8', 'user:9'}) == ([], False)
+
+
+def test_search_pages_newest_first(bot, writer):
+    write_blocks(writer, [[record(n, user_id='1') for n in range(5)], [record(n, user_id='1') for n in range(5, 8)]])
+    search = bot.ActivityLogSearch(writer)
+
+    first, more = search.search({'user:1'}, offset=0, limit=3)
+    assert messages(first) == ['entry 7', 'entry 6', 'entry 5'] and more
+    last, more = search.search({'user:1'}, offset=6, limit=3)
+    assert messages(last) == ['entry 1', 'entry 0'] and not more
+
+
+def test_time_range_filters_records(bot, writer):
+    write_blocks(writer, [[record(0, ts=START - DAY)], [record(1, ts=START), record(2, ts=START + DAY)]])
+    search = bot.ActivityLogSearch(writer)
+
+    found, _ = search.search(set(), since=START, until=START + DAY - 1)
+    assert messages(found) == ['entry 1']
+    found, _ = search.search(set(), until=START)
+    assert messages(found) == ['entry 1', 'entry 0']
+
+
+def test_rotation_and_missing_index(bot, tmp_path):
+    writer = bot.ActivityLogWriter(str(tmp_path), segment_bytes=1, retain=3, console=False)
+    write_blocks(writer, [[record(n, user_id='1')] for n in range(3)])
+    # The segment being written counts towards `retain`
+    assert [seq for seq, _ in writer.segments()] == [2, 3]
+
+    # A sidecar lost in a crash is rebuilt from the segment's gzip members
+    path = writer.segments()[0][1]
+    os.remove(bot.activity_index_path(path))
+    found, _ = bot.ActivityLogSearch(writer).search({'user:1'})
+    assert messages(found) == ['entry 2', 'entry 1']
+    assert os.path.exists(bot.activity_index_path(path))
+
+
+def test_parse_log_query(bot):
+    terms, since, until = bot.parse_log_query("42 me@Bank withdrawal_requested admin:5 since:2025-03-01 until:2025-03-02")
+    assert terms == {'user:42', 'upi:me@bank', 'action:withdrawal_requested', 'admin:5'}
+    assert since == START
+    assert until == START + 2 * DAY
+
+    assert bot.parse_log_query("") == (set(), None, None)
+    with pytest.raises(ValueError):
+        bot.parse_log_query("color:red")
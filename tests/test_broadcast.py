@@ -0,0 +1,119 @@
+import time
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+import pytest
+from telebot.apihelper import ApiTelegramException
+
+ADMIN = 999
+
+
+@pytest.fixture
+def sends(bot, storage, monkeypatch):
+    # Records every outbound send; replies are decided per chat in `outcomes`
+    sent = []
+    outcomes = {}
+
+    def send_message(chat_id, text, priority=None, **kwargs):
+        sent.append(int(chat_id))
+        outcome = outcomes.get(int(chat_id))
+        future = Future()
+        if isinstance(outcome, Exception):
+            future.set_exception(outcome)
+        elif outcome != 'hang':
+            future.set_result(SimpleNamespace(message_id=len(sent)))
+        return future
+
+    monkeypatch.setattr(bot.outbound, 'send_message', send_message)
+    monkeypatch.setattr(bot.outbound, 'edit_message_text', lambda *args, **kwargs: None)
+    monkeypatch.setattr(bot, 'BROADCAST_PAGE_SIZE', 2)
+    return SimpleNamespace(sent=sent, outcomes=outcomes)
+
+
+def make_job(bot, status='running', cursor=None):
+    return {
+        'id': 'b1', 'admin_id': ADMIN, 'text': 'hello', 'status': status, 'cursor': cursor,
+        'total': bot.count_users(), 'sent': 0, 'blocked': 0, 'skipped': 0, 'failed': 0,
+        'created_at': "2025-01-01 00:00:00", 'progress_message_id': 1
+    }
+
+
+def forbidden():
+    return ApiTelegramException('sendMessage', None, {'error_code': 403, 'description': 'Forbidden: bot was blocked'})
+
+
+def add_users(storage, user, count):
+    for user_id in range(1, count + 1):
+        storage.put_user(user_id, user(user_id))
+
+
+def test_broadcast_pages_through_users(bot, storage, user, sends):
+    add_users(storage, user, 5)
+    storage.set_user_field(2, 'blocked', True)
+    sends.outcomes[4] = forbidden()
+
+    job = make_job(bot)
+    bot.BroadcastRunner(job)._run()
+
+    assert sorted(sends.sent) == [1, 3, 4, 5]
+    assert (job['status'], job['sent'], job['blocked'], job['skipped'], job['failed']) == ('completed', 3, 1, 1, 0)
+    assert storage.get_user(4)['bot_blocked'] is True
+    assert storage.get_broadcasts()[0]['status'] == 'completed'
+
+    # The next broadcast skips the user who blocked the bot
+    sends.sent.clear()
+    job = dict(make_job(bot), id='b2')
+    bot.BroadcastRunner(job)._run()
+    assert sorted(sends.sent) == [1, 3, 5]
+    assert job['skipped'] == 2
+
+
+def test_resume_starts_at_checkpointed_cursor(bot, storage, user, sends):
+    add_users(storage, user, 5)
+    first_page, cursor = storage.user_page(None, 2)
+
+    bot.BroadcastRunner(make_job(bot, cursor=cursor))._run()
+
+    assert sorted(sends.sent) == sorted(set(range(1, 6)) - {int(uid) for uid, _ in first_page})
+
+
+def test_unanswered_sends_count_as_failed(bot, storage, user, sends, monkeypatch):
+    monkeypatch.setattr(bot, 'BROADCAST_PAGE_TIMEOUT', 0.05)
+    add_users(storage, user, 3)
+    sends.outcomes[2] = 'hang'
+    sends.outcomes[3] = RuntimeError('network down')
+
+    job = make_job(bot)
+    bot.BroadcastRunner(job)._run()
+
+    assert (job['sent'], job['failed']) == (1, 2)
+
+
+def wait_finished(bot, runner):
+    for _ in range(250):
+        if runner.job['id'] not in bot.broadcast_runners:
+            return
+        time.sleep(0.02)
+    raise AssertionError(f"broadcast {runner.job['id']} still running")
+
+
+def test_pause_resume_and_cancel(bot, storage, user, sends):
+    add_users(storage, user, 3)
+
+    runner = bot.BroadcastRunner(make_job(bot, status='paused'))
+    runner.start()
+    time.sleep(0.1)
+    assert runner.job['id'] in bot.broadcast_runners
+    assert sends.sent == []  # paused: nothing goes out
+
+    runner.set_status('running')
+    wait_finished(bot, runner)
+    assert runner.job['status'] == 'completed'
+    assert sorted(sends.sent) == [1, 2, 3]
+
+    cancelled = bot.BroadcastRunner(dict(make_job(bot, status='paused'), id='b2'))
+    cancelled.start()
+    cancelled.set_status('cancelled')
+    wait_finished(bot, cancelled)
+    assert sorted(sends.sent) == [1, 2, 3]
+    assert {job['id']: job['status'] for job in storage.get_broadcasts()} == {'b1': 'completed', 'b2': 'cancelled'}
@@ -0,0 +1,60 @@
+import json
+import time
+
+
+def test_same_record_gives_same_token(bot):
+    tokens = bot.CallbackTokens()
+    token = tokens.issue(action='approve', user_id=7)
+
+    assert token == tokens.issue(user_id=7, action='approve')
+    assert token != tokens.issue(action='reject', user_id=7)
+    assert len('approve_' + token) <= 64
+    assert tokens.resolve(token) == {'action': 'approve', 'user_id': 7}
+    assert tokens.resolve('unknown') is None
+
+
+def test_eviction_drops_least_recently_used(bot):
+    tokens = bot.CallbackTokens(capacity=2)
+    first = tokens.issue(n=1)
+    second = tokens.issue(n=2)
+    assert tokens.resolve(first) == {'n': 1}  # now the most recent
+
+    tokens.issue(n=3)
+    assert tokens.resolve(first) == {'n': 1}
+    assert tokens.resolve(second) is None
+
+
+def test_expired_tokens_resolve_to_none(bot, monkeypatch):
+    tokens = bot.CallbackTokens(ttl=10)
+    token = tokens.issue(n=1)
+    pinned = tokens.issue(pin=True, n=2)
+    later = time.time() + 11
+    monkeypatch.setattr(bot.time, 'time', lambda: later)
+
+    assert tokens.resolve(token) is None
+    assert tokens.resolve(pinned) == {'n': 2}
+    assert len(tokens) == 1
+
+
+def test_pinned_tokens_are_written_through(bot, tmp_path):
+    path = str(tmp_path / 'tokens.json')
+    tokens = bot.CallbackTokens(path=path)
+    pinned = tokens.issue(pin=True, task_id='t1')
+
+    # No save or exit hook ran: a crash now still keeps the button working
+    restored = bot.CallbackTokens(path=path)
+    assert restored.resolve(pinned) == {'task_id': 't1'}
+
+
+def test_periodic_save_keeps_new_tokens(bot, tmp_path):
+    path = str(tmp_path / 'tokens.json')
+    tokens = bot.CallbackTokens(capacity=2, path=path)
+    issued = [tokens.issue(n=n) for n in range(3)]
+    tokens.save_if_dirty()
+    saved_at = (tmp_path / 'tokens.json').stat().st_mtime_ns
+
+    tokens.save_if_dirty()  # nothing new: no write
+    assert (tmp_path / 'tokens.json').stat().st_mtime_ns == saved_at
+    restored = bot.CallbackTokens(capacity=2, path=path)
+    assert [restored.resolve(token) for token in issued] == [None, {'n': 1}, {'n': 2}]
+    assert len(json.loads((tmp_path / 'tokens.json').read_text())) == 2
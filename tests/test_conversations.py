@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'journal'])
+def store(request, bot, tmp_path):
+    if request.param == 'memory':
+        yield bot.MemoryStorage()
+        return
+    if request.param == 'sqlite':
+        yield bot.SQLiteStorage(str(tmp_path / 'bot.db'))
+        return
+    journal = bot.JournalStorage(str(tmp_path / 'journal'), snapshot_interval=3600)
+    yield journal
+    journal.close()
+
+
+@pytest.fixture
+def clock(bot, monkeypatch):
+    now = SimpleNamespace(value=1_700_000_000.0)
+    monkeypatch.setattr(bot.time, 'time', lambda: now.value)
+    return now
+
+
+def message(chat_id):
+    return SimpleNamespace(chat=SimpleNamespace(id=chat_id))
+
+
+def test_resume_hands_data_to_the_step(bot, store, clock):
+    conversations = bot.ConversationStore(store, ttl=60)
+    calls = []
+
+    @conversations.step('ask_upi')
+    def ask_upi(message, amount):
+        calls.append(amount)
+
+    conversations.begin(5, 'ask_upi', amount=50)
+    conversations.begin(5, 'task_7', slot='proof', task_id='t7')
+
+    handler, data = conversations.resume(message(5))
+    assert data == {'amount': 50}
+    handler(message(5), **data)
+    assert calls == [50]
+    assert conversations.resume(message(5)) is None  # consumed
+    assert conversations.get(5, slot='proof')['data'] == {'task_id': 't7'}
+    assert conversations.finish(5, slot='proof')['state'] == 'task_7'
+    assert conversations.finish(5, slot='proof') is None
+
+
+def test_unknown_state_is_not_resumed(bot, store, clock):
+    conversations = bot.ConversationStore(store, ttl=60)
+    conversations.begin(5, 'no_such_step')
+    assert conversations.resume(message(5)) is None
+
+
+def test_states_expire_after_ttl(bot, store, clock):
+    conversations = bot.ConversationStore(store, ttl=60)
+    conversations.steps['ask_upi'] = lambda message: None
+    conversations.begin(1, 'ask_upi')
+    clock.value += 30
+    conversations.begin(2, 'ask_upi')
+
+    clock.value += 31
+    assert conversations.resume(message(1)) is None  # expired, even before a sweep
+    assert conversations.get(2) is not None
+    assert conversations.sweep() == 1
+    assert len(conversations) == 1
+
+    clock.value += 30
+    assert conversations.sweep() == 1
+    assert len(conversations) == 0
+
+
+def test_sweep_drops_oldest_beyond_limit(bot, store, clock):
+    conversations = bot.ConversationStore(store, ttl=60, limit=2)
+    for chat_id in range(1, 5):
+        conversations.begin(chat_id, 'ask_upi')
+        clock.value += 1
+    conversations.begin(1, 'ask_upi')  # answered again: now the newest
+
+    assert conversations.sweep() == 2
+    assert [chat_id for chat_id in range(1, 5) if conversations.get(chat_id)] == [1, 4]
@@ -0,0 +1,90 @@
+import threading
+import time
+
+
+def wait_done(executor, count):
+    deadline = time.monotonic() + 5
+    while executor.stats['done'] < count and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert executor.stats['done'] == count
+
+
+def blocked_lane(executor):
+    # Occupies the single lane until the returned event is set
+    started, release = threading.Event(), threading.Event()
+
+    def hold():
+        started.set()
+        release.wait(5)
+
+    executor.submit('hold', executor.NORMAL, hold)
+    assert started.wait(5)
+    return release
+
+
+def test_one_users_updates_run_in_order(bot):
+    executor = bot.KeyedExecutor(lanes=4)
+    seen = {1: [], 2: []}
+    for i in range(50):
+        for key in seen:
+            executor.submit(key, executor.NORMAL, seen[key].append, i)
+
+    wait_done(executor, 100)
+    assert seen == {1: list(range(50)), 2: list(range(50))}
+
+
+def test_high_priority_jumps_the_lane(bot):
+    executor = bot.KeyedExecutor(lanes=1)
+    release = blocked_lane(executor)
+    ran = []
+    executor.submit(1, executor.NORMAL, ran.append, 'message 1')
+    executor.submit(1, executor.NORMAL, ran.append, 'message 2')
+    executor.submit(2, executor.HIGH, ran.append, 'callback')
+
+    release.set()
+    wait_done(executor, 4)
+    assert ran == ['callback', 'message 1', 'message 2']
+
+
+def test_full_lane_sheds_normal_but_not_high(bot):
+    executor = bot.KeyedExecutor(lanes=1, depth=2, block_timeout=0.05)
+    release = blocked_lane(executor)
+    ran = []
+    assert executor.submit(1, executor.NORMAL, ran.append, 1)
+    assert executor.submit(1, executor.NORMAL, ran.append, 2)
+
+    started = time.monotonic()
+    assert not executor.submit(1, executor.NORMAL, ran.append, 3)
+    assert time.monotonic() - started >= 0.05  # waited for room first
+    assert executor.submit(1, executor.HIGH, ran.append, 'high')
+    assert executor.stats['shed'] == 1
+
+    release.set()
+    wait_done(executor, 4)
+    assert ran == ['high', 1, 2]
+
+
+def test_blocked_submitter_gets_room(bot):
+    executor = bot.KeyedExecutor(lanes=1, depth=1, block_timeout=5)
+    release = blocked_lane(executor)
+    ran = []
+    executor.submit(1, executor.NORMAL, ran.append, 1)
+    threading.Timer(0.05, release.set).start()
+
+    assert executor.submit(1, executor.NORMAL, ran.append, 2)
+    wait_done(executor, 3)
+    assert ran == [1, 2]
+    assert executor.stats['shed'] == 0
+
+
+def test_handler_errors_go_to_on_error(bot):
+    errors = []
+    executor = bot.KeyedExecutor(lanes=1, on_error=lambda e: errors.append(e) or True)
+
+    def fail():
+        raise ValueError('boom')
+
+    executor.submit(1, executor.NORMAL, fail)
+    executor.submit(1, executor.NORMAL, lambda: None)
+    wait_done(executor, 2)
+    assert [str(e) for e in errors] == ['boom']
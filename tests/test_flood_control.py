@@ -0,0 +1,90 @@
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture
+def clock(bot, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(bot.time, 'monotonic', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def blocked(bot, monkeypatch):
+    calls = []
+    monkeypatch.setattr(bot, 'block_user', calls.append)
+    monkeypatch.setattr(bot, 'log_activity', lambda *args, **kwargs: None)
+    return calls
+
+
+def message_from(user_id):
+    return SimpleNamespace(message=SimpleNamespace(from_user=SimpleNamespace(id=user_id)))
+
+
+def flood(control, user_id, count):
+    update = message_from(user_id)
+    return [control.admit(update, 'message') for _ in range(count)]
+
+
+def make_control(bot, **kwargs):
+    options = dict(rate=1, burst=2, strikes=3, strike_window=60, block_seconds=10, max_blocks=3,
+                   block_decay=1000)
+    options.update(kwargs)
+    return bot.FloodControl(**options)
+
+
+def test_burst_then_rate(bot, clock, blocked):
+    control = make_control(bot)
+    assert flood(control, 101, 3) == [True, True, False]
+    clock[0] += 1
+    assert flood(control, 101, 2) == [True, False]
+
+
+def test_escalates_to_mute_then_block(bot, clock, blocked):
+    control = make_control(bot)
+    user_id = 102
+
+    # burst of 2, then 3 strikes: first mute for 10s
+    assert flood(control, user_id, 5) == [True, True, False, False, False]
+    assert control._states[user_id].blocks == 1
+    clock[0] += 9
+    assert flood(control, user_id, 1) == [False]  # still muted, not a strike
+    assert control._states[user_id].strikes == 0
+
+    # second mute doubles to 20s
+    clock[0] += 2
+    flood(control, user_id, 5)
+    assert control._states[user_id].blocks == 2
+    clock[0] += 19
+    assert flood(control, user_id, 1) == [False]
+    clock[0] += 2
+    assert flood(control, user_id, 1) == [True]
+    assert blocked == []
+
+    # third one blocks for good
+    flood(control, user_id, 5)
+    assert blocked == [user_id]
+
+
+def test_mutes_decay_after_clean_period(bot, clock, blocked):
+    control = make_control(bot)
+    for _ in range(5):
+        flood(control, 103, 5)
+        assert control._states[103].blocks == 1
+        clock[0] += 2000
+    assert blocked == []
+
+
+def test_admin_and_other_updates_exempt(bot, clock, blocked):
+    control = make_control(bot)
+    assert all(flood(control, bot.ADMIN_ID, 20))
+    poll = SimpleNamespace(poll=SimpleNamespace())
+    assert control.admit(poll, 'poll')
+
+
+def test_blocked_users_dropped(bot, clock, blocked, monkeypatch):
+    monkeypatch.setattr(bot, 'blocked_users', {'104'})
+    control = make_control(bot)
+    assert flood(control, 104, 1) == [False]
+    assert len(control) == 0
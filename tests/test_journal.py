@@ -0,0 +1,120 @@
+import os
+
+
+def open_journal(bot, directory):
+    return bot.JournalStorage(str(directory), commit_interval=0.01, snapshot_interval=3600)
+
+
+def reward_entry(user_id, amount):
+    return {
+        'at': "2025-01-01 00:00:00",
+        'debit': 'rewards:task_reward',
+        'credit': f"user:{user_id}",
+        'amount': amount,
+        'kind': 'task_reward',
+        'ref': None
+    }
+
+
+def test_replays_journal_after_crash(bot, user, tmp_path):
+    journal = open_journal(bot, tmp_path)
+    for user_id in (1, 2, 3):
+        journal.put_user(user_id, user(user_id))
+    journal.set_user_field(2, 'referrals', 4)
+    journal.add_completion(3, 1, "2025-01-02 10:00:00")
+    journal.post_ledger_entry(reward_entry(1, 15), user_id=1, balance=15)
+    journal.flush()
+    # No close(): the process dies here
+
+    recovered = open_journal(bot, tmp_path)
+    assert recovered.count_users() == 3
+    assert recovered.get_user(1)['balance'] == 15
+    assert recovered.get_user(2)['referrals'] == 4
+    assert [t['task_id'] for t in recovered.get_user(3)['completed_tasks']] == [1]
+    assert recovered.ledger_totals == {'rewards:task_reward': -15}
+    recovered.close()
+
+
+def test_ignores_torn_tail_write(bot, user, tmp_path):
+    journal = open_journal(bot, tmp_path)
+    journal.put_user(1, user(1))
+    journal.flush()
+    segment = max(name for name in os.listdir(tmp_path) if name.startswith('journal-'))
+    with open(tmp_path / segment, 'a', encoding='utf-8') as f:
+        f.write('{"seq": 2, "op": "put_user", "user_id": "2", "da')
+
+    recovered = open_journal(bot, tmp_path)
+    assert recovered.count_users() == 1
+    assert recovered._seq == 1
+    recovered.close()
+
+
+def test_replays_tail_on_top_of_snapshot(bot, user, tmp_path):
+    journal = open_journal(bot, tmp_path)
+    journal.put_user(1, user(1))
+    journal.post_ledger_entry(reward_entry(1, 5), user_id=1, balance=5)
+    journal.snapshot()
+    journal.put_user(2, user(2))
+    journal.post_ledger_entry(reward_entry(2, 7), user_id=2, balance=7)
+    journal.flush()
+
+    names = os.listdir(tmp_path)
+    assert sum(name.startswith('snapshot-') for name in names) == 1
+
+    recovered = open_journal(bot, tmp_path)
+    assert recovered.count_users() == 2
+    assert recovered.get_user(1)['balance'] == 5
+    assert recovered.get_user(2)['balance'] == 7
+    assert recovered.ledger_totals == {'rewards:task_reward': -12}
+    recovered.close()
+
+
+def test_snapshot_keeps_constructor_state(bot, user, tmp_path):
+    journal = bot.JournalStorage(str(tmp_path), snapshot_interval=3600, tasks=[dict(bot.TASKS_DB[0])],
+                                 users={'1': user(1)})
+    journal.put_user(2, user(2))
+    journal.snapshot()
+    journal.close()
+
+    recovered = open_journal(bot, tmp_path)
+    assert recovered.count_users() == 2
+    assert [task['id'] for task in recovered.get_tasks()] == [bot.TASKS_DB[0]['id']]
+    recovered.close()
+
+
+def test_writes_after_torn_tail_survive(bot, user, tmp_path):
+    journal = open_journal(bot, tmp_path)
+    journal.put_user(1, user(1))
+    journal.snapshot()
+    journal.close()
+    segment = max(name for name in os.listdir(tmp_path) if name.startswith('journal-'))
+    with open(tmp_path / segment, 'a', encoding='utf-8') as f:
+        f.write('{"seq": 2, "op": "put_us')
+
+    reopened = open_journal(bot, tmp_path)
+    for user_id in (2, 3, 4):
+        reopened.put_user(user_id, user(user_id))
+    reopened.close()
+
+    recovered = open_journal(bot, tmp_path)
+    assert recovered.count_users() == 4
+    assert recovered._seq == 4
+    recovered.close()
+
+
+def test_ledger_history_survives_compaction(bot, user, tmp_path, monkeypatch):
+    monkeypatch.setattr(bot, 'LEDGER_RECENT_ENTRIES', 2)
+    journal = open_journal(bot, tmp_path)
+    journal.put_user(1, user(1))
+    for amount in (1, 2, 3):
+        journal.post_ledger_entry(reward_entry(1, amount), user_id=1, balance=amount)
+    journal.snapshot()
+    journal.post_ledger_entry(reward_entry(1, 4), user_id=1, balance=10)
+    journal.snapshot()
+    journal.post_ledger_entry(reward_entry(1, 5), user_id=1, balance=15)
+    journal.close()
+
+    recovered = open_journal(bot, tmp_path)
+    assert [e['amount'] for e in recovered.ledger] == [4, 5]
+    assert [e['amount'] for e in recovered.ledger_history()] == [1, 2, 3, 4, 5]
+    recovered.close()
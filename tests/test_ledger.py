@@ -0,0 +1,72 @@
+def run_ledger(bot, ledger):
+    for user_id, amount in ((1, 10), (2, 25), (3, 4), (1, 6)):
+        ledger.credit(user_id, amount, 'task_reward', ref=user_id)
+    assert ledger.debit_all(2, 'withdrawal', minimum=10) == 25
+    assert ledger.debit_all(3, 'withdrawal', minimum=10) == 0
+    ledger.transfer('payable:withdrawal', 'paid:upi', 25, 'withdrawal_paid', ref=2)
+    ledger.credit(1, 3, 'referral_reward')
+
+
+def assert_balanced(store, user_ids):
+    balances = {user_id: store.get_user(user_id)['balance'] for user_id in user_ids}
+    # Double entry: user balances and system account totals cancel out
+    assert sum(balances.values()) + sum(store.ledger_totals.values()) == 0
+    return balances
+
+
+def test_ledger_totals_equal_user_balances(bot, storage, user):
+    for user_id in (1, 2, 3):
+        storage.put_user(user_id, user(user_id))
+    ledger = bot.BalanceLedger()
+
+    run_ledger(bot, ledger)
+
+    balances = assert_balanced(storage, (1, 2, 3))
+    assert balances == {1: 19, 2: 0, 3: 4}
+    assert ledger.total_balance == sum(balances.values()) == storage.user_totals()['balance']
+    assert storage.ledger_totals == {
+        'rewards:task_reward': -45,
+        'rewards:referral_reward': -3,
+        'payable:withdrawal': 0,
+        'paid:upi': 25
+    }
+    # Each user's entries add up to their balance
+    for user_id, balance in balances.items():
+        account = f"user:{user_id}"
+        posted = sum(e['amount'] for e in storage.ledger if e['credit'] == account)
+        posted -= sum(e['amount'] for e in storage.ledger if e['debit'] == account)
+        assert posted == balance
+
+
+def test_credit_unknown_user_posts_nothing(bot, storage):
+    ledger = bot.BalanceLedger()
+    assert ledger.credit(99, 5, 'task_reward') is None
+    assert not storage.ledger
+    assert ledger.total_balance == 0
+
+
+def test_ledger_totals_survive_journal_restart(bot, user, tmp_path, monkeypatch):
+    journal = bot.JournalStorage(str(tmp_path), snapshot_interval=3600)
+    monkeypatch.setattr(bot, 'storage', journal)
+    for user_id in (1, 2, 3):
+        journal.put_user(user_id, user(user_id))
+    run_ledger(bot, bot.BalanceLedger())
+    journal.snapshot()
+    bot.BalanceLedger().credit(3, 8, 'task_reward')
+    journal.close()
+
+    recovered = bot.JournalStorage(str(tmp_path), snapshot_interval=3600)
+    balances = assert_balanced(recovered, (1, 2, 3))
+    assert balances == {1: 19, 2: 0, 3: 12}
+    recovered.close()
+
+
+def test_recent_entries_are_capped(bot, user, monkeypatch):
+    monkeypatch.setattr(bot, 'LEDGER_RECENT_ENTRIES', 3)
+    store = bot.MemoryStorage()
+    store.put_user(1, user(1))
+    for i in range(10):
+        store.post_ledger_entry({'at': '', 'debit': 'rewards:bonus', 'credit': 'user:1', 'amount': 1,
+                                 'kind': 'bonus', 'ref': i}, user_id=1, balance=i + 1)
+    assert [e['ref'] for e in store.ledger] == [7, 8, 9]
+    assert store.ledger_totals == {'rewards:bonus': -10}
@@ -0,0 +1,91 @@
+import string
+from types import SimpleNamespace
+
+import pytest
+
+
+def sender(user_id=7, language_code=None):
+    user = SimpleNamespace(id=user_id, first_name='A', language_code=language_code)
+    return SimpleNamespace(from_user=user, chat=SimpleNamespace(id=user_id), text='')
+
+
+@pytest.fixture
+def sent(bot, monkeypatch):
+    calls = []
+    monkeypatch.setattr(bot.outbound, 'send_message', lambda chat_id, text, **kwargs: calls.append((chat_id, text)))
+    monkeypatch.setattr(bot.outbound, 'reply_to', lambda message, text, **kwargs: calls.append(('reply', text)))
+    return calls
+
+
+def test_static_slots_filled_once(bot):
+    catalog = bot.MessageCatalog({'hi': {
+        'plain': "min ₹{min_withdrawal}",
+        'mixed': "{name} needs ₹{min_withdrawal}"
+    }}, {'min_withdrawal': '{10}'}, 'hi')
+
+    compiled, has_slots = catalog.locales['hi']['plain']
+    assert compiled == "min ₹{{10}}" and not has_slots
+    assert catalog.render('plain') == "min ₹{{10}}"  # used as is, never formatted
+    assert catalog.render('mixed', name='A') == "A needs ₹{10}"
+
+
+def test_locale_fallback(bot):
+    catalog = bot.MessageCatalog({
+        'hi': {'greet': "नमस्ते {name}", 'bye': "अलविदा"},
+        'en': {'greet': "Hello {name}"}
+    }, {}, 'hi')
+
+    assert catalog.locale_for(SimpleNamespace(language_code='en-GB')) == 'en'
+    assert catalog.locale_for(SimpleNamespace(language_code='fr')) == 'hi'
+    assert catalog.locale_for(SimpleNamespace(language_code=None)) == 'hi'
+    assert catalog.render('greet', 'en', name='A') == "Hello A"
+    assert catalog.render('bye', 'en') == "अलविदा"  # missing key: default locale
+    assert catalog.render('greet', 'fr', name='A') == "नमस्ते A"
+
+
+def test_catalog_slots_are_known(bot):
+    # Every slot left after compiling is one the handlers pass in
+    slots = set()
+    for templates in bot.messages.locales.values():
+        for compiled, _ in templates.values():
+            slots |= {name for _, name, _, _ in string.Formatter().parse(compiled) if name}
+    assert slots <= {
+        'first_name', 'bot_username', 'referral_code', 'referrals', 'referral_earnings', 'balance',
+        'completed_tasks', 'milestone', 'bonus', 'amount', 'upi_id', 'reason', 'task_type', 'title',
+        'reward', 'description', 'link', 'text'
+    }
+    assert bot.messages.render('quota_daily') == bot.MESSAGES['hi']['quota_daily'].format(
+        daily_task_limit=bot.DAILY_TASK_LIMIT)
+
+
+def test_keyboard_labels_are_routed(bot):
+    for key in ('button_tasks', 'button_balance', 'button_refer', 'button_withdraw', 'button_help', 'button_admin'):
+        assert bot.messages.render(key) in bot.router.buttons
+
+
+def test_handlers_reply_from_catalog(bot, storage, user, sent):
+    completed = [{'task_id': 't1', 'completed_at': "2025-01-01 00:00:00"}]
+    storage.put_user(7, dict(user(7, balance=3), referrals=2, completed_tasks=completed))
+    message = sender(7)
+
+    bot.handle_balance(message)
+    bot.handle_withdrawal(message)
+
+    assert sent == [
+        ('reply', bot.messages.render('balance', balance=3, referrals=2,
+                                      referral_earnings=2 * bot.REWARD_PER_REFERRAL, completed_tasks=1)),
+        ('reply', bot.messages.render('withdrawal_below_minimum', balance=3))
+    ]
+    assert f"₹{bot.MIN_WITHDRAWAL}" in sent[1][1]
+
+
+def test_rejection_notice_from_catalog(bot, storage, sent):
+    task = bot.TASKS_DB[0]
+    storage.add_submission(7, {'task_id': task['id'], 'file_id': 'f', 'status': 'pending',
+                               'submitted_at': "2025-01-01 00:00:00"})
+    admin = sender(bot.ADMIN_ID)
+    admin.text = 'blurry'
+
+    bot.process_rejection_reason(admin, '7', task['id'], 'f')
+
+    assert sent[0] == ('7', bot.messages.render('submission_rejected', title=task['title'], reason='blurry'))
@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+from telebot.apihelper import ApiTelegramException
+
+
+class FakeBot:
+    def __init__(self, errors=None):
+        self.sent = []
+        self.errors = dict(errors or {})
+        self.raised_at = {}
+        self.lock = threading.Lock()
+
+    def send_message(self, chat_id, text):
+        with self.lock:
+            error = self.errors.pop(text, None)
+        if error is not None:
+            time.sleep(0.05)  # a round trip, so other lanes move on meanwhile
+            self.raised_at[text] = time.monotonic()
+            raise error
+        with self.lock:
+            self.sent.append((chat_id, text, time.monotonic()))
+        return text
+
+
+def too_many_requests(retry_after):
+    return ApiTelegramException('sendMessage', None, {
+        'error_code': 429, 'description': 'Too Many Requests',
+        'parameters': {'retry_after': retry_after}
+    })
+
+
+def other_lane_chat(dispatcher, chat_id):
+    lane = hash(str(chat_id)) % len(dispatcher.lanes)
+    return next(c for c in range(chat_id + 1, chat_id + 100) if hash(str(c)) % len(dispatcher.lanes) != lane)
+
+
+def test_messages_to_one_chat_keep_their_order(bot):
+    fake = FakeBot()
+    dispatcher = bot.OutboundDispatcher(fake, workers=3, chat_rate=1000, chat_burst=1000)
+    futures = [dispatcher.send_message(5, f"m{i}") for i in range(20)]
+
+    assert [f.result(timeout=5) for f in futures] == [f"m{i}" for i in range(20)]
+    assert [text for _, text, _ in fake.sent] == [f"m{i}" for i in range(20)]
+    assert dispatcher.metrics()['sent'] == 20
+
+
+def test_limited_chat_does_not_hold_up_its_lane(bot):
+    fake = FakeBot()
+    dispatcher = bot.OutboundDispatcher(fake, workers=1, chat_rate=0.5, chat_burst=1)
+    slow = [dispatcher.send_message(1, f"slow{i}") for i in range(2)]
+    fast = dispatcher.send_message(2, "fast")
+
+    assert fast.result(timeout=1) == "fast"
+    assert not slow[1].done()  # parked on chat 1's bucket, not blocking the worker
+
+
+def test_429_retries_and_pauses_every_lane(bot):
+    fake = FakeBot(errors={'first': too_many_requests(0.3)})
+    dispatcher = bot.OutboundDispatcher(fake, workers=2, chat_rate=10, chat_burst=1)
+    other = other_lane_chat(dispatcher, 1)
+
+    first = dispatcher.send_message(1, 'first')
+    # x1 already has its slot on the other lane when the 429 comes back
+    others = [dispatcher.send_message(other, f"x{i}") for i in range(2)]
+
+    assert first.result(timeout=5) == 'first'
+    assert [f.result(timeout=5) for f in others] == ['x0', 'x1']
+    sent_at = {text: at for _, text, at in fake.sent}
+    assert sent_at['x1'] - fake.raised_at['first'] >= 0.25
+    assert sent_at['first'] - fake.raised_at['first'] >= 0.25
+    assert dispatcher.metrics()['retried'] == 1
+
+
+def test_pause_drops_saved_up_tokens(bot):
+    bucket = bot.TokenBucket(rate=10, capacity=10)
+    now = time.monotonic()
+    bucket.pause(now + 1)
+
+    assert bucket.reserve(now) == pytest.approx(1.1)
+    # After the pause tokens come back one at a time
+    assert bucket.reserve(now + 1) == pytest.approx(0.2)
+
+
+def test_errors_fail_the_future(bot, monkeypatch):
+    monkeypatch.setattr(bot, 'log_activity', lambda *args, **kwargs: None)
+    fake = FakeBot(errors={'bad': ValueError('boom'), 'flood': too_many_requests(0)})
+    dispatcher = bot.OutboundDispatcher(fake, workers=1, max_retries=0)
+
+    with pytest.raises(ValueError):
+        dispatcher.send_message(1, 'bad').result(timeout=5)
+    with pytest.raises(ApiTelegramException):
+        dispatcher.send_message(1, 'flood').result(timeout=5)
+    assert dispatcher.metrics()['failed'] == 2
+    assert dispatcher.metrics()['sent'] == 0
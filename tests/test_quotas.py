@@ -0,0 +1,83 @@
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+HOUR = 3600
+
+
+def test_daily_limit_rolls_over(bot, storage):
+    quotas = bot.TaskQuotas(daily=2, lifetime=10)
+    now = time.time()
+
+    assert quotas.acquire(1, now) is None
+    assert quotas.acquire(1, now + HOUR) is None
+    assert quotas.acquire(1, now + 2 * HOUR) == 'daily'
+    assert quotas.check(1, now + 2 * HOUR) == 'daily'
+    # Other users have their own window
+    assert quotas.acquire(2, now + 2 * HOUR) is None
+    # The first slot leaves the 24h window, the second is still in it
+    assert quotas.acquire(1, now + 24 * HOUR) is None
+    assert quotas.acquire(1, now + 24 * HOUR) == 'daily'
+
+
+def test_lifetime_limit_and_release(bot, storage):
+    quotas = bot.TaskQuotas(daily=100, lifetime=2)
+    now = time.time()
+
+    assert quotas.acquire(1, now) is None
+    assert quotas.acquire(1, now) is None
+    assert quotas.acquire(1, now) == 'lifetime'
+
+    quotas.release(1)
+    assert quotas.check(1, now) is None
+    assert quotas.acquire(1, now) is None
+    assert quotas.acquire(1, now) == 'lifetime'
+
+
+def test_release_without_slot_is_harmless(bot, storage):
+    quotas = bot.TaskQuotas(daily=1, lifetime=1)
+    quotas.release(1)
+    quotas.release(1)
+    assert quotas.acquire(1) is None
+    assert quotas.acquire(1) == 'lifetime'
+
+
+def test_counters_seeded_from_submissions(bot, storage):
+    now = time.time()
+    stamp = datetime.fromtimestamp(now - HOUR).strftime("%Y-%m-%d %H:%M:%S")
+    old = datetime.fromtimestamp(now - 48 * HOUR).strftime("%Y-%m-%d %H:%M:%S")
+    for task_id, status, submitted_at in ((1, 'approved', old), (2, 'rejected', stamp), (3, 'pending', stamp)):
+        storage.add_submission(7, {'task_id': task_id, 'file_id': 'f', 'status': status, 'submitted_at': submitted_at})
+
+    quotas = bot.TaskQuotas(daily=2, lifetime=3)
+    # Two in the last day (a rejection still counts there), two towards the lifetime
+    assert quotas.check(7, now) == 'daily'
+    assert quotas.acquire(7, now + 24 * HOUR) is None
+    assert quotas.acquire(7, now + 24 * HOUR) == 'lifetime'
+
+
+def test_lru_bounds_counters(bot, storage):
+    quotas = bot.TaskQuotas(daily=5, lifetime=5, capacity=2)
+    for user_id in (1, 2, 3):
+        quotas.acquire(user_id)
+    assert len(quotas) == 2
+
+
+def test_rejecting_processed_submission_keeps_slot(bot, storage, monkeypatch):
+    sent = []
+    monkeypatch.setattr(bot.outbound, 'send_message', lambda *args, **kwargs: sent.append(('send', args)))
+    monkeypatch.setattr(bot.outbound, 'reply_to', lambda message, text, **kwargs: sent.append(('reply', text)))
+    monkeypatch.setattr(bot, 'task_quotas', bot.TaskQuotas(daily=5, lifetime=1))
+    task_id = bot.TASKS_DB[0]['id']
+    storage.add_submission(7, {'task_id': task_id, 'file_id': 'f', 'status': 'pending',
+                               'submitted_at': "2025-01-01 00:00:00"})
+    assert bot.task_quotas.check(7) == 'lifetime'  # seeded from the pending proof
+    # Approved while the admin was typing the rejection reason
+    assert bot.update_submission_status(7, task_id, 'approved')
+
+    message = SimpleNamespace(text='blurry', from_user=SimpleNamespace(id=bot.ADMIN_ID))
+    bot.process_rejection_reason(message, '7', task_id, 'f')
+
+    assert sent == [('reply', "⚠️ Submission already processed")]
+    assert storage.count_submissions('approved') == 1
+    assert bot.task_quotas.check(7) == 'lifetime'
@@ -0,0 +1,56 @@
+import pytest
+
+
+@pytest.fixture
+def quiet(bot, monkeypatch):
+    sent = []
+    monkeypatch.setattr(bot.outbound, 'send_message', lambda chat_id, text, **kwargs: sent.append((chat_id, text)))
+    monkeypatch.setattr(bot, 'log_activity', lambda *args, **kwargs: None)
+    monkeypatch.setattr(bot, 'ledger', bot.BalanceLedger())
+    return sent
+
+
+def test_code_resolves_to_its_user(bot, storage, user):
+    code = bot.generate_referral_code(12)
+    storage.put_user(12, dict(user(12), referral_code=code))
+    user_id, found = bot.resolve_referral_code(code)
+    assert user_id == '12'
+    assert found['id'] == 12
+
+
+@pytest.mark.parametrize('code', [
+    'REF-²-ABCDEF',      # digit that int() rejects
+    'REF-١٢-ABCDEF',     # non-ASCII digits
+    'REF-12',
+    'REF-12-AB-CD',
+    'XYZ-12-ABCDEF',
+    'REF--ABCDEF',
+    'REF-99-ABCDEF',     # unknown user
+    '',
+])
+def test_malformed_or_unknown_codes_rejected(bot, storage, code):
+    assert bot.resolve_referral_code(code) is None
+
+
+def test_wrong_checksum_rejected(bot, storage, user):
+    code = bot.generate_referral_code(12)
+    storage.put_user(12, dict(user(12), referral_code=code))
+    assert bot.resolve_referral_code(code[:-1] + ('A' if code[-1] != 'A' else 'B')) is None
+
+
+def test_legacy_code_still_resolves(bot, storage, user):
+    storage.put_user(5, dict(user(5), referral_code='REF-5-X7K2QP'))
+    assert bot.resolve_referral_code('REF-5-X7K2QP')[0] == '5'
+
+
+def test_signup_credits_referrer_and_milestone(bot, storage, user, quiet):
+    code = bot.generate_referral_code(1)
+    storage.put_user(1, dict(user(1), referral_code=code, referrals=4))
+
+    bot.register_user(2, 'New', ref_code=code)
+
+    referrer = storage.get_user(1)
+    assert referrer['referrals'] == 5
+    assert referrer['balance'] == bot.REWARD_PER_REFERRAL + bot.MILESTONE_BONUSES[5]
+    assert storage.get_user(2)['referral_code'] == bot.generate_referral_code(2)
+    assert [chat_id for chat_id, _ in quiet] == ['1']
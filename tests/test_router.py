@@ -0,0 +1,100 @@
+from types import SimpleNamespace
+
+import pytest
+
+
+def make_call(data, user_id=42):
+    return SimpleNamespace(
+        id=f"cb-{data}",
+        data=data,
+        from_user=SimpleNamespace(id=user_id),
+        message=SimpleNamespace(chat=SimpleNamespace(id=user_id), message_id=7)
+    )
+
+
+@pytest.fixture
+def sent(bot, monkeypatch):
+    # Every outbound call the handlers make, as (method, args)
+    calls = []
+    for method in ('send_message', 'send_photo', 'edit_message_text', 'reply_to', 'answer_callback_query'):
+        monkeypatch.setattr(bot.outbound, method,
+                            lambda *args, method=method, **kwargs: calls.append((method, args)))
+    return calls
+
+
+def test_longest_prefix_wins(bot):
+    seen = []
+    router = bot.UpdateRouter()
+    router.callback('approve_')(lambda call: seen.append(('approve', call.data)))
+    router.callback('approve_wd_')(lambda call: seen.append(('approve_wd', call.data)))
+    router.callback('task_', 'complete_')(lambda call: seen.append(('task', call.data)))
+
+    for data in ('approve_wd_1', 'approve_1', 'complete_3', 'task_2'):
+        router.dispatch_callback(make_call(data))
+    assert seen == [('approve_wd', 'approve_wd_1'), ('approve', 'approve_1'),
+                    ('task', 'complete_3'), ('task', 'task_2')]
+
+
+def test_unmatched_callback_only_acked(bot):
+    acked, seen = [], []
+    router = bot.UpdateRouter(unmatched_callback=acked.append)
+    router.callback('task_')(seen.append)
+
+    router.dispatch_callback(make_call('stale_button'))
+    router.dispatch_callback(make_call(None))
+    assert [call.data for call in acked] == ['stale_button', None]
+    assert seen == []
+
+
+def test_deferred_callback_acked_before_handler(bot):
+    events = []
+    router = bot.UpdateRouter(ack=lambda call: events.append('ack'))
+    router.callback('slow_', defer=True)(lambda call: events.append(('run', call.acknowledged)))
+    router.callback('fast_')(lambda call: events.append('fast'))
+
+    router.dispatch_callback(make_call('slow_1'))
+    router.dispatch_callback(make_call('fast_1'))
+    assert events == ['ack', ('run', True), 'fast']
+
+
+def test_deferred_callback_runs_on_executor(bot):
+    submitted = []
+    router = bot.UpdateRouter(ack=lambda call: None)
+    router.executor = SimpleNamespace(submit=lambda *args: submitted.append(args))
+    handler = router.callback('slow_', defer=True)(lambda call: None)
+
+    call = make_call('slow_1', user_id=9)
+    router.dispatch_callback(call)
+    assert len(submitted) == 1
+    key, priority, task, arg = submitted[0]
+    assert (key, priority, arg) == (9, bot.KeyedExecutor.HIGH, call)
+    assert task.__wrapped__ is handler
+
+
+def test_button_dispatch_by_text(bot):
+    seen = []
+    router = bot.UpdateRouter()
+    router.button('A', 'B')(lambda message: seen.append(message.text))
+    message = SimpleNamespace(text='B')
+    assert router.is_button(message)
+    assert not router.is_button(SimpleNamespace(text='C'))
+    router.dispatch_button(message)
+    assert seen == ['B']
+
+
+@pytest.mark.parametrize('data', ['admin_edit_task', 'admin_delete_task', 'admin_task_stats', 'admin_nope'])
+def test_unknown_admin_callback_acked_then_noop(bot, sent, monkeypatch, data):
+    monkeypatch.setattr(bot.router, 'executor', None)
+    bot.router.dispatch_callback(make_call(data, user_id=bot.ADMIN_ID))
+    assert sent == [('answer_callback_query', (f"cb-{data}",))]
+
+
+def test_admin_callback_from_user_acked_then_noop(bot, sent, monkeypatch):
+    monkeypatch.setattr(bot.router, 'executor', None)
+    bot.router.dispatch_callback(make_call('admin_tasks', user_id=42))
+    assert sent == [('answer_callback_query', ('cb-admin_tasks',))]
+
+
+def test_stale_callback_acked_by_real_router(bot, sent):
+    bot.router.dispatch_callback(make_call('gone_123'))
+    assert sent == [('answer_callback_query', ('cb-gone_123',))]
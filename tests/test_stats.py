@@ -0,0 +1,66 @@
+import pytest
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'journal'])
+def store(request, bot, tmp_path):
+    if request.param == 'memory':
+        yield bot.MemoryStorage()
+        return
+    if request.param == 'sqlite':
+        yield bot.SQLiteStorage(str(tmp_path / 'bot.db'))
+        return
+    journal = bot.JournalStorage(str(tmp_path / 'journal'), snapshot_interval=3600)
+    yield journal
+    journal.close()
+
+
+def scanned_totals(store, user_ids):
+    users = [store.get_user(user_id) for user_id in user_ids]
+    return {
+        'users': len(users),
+        'blocked': sum(1 for u in users if u.get('blocked')),
+        'balance': sum(u.get('balance', 0) for u in users),
+        'referrals': sum(u.get('referrals', 0) for u in users)
+    }
+
+
+def test_user_totals_follow_writes(store, user):
+    for user_id in range(1, 6):
+        store.put_user(user_id, user(user_id, balance=user_id))
+    store.set_user_field(2, 'balance', 40)
+    store.set_user_field(3, 'referrals', 7)
+    store.set_user_field(4, 'blocked', True)
+    store.set_user_field(4, 'blocked', True)
+    store.set_user_field(5, 'blocked', True)
+    store.set_user_field(5, 'blocked', False)
+    store.put_user(1, dict(user(1), balance=9, referrals=2))
+
+    totals = store.user_totals()
+    assert totals == scanned_totals(store, range(1, 6))
+    assert totals == {'users': 5, 'blocked': 1, 'balance': 9 + 40 + 3 + 4 + 5, 'referrals': 9}
+
+
+def test_withdrawal_counts_follow_status(store):
+    for user_id in (1, 2, 3):
+        store.add_withdrawal({'user_id': str(user_id), 'amount': 10, 'upi_id': 'a@b', 'status': 'pending',
+                              'requested_at': f"2025-01-0{user_id} 00:00:00"})
+    store.update_withdrawal(1, "2025-01-01 00:00:00", {'status': 'approved'}, from_status='pending')
+    # A stale second tap changes nothing
+    store.update_withdrawal(1, "2025-01-01 00:00:00", {'status': 'rejected'}, from_status='pending')
+
+    assert store.count_withdrawals('pending') == 2
+    assert store.count_withdrawals('approved') == 1
+    assert store.count_withdrawals('rejected') == 0
+
+
+def test_journal_user_totals_after_restart(bot, user, tmp_path):
+    journal = bot.JournalStorage(str(tmp_path), snapshot_interval=3600)
+    for user_id in (1, 2):
+        journal.put_user(user_id, user(user_id, balance=5))
+    journal.snapshot()
+    journal.set_user_field(2, 'blocked', True)
+    journal.close()
+
+    recovered = bot.JournalStorage(str(tmp_path), snapshot_interval=3600)
+    assert recovered.user_totals() == {'users': 2, 'blocked': 1, 'balance': 10, 'referrals': 0}
+    recovered.close()
@@ -0,0 +1,57 @@
+import json
+import queue
+import threading
+import time
+
+import pytest
+
+
+def update_body(update_id, user_id=5):
+    return json.dumps({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id, 'date': 0, 'text': f"m{update_id}",
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'A'}
+        }
+    })
+
+
+@pytest.fixture
+def webhook(bot, monkeypatch):
+    updates = queue.Queue(maxsize=3)
+    monkeypatch.setattr(bot, 'webhook_updates', updates)
+    client = bot.app.test_client()
+
+    def post(body, secret=bot.WEBHOOK_SECRET):
+        return client.post(bot.WEBHOOK_PATH, data=body, content_type='application/json',
+                           headers={'X-Telegram-Bot-Api-Secret-Token': secret})
+    post.updates = updates
+    return post
+
+
+def test_wrong_secret_is_rejected(webhook):
+    assert webhook(update_body(1), secret='nope').status_code == 403
+    assert webhook(update_body(1), secret='').status_code == 403
+    assert webhook.updates.empty()
+
+
+def test_full_queue_answers_busy(webhook):
+    for update_id in range(3):
+        assert webhook(update_body(update_id)).status_code == 200
+    # Telegram retries a 503 later
+    assert webhook(update_body(3)).status_code == 503
+    assert webhook.updates.qsize() == 3
+
+
+def test_ingest_keeps_arrival_order(bot, webhook, monkeypatch):
+    seen = []
+    monkeypatch.setattr(bot.bot, 'process_new_updates', lambda updates: seen.extend(u.update_id for u in updates))
+    for update_id in range(3):
+        webhook(update_body(update_id))
+
+    threading.Thread(target=bot.webhook_ingest, daemon=True).start()
+    deadline = time.monotonic() + 5
+    while len(seen) < 3 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert seen == [0, 1, 2]